@@ -0,0 +1,121 @@
+import asyncio
+import json
+import math
+import random
+import time
+
+import httpx
+
+
+def read_traffic(path: str) -> list[bytes]:
+    """
+    Reads the request bodies to replay, one JSON document per line
+    """
+    with open(path, "r", encoding="utf-8") as traffic_file:
+        return [json.dumps(json.loads(line)).encode("utf-8") for line in traffic_file if line.strip()]
+
+
+def generate_traffic(num_requests: int = 1000, num_keys: int = 100) -> list[bytes]:
+    """
+    Request bodies like the ones in post.lua, spread over num_keys game ids
+    """
+    return [json.dumps({"gameid": f"game-{i % num_keys}", "payment": "500", "currency": "INR",
+                        "timestamp": "2025-05-04T12:00:00Z"}).encode("utf-8")
+            for i in range(num_requests)]
+
+
+def get_percentile(sorted_values: list[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percentile * len(sorted_values) / 100)
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class LoadResult:
+    def __init__(self, latencies: list[float], num_errors: int, duration: float):
+        self.latencies = sorted(latencies)
+        self.num_errors = num_errors
+        self.duration = duration
+
+    def to_dict(self) -> dict:
+        num_requests = len(self.latencies)
+        return {
+            "requests": num_requests,
+            "errors": self.num_errors,
+            "error_rate": self.num_errors / num_requests if num_requests else 0.0,
+            "throughput": num_requests / self.duration if self.duration else 0.0,
+            "mean": sum(self.latencies) / num_requests if num_requests else 0.0,
+            "p50": get_percentile(self.latencies, 50),
+            "p99": get_percentile(self.latencies, 99),
+            "p999": get_percentile(self.latencies, 99.9),
+            "max": self.latencies[-1] if self.latencies else 0.0
+        }
+
+
+class LoadGenerator:
+    """
+    Replays request bodies against the router, either closed loop, i.e.
+    concurrency clients each sending the next request once the previous
+    one is answered, or open loop at a fixed rate of requests per second
+    whatever the response times. In open loop the latency is measured from
+    the time a request was due, not from when it was sent, so a router
+    falling behind shows up in the latency rather than being hidden by a
+    lower request rate(coordinated omission).
+    """
+    def __init__(self, url: str, bodies: list[bytes], timeout: float = 30):
+        self.url = url
+        self.bodies = bodies
+        self.timeout = timeout
+        self.latencies: list[float] = []
+        self.num_errors = 0
+        self.next_body = 0
+
+    def get_next_body(self) -> bytes:
+        body = self.bodies[self.next_body % len(self.bodies)]
+        self.next_body += 1
+        return body
+
+    async def send(self, client: httpx.AsyncClient, due_time: float):
+        try:
+            response = await client.post(self.url, content=self.get_next_body(),
+                                         headers={"content-type": "application/json"})
+            if response.status_code >= 400:
+                self.num_errors += 1
+        except httpx.HTTPError:
+            self.num_errors += 1
+        self.latencies.append(time.perf_counter() - due_time)
+
+    async def run_closed_loop(self, concurrency: int, duration: float) -> LoadResult:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout) as client:
+            start_time = time.perf_counter()
+            end_time = start_time + duration
+
+            async def run_client():
+                while time.perf_counter() < end_time:
+                    await self.send(client, time.perf_counter())
+
+            await asyncio.gather(*(run_client() for _ in range(concurrency)))
+            return LoadResult(self.latencies, self.num_errors, time.perf_counter() - start_time)
+
+    async def run_open_loop(self, rate: float, duration: float, poisson: bool = False,
+                            max_connections: int = 1000) -> LoadResult:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        arrivals = random.Random()
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout) as client:
+            start_time = time.perf_counter()
+            due_time = start_time
+            tasks = set()
+            while due_time < start_time + duration:
+                delay = due_time - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(self.send(client, due_time))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                due_time += arrivals.expovariate(rate) if poisson else 1 / rate
+            await asyncio.gather(*tasks)
+            return LoadResult(self.latencies, self.num_errors, time.perf_counter() - start_time)
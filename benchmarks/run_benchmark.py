@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_generator import LoadGenerator, generate_traffic, read_traffic
+from benchmarks.stub_upstream import LATENCY_DISTRIBUTIONS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+ALGORITHMS = ["round_robin", "weighted_round_robin", "least_requests", "peak_ewma", "consistent_hash"]
+PROTOCOLS = ["http1", "http2"]
+READY_TIMEOUT = 30
+
+
+def get_free_ports(num_ports: int) -> list[int]:
+    sockets = []
+    for _ in range(num_ports):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def get_env() -> dict:
+    """
+    Environment of the router and stub processes, which run outside of
+    the repo directory so their logs do not end up in it
+    """
+    return {**os.environ, "PYTHONPATH": REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", "")}
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_router_config(args, upstream_ports: list[int], router_port: int, algorithm: str,
+                         num_workers: int, work_dir: str, protocol: str = "http1") -> dict:
+    """
+    The config.json of the repo with the stub upstreams as app_instances,
+    quick healthchecks and the algorithm, worker count and upstream
+    protocol under test
+    """
+    with open(os.path.join(REPO_DIR, "config.json"), "r", encoding="utf-8") as conf_file:
+        config = json.load(conf_file)
+    config["app_instances"] = [f"http://127.0.0.1:{port}" for port in upstream_ports]
+    config["router_port"] = router_port
+    config["routing_algorithm"] = algorithm
+    config["health_check_interval"] = 0.5
+    config["degraded_check_interval"] = 1
+    config["logging"] = {**config.get("logging", {}), "file": os.path.join(work_dir, "router.log"),
+                         "level": "WARNING"}
+    config["workers"] = {**config.get("workers", {}), "count": num_workers,
+                         "shared_memory_name": f"router-benchmark-{router_port}"}
+    http_client_config = config.get("http_client", {})
+    config["http_client"] = {**http_client_config, "http2": {**http_client_config.get("http2", {}),
+                                                             "enabled": protocol == "http2"}}
+    for section, overrides in args.config_overrides.items():
+        config[section] = {**config.get(section, {}), **overrides} if isinstance(overrides, dict) else overrides
+    return config
+
+
+async def wait_until_ready(url: str, body: bytes):
+    """
+    Waits for the router to route requests, i.e. for the first healthchecks
+    to mark the stub upstreams HEALTHY
+    """
+    deadline = time.monotonic() + READY_TIMEOUT
+    async with httpx.AsyncClient(timeout=5) as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.post(url, content=body, headers={"content-type": "application/json"})
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Router at {url} not ready after {READY_TIMEOUT} seconds")
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_case(args, bodies: list[bytes], upstream_ports: list[int], algorithm: str, num_workers: int,
+             protocol: str = "http1") -> dict:
+    """
+    Starts the router with the algorithm, worker count and upstream
+    protocol, runs the load against it and returns the results
+    """
+    router_port = get_free_ports(1)[0]
+    url = f"http://127.0.0.1:{router_port}/echo"
+    with tempfile.TemporaryDirectory() as work_dir:
+        config = create_router_config(args, upstream_ports, router_port, algorithm, num_workers, work_dir,
+                                      protocol)
+        with open(os.path.join(work_dir, "config.json"), "w", encoding="utf-8") as conf_file:
+            json.dump(config, conf_file)
+        router = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "main.py")], cwd=work_dir,
+                                  env=get_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(wait_until_ready(url, bodies[0]))
+            load_generator = LoadGenerator(url, bodies)
+            if args.rate:
+                load = load_generator.run_open_loop(args.rate, args.duration, args.poisson)
+            else:
+                load = load_generator.run_closed_loop(args.concurrency, args.duration)
+            result = asyncio.run(load).to_dict()
+        finally:
+            stop_process(router)
+    return {"algorithm": algorithm, "workers": num_workers, "protocol": protocol, **result}
+
+
+def compare_results(results: list[dict], baseline_path: str):
+    """
+    Prints the change in throughput and p99 of every case against the
+    same case of a saved baseline
+    """
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        # Baselines from before the protocol option ran HTTP/1.1
+        baseline = {(result["algorithm"], result["workers"], result.get("protocol", "http1")): result
+                    for result in json.load(baseline_file)["results"]}
+    for result in results:
+        previous = baseline.get((result["algorithm"], result["workers"], result["protocol"]))
+        if previous is None:
+            continue
+        print(f"{result['algorithm']:<22} workers={result['workers']:<3} {result['protocol']:<5} "
+              f"throughput {get_change(previous['throughput'], result['throughput']):>8}  "
+              f"p99 {get_change(previous['p99'], result['p99']):>8}")
+
+
+def get_change(previous: float, current: float) -> str:
+    return f"{(current - previous) / previous * 100:+.1f}%" if previous else "n/a"
+
+
+def print_result(result: dict):
+    print(f"{result['algorithm']:<22} workers={result['workers']:<3} {result['protocol']:<5} "
+          f"{result['throughput']:>9.1f} req/s  p50 {result['p50'] * 1000:7.2f}ms  "
+          f"p99 {result['p99'] * 1000:7.2f}ms  p999 {result['p999'] * 1000:7.2f}ms  "
+          f"errors {result['error_rate'] * 100:.2f}%")
+
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks the router-service against local stub upstreams")
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=["round_robin"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker counts to benchmark")
+    parser.add_argument("--protocols", nargs="+", choices=PROTOCOLS, default=["http1"],
+                        help="Protocols between the router and the upstreams, http2 needs the h2 package")
+    parser.add_argument("--upstreams", type=int, default=4, help="Number of stub upstreams")
+    parser.add_argument("--latency", type=float, default=0.005, help="Mean upstream latency in seconds")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream 500 responses")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per case")
+    parser.add_argument("--concurrency", type=int, default=50, help="Clients of the closed loop load")
+    parser.add_argument("--rate", type=float, help="Requests per second, runs open loop load when set")
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals for the open loop load")
+    parser.add_argument("--traffic", help="File of request bodies to replay, one JSON document per line")
+    parser.add_argument("--config-overrides", type=json.loads, default={},
+                        help='Router config sections to override, e.g. \'{"passthrough": true}\'')
+    parser.add_argument("--output", help="Results file, by default benchmarks/results/<time>-<commit>.json")
+    parser.add_argument("--compare", help="Results file to compare the results with")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    bodies = read_traffic(args.traffic) if args.traffic else generate_traffic()
+    upstream_ports = get_free_ports(args.upstreams)
+    stubs_dir = tempfile.TemporaryDirectory()
+    # Stubs serving HTTP/2 still serve HTTP/1.1
+    http2_args = ["--http2"] if "http2" in args.protocols else []
+    stubs = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_upstream",
+                              "--ports", *map(str, upstream_ports), "--latency", str(args.latency),
+                              "--latency-distribution", args.latency_distribution,
+                              "--error-rate", str(args.error_rate), *http2_args],
+                             cwd=stubs_dir.name, env=get_env(), stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        for algorithm in args.algorithms:
+            for num_workers in args.workers:
+                for protocol in args.protocols:
+                    result = run_case(args, bodies, upstream_ports, algorithm, num_workers, protocol)
+                    print_result(result)
+                    results.append(result)
+    finally:
+        stop_process(stubs)
+        stubs_dir.cleanup()
+
+    commit = get_commit()
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{(commit or 'unknown')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump({"commit": commit, "timestamp": time.time(), "parameters": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": results}, output_file, indent=2)
+    print(f"Results saved to {output}")
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError: # HTTP/2 is optional, only needed with --http2
+    h2 = None
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+REASONS = {200: b"OK", 500: b"Internal Server Error", 505: b"HTTP Version Not Supported"}
+HTTP2_PREFACE_LINE = b"PRI * HTTP/2.0\r\n"
+
+
+class StubUpstream:
+    """
+    Minimal HTTP/1.1 downstream instance for benchmarks. /health answers
+    right away, any other path echoes the request body back after a
+    latency drawn from the configured distribution, or fails with a 500
+    at the configured error rate. Connections are kept alive, and request
+    bodies must have a content-length. With http2, connections opening
+    with the HTTP/2 preface(h2c with prior knowledge) are served in
+    HTTP/2, otherwise they get a 505 like from an HTTP/1.1 only server.
+    Paths ending in /batch take a JSON array of requests and answer with
+    the array of their responses after a single latency, with failed
+    requests answered by an error object.
+    """
+    def __init__(self, latency: float, latency_distribution: str = "fixed", error_rate: float = 0.0,
+                 seed: int = None, http2: bool = False):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {latency_distribution}")
+        if http2 and h2 is None:
+            raise ValueError("HTTP/2 needs the h2 package(pip install h2)")
+        self.http2 = http2
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.num_requests = 0
+
+    def sample_latency(self) -> float:
+        """
+        Returns a latency (in seconds) whose mean is the configured latency
+        """
+        if self.latency <= 0 or self.latency_distribution == "fixed":
+            return max(self.latency, 0)
+        if self.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * self.latency)
+        if self.latency_distribution == "exponential":
+            return self.random.expovariate(1 / self.latency)
+        # Long tailed, mu chosen so that the mean is the configured latency
+        sigma = 1.0
+        return self.random.lognormvariate(math.log(self.latency) - sigma ** 2 / 2, sigma)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                if request_line == HTTP2_PREFACE_LINE:
+                    if self.http2:
+                        await self.handle_http2(reader, writer, request_line)
+                    else:
+                        writer.write(b"HTTP/1.1 505 HTTP Version Not Supported\r\nconnection: close\r\n"
+                                     b"content-length: 0\r\n\r\n")
+                        await writer.drain()
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                path = request_line.split(b" ")[1]
+
+                status, response_body = await self.respond(path, body)
+                writer.write(b"HTTP/1.1 %d %s\r\ncontent-type: application/json\r\ncontent-length: %d\r\n\r\n"
+                             % (status, REASONS[status], len(response_body)) + response_body)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                           preface_line: bytes):
+        """
+        Serves an HTTP/2 connection, answering its streams concurrently
+        """
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False,
+                                                                          header_encoding="utf-8"))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+        paths: dict[int, str] = {}
+        bodies: dict[int, bytearray] = {}
+        responses = set()
+        data = preface_line
+        try:
+            while data:
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        paths[event.stream_id] = dict(event.headers)[":path"]
+                        bodies[event.stream_id] = bytearray()
+                    elif isinstance(event, h2.events.DataReceived):
+                        bodies[event.stream_id] += event.data
+                        connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        response = asyncio.create_task(self.respond_http2(
+                            connection, writer, event.stream_id, paths.pop(event.stream_id),
+                            bytes(bodies.pop(event.stream_id))))
+                        responses.add(response)
+                        response.add_done_callback(responses.discard)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(connection.data_to_send())
+                await writer.drain()
+                data = await reader.read(65536)
+        finally:
+            for response in responses:
+                response.cancel()
+
+    async def respond_http2(self, connection, writer: asyncio.StreamWriter, stream_id: int, path: str,
+                            body: bytes):
+        status, response_body = await self.respond(path.encode(), body)
+        # Bodies are assumed to fit into the flow control window
+        connection.send_headers(stream_id, [(":status", str(status)), ("content-type", "application/json"),
+                                            ("content-length", str(len(response_body)))])
+        connection.send_data(stream_id, response_body, end_stream=True)
+        writer.write(connection.data_to_send())
+
+    async def respond(self, path: bytes, body: bytes) -> tuple[int, bytes]:
+        if path == b"/health":
+            return 200, b'{"status": "ok"}'
+        if path.endswith(b"/batch"):
+            return await self.respond_batch(body)
+        self.num_requests += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            return 500, b'{"error": "stub failure"}'
+        return 200, body or b"{}"
+
+    async def respond_batch(self, body: bytes) -> tuple[int, bytes]:
+        requests = json.loads(body)
+        self.num_requests += len(requests)
+        await asyncio.sleep(self.sample_latency())
+        responses = [{"error": "stub failure", "status": 500}
+                     if self.error_rate > 0 and self.random.random() < self.error_rate else request
+                     for request in requests]
+        return 200, json.dumps(responses).encode()
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(ports: list[int], latency: float, latency_distribution: str, error_rate: float,
+                http2: bool = False):
+    servers = []
+    for port in ports:
+        stub = StubUpstream(latency, latency_distribution, error_rate, http2=http2)
+        servers.append(await stub.start("127.0.0.1", port))
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs stub downstream instances for benchmarks")
+    parser.add_argument("--ports", type=int, nargs="+", required=True)
+    parser.add_argument("--latency", type=float, default=0.005, help="Mean latency in seconds")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--http2", action="store_true", help="Also serve HTTP/2 with prior knowledge(h2c)")
+    args = parser.parse_args()
+    asyncio.run(serve(args.ports, args.latency, args.latency_distribution, args.error_rate, args.http2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,29 @@
 import asyncio
-import time
 import uvicorn
-import logging
 import json
 
 from fastapi import FastAPI
-from src.models.service_instance import ServiceInstance
-from src.router.router_factory import create_router
-from src.health.health_checker import HealthChecker
+from src.router.upstream_pool import UpstreamPools, get_pool_configs
+from src.discovery.config_reloader import ConfigReloader
+from src.health.shared_instance_table import SharedInstanceTable
+from src.health.shared_health_sync import SharedHealthSync
 from src.utils.http.http_client import HttpClient
 from src.api.router_api import create_api_router
+from src.api.metrics_api import create_metrics_api_router
+from src.api.profiling_api import create_profiling_api_router
+from src.metrics.router_metrics import RouterMetrics
+from src.tracing.profiler import Profiler
+from src.tracing.span_exporter import SpanExporter
+from src.tracing.tracer import Tracer
+from src.tracing.tracing_middleware import TracingMiddleware
+from src.utils.logger_config import configure_logging, setup_logger
+
+CONFIG_FILE = "config.json"
+DEFAULT_SHARED_MEMORY_NAME = "router-service"
 
 
 def read_config_file() -> dict:
-    with open('config.json', 'r', encoding='utf-8') as conf_file:
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as conf_file:
         config = json.load(conf_file)
 
     return config
@@ -21,28 +31,104 @@ def read_config_file() -> dict:
 
 def create_app(config: dict):
     """
-    Creates the router API service and starts the healthchecker
+    Creates the router API service and starts the healthcheckers of all
+    upstream pools. When running multiple workers, the worker attaches to
+    the instance table shared by all workers and only the health probe
+    owner among them runs the healthcheckers. With config reload enabled,
+    changes of config.json and of the discovered instances are applied
+    without a restart. With tracing enabled, every request is timed phase
+    by phase and sampled requests are exported, and with profiling enabled
+    the worker can be profiled on demand.
     """
+    configure_logging(config.get('logging', {}))
     app = FastAPI()
-    urls = config['app_instances']
-    instances = [ServiceInstance(url) for url in urls]
-    router = create_router(config, instances)
+    # Single pooled client shared by the routers and the healthcheckers of all pools
+    http_client = HttpClient(config.get('http_client', {}))
+    upstream_pools = UpstreamPools(config, http_client)
+
+    tracing_config = config.get('tracing', {})
+    tracer = None
+    if tracing_config.get('enabled', False):
+        tracer = Tracer(tracing_config, SpanExporter(tracing_config))
+        app.add_middleware(TracingMiddleware, tracer=tracer)
 
-    api_router = create_api_router(router)
-    app.include_router(api_router)
+    metrics_config = config.get('metrics', {})
+    if metrics_config.get('enabled', False):
+        metrics = RouterMetrics(upstream_pools.get_instances(), metrics_config)
+        upstream_pools.enable_metrics(metrics)
+        if tracer is not None:
+            metrics.enable_tracing(tracer.exporter)
+            tracer.enable_metrics(metrics)
+        # Registered ahead of the catch-all route of the api router
+        app.include_router(create_metrics_api_router(metrics))
+    profiling_config = config.get('profiling', {})
+    if profiling_config.get('enabled', False):
+        app.include_router(create_profiling_api_router(Profiler(profiling_config)))
+    app.include_router(create_api_router(upstream_pools.route_table, config))
 
-    health_checker = HealthChecker(instances, HttpClient(), config, time.time)
+    workers_config = config.get('workers', {})
+    shared_table = None
+    health_sync = None
+    if workers_config.get('count', 1) > 1:
+        shared_memory_name = workers_config.get('shared_memory_name', DEFAULT_SHARED_MEMORY_NAME)
+        shared_table = SharedInstanceTable.attach(shared_memory_name)
+        upstream_pools.enable_shared_table(shared_table)
+        health_sync = SharedHealthSync(shared_memory_name, shared_table, upstream_pools.get_instances(),
+                                       upstream_pools.get_health_checkers(), workers_config)
+    config_reloader = None
+    if config.get('config_reload', {}).get('enabled', False):
+        config_reloader = ConfigReloader(CONFIG_FILE, config, read_config_file, upstream_pools.update)
+    background_tasks = []
 
     @app.on_event("startup")
     async def startup_event():
-        asyncio.create_task(health_checker.run())
+        if health_sync is not None:
+            background_tasks.append(asyncio.create_task(health_sync.run()))
+        else:
+            upstream_pools.start_health_checks()
+        if config_reloader is not None:
+            background_tasks.append(asyncio.create_task(config_reloader.run()))
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await upstream_pools.stop()
+        await http_client.close()
+        if tracer is not None:
+            tracer.close()
+        if shared_table is not None:
+            shared_table.close()
 
     return app
 
 
+def create_worker_app():
+    """
+    App factory called by every uvicorn worker process
+    """
+    return create_app(read_config_file())
+
+
 if __name__ == "__main__":
-    logger = logging.getLogger("router-service")
+    logger = setup_logger("router-service")
     logger.info("Starting the app")
     config = read_config_file()
-    app = create_app(config)
-    uvicorn.run(app, host="0.0.0.0", port=config['router_port'])
+    workers_config = config.get('workers', {})
+    num_workers = workers_config.get('count', 1)
+    if num_workers > 1:
+        # Created before the workers start and removed once they are all gone
+        shared_table = SharedInstanceTable.create(
+            workers_config.get('shared_memory_name', DEFAULT_SHARED_MEMORY_NAME),
+            sum(len(pool_config.get('app_instances', []))
+                for pool_config in get_pool_configs(config).values()),
+            num_workers)
+        try:
+            uvicorn.run("main:create_worker_app", factory=True, workers=num_workers,
+                        host="0.0.0.0", port=config['router_port'])
+        finally:
+            shared_table.close(unlink=True)
+    else:
+        app = create_app(config)
+        uvicorn.run(app, host="0.0.0.0", port=config['router_port'])
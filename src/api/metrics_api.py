@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from src.metrics.router_metrics import RouterMetrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def create_metrics_api_router(metrics: RouterMetrics):
+    api_router = APIRouter()
+
+    @api_router.get("/metrics")
+    async def get_metrics():
+        """
+        Metrics of the router-service in the Prometheus text format
+        """
+        return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+    return api_router
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src.tracing.profiler import Profiler, format_collapsed_stacks, summarize_stacks
+
+DEFAULT_SECONDS = 5
+PROFILE_FORMATS = ("json", "collapsed")
+
+
+def create_profiling_api_router(profiler: Profiler):
+    api_router = APIRouter()
+
+    @api_router.get("/debug/profile")
+    async def get_profile(seconds: float = DEFAULT_SECONDS, format: str = "json"):
+        """
+        Profiles the router-service worker which takes the request for the
+        given seconds. Returns the event loop lag and the functions taking
+        the most CPU time as JSON, or with format=collapsed the sampled
+        stacks for flame graph tools.
+        """
+        if not 0 < seconds <= profiler.max_seconds:
+            raise HTTPException(detail=f"seconds must be above 0 and at most {profiler.max_seconds}",
+                                status_code=422)
+        if format not in PROFILE_FORMATS:
+            raise HTTPException(detail=f"format must be one of {', '.join(PROFILE_FORMATS)}", status_code=422)
+        if profiler.is_running:
+            raise HTTPException(detail="A profile is already being taken", status_code=409)
+
+        loop_lag, stacks = await profiler.profile(seconds)
+        if format == "collapsed":
+            return PlainTextResponse(format_collapsed_stacks(stacks))
+        return JSONResponse({"seconds": seconds, "loop_lag": loop_lag, "cpu": summarize_stacks(stacks)})
+
+    return api_router
@@ -1,22 +1,148 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import json
+import time
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from fastapi.exceptions import HTTPException
+from src.router.route_table import RouteTable
 from src.router.router_factory import Router
+from src.tracing.tracer import record_phase
+from src.utils.http.headers import filter_headers
+from src.utils.http.streaming import limit_chunk_size
+from src.utils.http.upstream_response import UpstreamStream
+
+DEFAULT_MAX_STREAM_BUFFER_BYTES = 64 * 1024
+PROXIED_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+DEFAULT_JSON_ROUTES = ["/echo"]
+
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """
+    Relays the body of an upstream stream and closes the stream however
+    the response ends, also when the client disconnects before the body
+    is iterated, so the upstream connection and the request in flight
+    are released
+    """
+    def __init__(self, upstream_stream: UpstreamStream, max_chunk_size: int):
+        super().__init__(upstream_stream.iter_body(max_chunk_size), status_code=upstream_stream.status_code)
+        self.upstream_stream = upstream_stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.upstream_stream.aclose()
 
 
-def create_api_router(router: Router):
+def create_api_router(route_table: RouteTable, config: dict = None):
+    config = config or {}
+    streaming_config = config.get("streaming", {})
     api_router = APIRouter()
 
-    @api_router.post("/echo")
-    async def post(payload: dict):
+    if streaming_config.get("enabled", False):
+        max_buffer_bytes = streaming_config.get("max_buffer_bytes", DEFAULT_MAX_STREAM_BUFFER_BYTES)
+
+        @api_router.api_route("/{path:path}", methods=PROXIED_METHODS)
+        async def proxy_streaming(request: Request):
+            """
+            Endpoint of the router-service in streaming mode. The request
+            and response bodies are relayed chunk by chunk, each chunk read
+            only once the previous one was written out and forwarded in
+            pieces of at most max_buffer_bytes.
+            """
+            router = get_router(route_table, request)
+            body = None
+            if "content-length" in request.headers or "transfer-encoding" in request.headers:
+                # Without a body, e.g. of a GET, the upstream request is not sent chunked either
+                body = limit_chunk_size(request.stream(), max_buffer_bytes)
+            try:
+                upstream_stream = await router.route_stream(request.url.path, body,
+                                                            filter_headers(request.headers),
+                                                            request.method, request.url.query)
+            except HTTPException as e:
+                raise HTTPException(detail="Error processing the request", status_code=e.status_code)
+
+            response = UpstreamStreamingResponse(upstream_stream, max_buffer_bytes)
+            add_upstream_headers(response, upstream_stream.headers)
+            return response
+
+        return api_router
+
+    passthrough = config.get("passthrough", False)
+    json_routes = frozenset(config.get("json_routes", DEFAULT_JSON_ROUTES))
+
+    @api_router.api_route("/{path:path}", methods=PROXIED_METHODS)
+    async def proxy(request: Request):
         """
-        POST endpoint of the router-service
+        Endpoint of the router-service. POST requests to the json_routes
+        which carry a JSON object are forwarded as such, and the JSON
+        response of the instance is returned. In passthrough mode, and for
+        every other request, the request body is forwarded as raw bytes and
+        the upstream status, headers and body are returned unchanged.
         """
+        router = get_router(route_table, request)
+        body = await request.body()
+        if request.method == "POST" and not passthrough and request.url.path in json_routes:
+            payload = parse_json_object(body)
+            if payload is not None:
+                return await route_json(router, request, payload)
+        record_phase("parse")
         try:
-            response = await router.route("/echo", payload)
-            return JSONResponse(content=response,status_code=200)
+            upstream_response = await router.route_bytes(request.url.path, body,
+                                                          filter_headers(request.headers),
+                                                          request.method, request.url.query)
         except HTTPException as e:
             raise HTTPException(detail="Error processing the request", status_code=e.status_code)
 
+        encode_start_time = time.monotonic()
+        response = Response(content=upstream_response.content,
+                            status_code=upstream_response.status_code)
+        add_upstream_headers(response, upstream_response.headers)
+        record_phase("encode", encode_start_time)
+        return response
+
     return api_router
+
+
+def get_router(route_table: RouteTable, request: Request) -> Router:
+    """
+    Returns the router of the upstream pool serving the request path
+    """
+    router = route_table.match(request.url.path)
+    if router is None:
+        raise HTTPException(detail="No route for the request path", status_code=404)
+    return router
+
+
+def parse_json_object(body: bytes) -> dict | None:
+    """
+    Returns the JSON object in the body, or None if it holds anything else
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+async def route_json(router: Router, request: Request, payload: dict) -> JSONResponse:
+    record_phase("parse")
+    try:
+        response = await router.route(request.url.path, payload, filter_headers(request.headers),
+                                      request.url.query)
+    except HTTPException as e:
+        raise HTTPException(detail="Error processing the request", status_code=e.status_code)
+    encode_start_time = time.monotonic()
+    json_response = JSONResponse(content=response,status_code=200)
+    record_phase("encode", encode_start_time)
+    return json_response
+
+
+def add_upstream_headers(response: Response, headers: list[tuple[str, str]]):
+    """
+    Appends the upstream headers to the response, keeping repeated
+    headers like set-cookie which a header dict would collapse
+    """
+    response.raw_headers.extend((name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in headers)
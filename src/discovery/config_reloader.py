@@ -0,0 +1,125 @@
+import asyncio
+import os
+import signal
+
+from src.discovery.instance_discovery import create_discovery
+from src.router.upstream_pool import DEFAULT_POOL, get_pool_configs
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_WATCH_INTERVAL = 2
+
+
+class ConfigReloader:
+    """
+    Applies changes of config.json and of the discovered instances while
+    the router-service runs. Every watch_interval it re-reads config.json
+    if the file changed, and on SIGHUP right away, and asks the discovery
+    source of every pool which has one for its current instances, which
+    replace the app_instances of the pool. Whenever the resulting config
+    differs from the one in effect, it is handed to apply_config().
+    A config which can not be read or applied is logged and the one in
+    effect stays. If a discovery source fails, the instances it returned
+    last stay.
+    """
+    def __init__(self, config_path: str, config: dict, read_config, apply_config):
+        reload_config = config.get("config_reload", {})
+        self.watch_interval = reload_config.get("watch_interval", DEFAULT_WATCH_INTERVAL)
+        self.config_path = config_path
+        self.read_config = read_config
+        self.apply_config = apply_config
+        self.file_config = config
+        self.applied_config = config
+        self.mtime = self.get_mtime()
+        # Pool name -> (discovery config, discovery source)
+        self.discoveries: dict[str, tuple[dict, object]] = {}
+        # Pool name -> instances returned last by its discovery source
+        self.discovered_instances: dict[str, list] = {}
+        self.reload_requested = asyncio.Event()
+
+    def get_mtime(self) -> float | None:
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def request_reload(self):
+        self.reload_requested.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+        except (NotImplementedError, RuntimeError, AttributeError):
+            logger.warning("Config reload on SIGHUP not supported here, only watching %s", self.config_path)
+        try:
+            while True:
+                await self.reload(force=self.reload_requested.is_set())
+                self.reload_requested.clear()
+                try:
+                    await asyncio.wait_for(self.reload_requested.wait(), self.watch_interval)
+                except TimeoutError:
+                    pass
+        finally:
+            try:
+                loop.remove_signal_handler(signal.SIGHUP)
+            except (NotImplementedError, RuntimeError, AttributeError):
+                pass
+
+    async def reload(self, force: bool = False):
+        """
+        Re-reads config.json if it changed, or if forced, queries the
+        discovery sources and applies the result if anything changed
+        """
+        mtime = self.get_mtime()
+        if force or mtime != self.mtime:
+            self.mtime = mtime
+            try:
+                self.file_config = self.read_config()
+                logger.info("Read changed config %s", self.config_path)
+            except (OSError, ValueError) as e:
+                logger.error("Keeping the config in effect, failed to read %s: %s", self.config_path, e)
+        await self.discover_instances()
+
+        config = self.get_effective_config(self.file_config)
+        if config == self.applied_config:
+            return
+        # Not retried until something changes again, whether it applies or not
+        self.applied_config = config
+        try:
+            self.apply_config(config)
+            logger.info("Applied the reloaded config")
+        except Exception as e:
+            # Whatever the config got wrong, the reloader keeps running with the config in effect
+            logger.error("Keeping the config in effect, failed to apply the reloaded one: %s", e,
+                         exc_info=True)
+
+    async def discover_instances(self):
+        discovery_configs = {name: pool_config["discovery"]
+                             for name, pool_config in get_pool_configs(self.file_config).items()
+                             if pool_config.get("discovery")}
+        for name in [name for name in self.discoveries if name not in discovery_configs]:
+            del self.discoveries[name]
+            self.discovered_instances.pop(name, None)
+        for name, discovery_config in discovery_configs.items():
+            try:
+                if name not in self.discoveries or self.discoveries[name][0] != discovery_config:
+                    self.discoveries[name] = (discovery_config, create_discovery(discovery_config))
+                self.discovered_instances[name] = await self.discoveries[name][1].discover()
+            except (KeyError, OSError, ValueError) as e:
+                logger.error("Keeping the instances of pool %s, discovery failed: %s", name, e)
+
+    def get_effective_config(self, config: dict) -> dict:
+        """
+        Returns the config with the discovered instances of every pool
+        """
+        pools = config.get("pools")
+        if not pools:
+            if DEFAULT_POOL not in self.discovered_instances:
+                return config
+            return {**config, "app_instances": self.discovered_instances[DEFAULT_POOL]}
+        return {**config, "pools": {
+            name: {**pool_config, "app_instances": self.discovered_instances[name]}
+            if name in self.discovered_instances else pool_config
+            for name, pool_config in pools.items()}}
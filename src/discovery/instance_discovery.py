@@ -0,0 +1,53 @@
+import asyncio
+import json
+import socket
+
+DEFAULT_SCHEME = "http"
+
+
+class FileDiscovery:
+    """
+    Reads the instances of a pool from a JSON file holding a list of
+    app_instances entries, e.g. written by a deployment script or a
+    registry sidecar. It also stands in for a service registry locally.
+    """
+    def __init__(self, config: dict):
+        self.path = config["path"]
+
+    async def discover(self) -> list:
+        with open(self.path, "r", encoding="utf-8") as instances_file:
+            instances = json.load(instances_file)
+        if not isinstance(instances, list):
+            raise ValueError(f"{self.path} does not hold a list of instances")
+        return instances
+
+
+class DnsDiscovery:
+    """
+    Resolves a hostname to the addresses of the instances of a pool, one
+    instance per address, e.g. a headless Kubernetes service or a Consul
+    DNS name. Resolving "localhost" stands in for it locally.
+    """
+    def __init__(self, config: dict):
+        self.hostname = config["hostname"]
+        self.port = config["port"]
+        self.scheme = config.get("scheme", DEFAULT_SCHEME)
+
+    async def discover(self) -> list:
+        addresses = await asyncio.get_running_loop().getaddrinfo(self.hostname, self.port,
+                                                                 type=socket.SOCK_STREAM)
+        urls = set()
+        for family, _, _, _, sockaddr in addresses:
+            host = f"[{sockaddr[0]}]" if family == socket.AF_INET6 else sockaddr[0]
+            urls.add(f"{self.scheme}://{host}:{self.port}")
+        return sorted(urls)
+
+
+DISCOVERY_TYPES = {"file": FileDiscovery, "dns": DnsDiscovery}
+
+
+def create_discovery(config: dict):
+    discovery_type = config.get("type")
+    if discovery_type not in DISCOVERY_TYPES:
+        raise ValueError(f"Unknown instance discovery type {discovery_type}")
+    return DISCOVERY_TYPES[discovery_type](config)
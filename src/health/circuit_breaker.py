@@ -0,0 +1,145 @@
+import asyncio
+
+from src.models.circuit_state import CircuitState
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_OPEN_DURATION = 5
+DEFAULT_HALF_OPEN_MAX_REQUESTS = 1
+DEFAULT_SUCCESS_THRESHOLD = 2
+
+CIRCUIT_OPEN = "circuit_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to an instance whose circuit
+    does not let it through. No connection is attempted.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one instance.
+    CLOSED: requests pass, failure_threshold consecutive failures open it.
+    OPEN: requests fail fast, after open_duration it turns HALF_OPEN.
+    HALF_OPEN: at most half_open_max_requests trial requests at a time pass,
+    success_threshold successful trials close it and a failed one opens it again.
+    """
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.trial_requests = 0
+        self.trial_successes = 0
+
+
+class CircuitBreakers:
+    """
+    Circuit breakers of all instances, sitting between the routers and
+    the HttpClient. An instance whose circuit is OPEN is also taken out of
+    the routable instances, so every router skips it at selection time
+    instead of discovering the failure after dispatching to it.
+    """
+    def __init__(self, instances: list[ServiceInstance], routable_instances: RoutableInstances,
+                 config: dict):
+        self.routable_instances = routable_instances
+        self.failure_threshold = config.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD)
+        self.open_duration = config.get("open_duration", DEFAULT_OPEN_DURATION)
+        self.half_open_max_requests = config.get("half_open_max_requests", DEFAULT_HALF_OPEN_MAX_REQUESTS)
+        self.success_threshold = config.get("success_threshold", DEFAULT_SUCCESS_THRESHOLD)
+        self.breakers: dict[ServiceInstance, CircuitBreaker] = {instance: CircuitBreaker()
+                                                                for instance in instances}
+
+    def set_instances(self, instances: list[ServiceInstance]):
+        """
+        Takes over the instances of a reloaded config, kept instances keep their circuit
+        """
+        instance_set = set(instances)
+        self.breakers = {instance: breaker for instance, breaker in self.breakers.items()
+                         if instance in instance_set}
+
+    def get_breaker(self, instance: ServiceInstance) -> CircuitBreaker:
+        breaker = self.breakers.get(instance)
+        if breaker is None:
+            breaker = self.breakers[instance] = CircuitBreaker()
+        return breaker
+
+    def get_state(self, instance: ServiceInstance) -> CircuitState:
+        breaker = self.breakers.get(instance)
+        return breaker.state if breaker is not None else CircuitState.CLOSED
+
+    def is_available(self, instance: ServiceInstance) -> bool:
+        """
+        Whether a request to the instance would currently be let through
+        """
+        breaker = self.breakers.get(instance)
+        if breaker is None or breaker.state == CircuitState.CLOSED:
+            return True
+        if breaker.state == CircuitState.HALF_OPEN:
+            return breaker.trial_requests < self.half_open_max_requests
+        return False
+
+    def try_acquire(self, instance: ServiceInstance) -> bool:
+        """
+        Lets a request to the instance through if its circuit permits.
+        Every acquired request must be followed by record() or release().
+        """
+        if not self.is_available(instance):
+            return False
+        breaker = self.get_breaker(instance)
+        if breaker.state == CircuitState.HALF_OPEN:
+            breaker.trial_requests += 1
+        return True
+
+    def release(self, instance: ServiceInstance):
+        """
+        Releases an acquired request which ended without an outcome, e.g. cancelled
+        """
+        breaker = self.get_breaker(instance)
+        if breaker.state == CircuitState.HALF_OPEN and breaker.trial_requests > 0:
+            breaker.trial_requests -= 1
+
+    def record(self, instance: ServiceInstance, failed: bool):
+        breaker = self.get_breaker(instance)
+        if breaker.state == CircuitState.HALF_OPEN:
+            breaker.trial_requests = max(breaker.trial_requests - 1, 0)
+            if failed:
+                self.open(instance, breaker)
+                return
+            breaker.trial_successes += 1
+            if breaker.trial_successes >= self.success_threshold:
+                self.close(instance, breaker)
+        elif breaker.state == CircuitState.CLOSED:
+            if not failed:
+                breaker.consecutive_failures = 0
+                return
+            breaker.consecutive_failures += 1
+            if breaker.consecutive_failures >= self.failure_threshold:
+                self.open(instance, breaker)
+
+    def open(self, instance: ServiceInstance, breaker: CircuitBreaker):
+        logger.warning("Opening circuit of %s for %s seconds", instance.get_url(), self.open_duration)
+        breaker.state = CircuitState.OPEN
+        breaker.trial_requests = 0
+        breaker.trial_successes = 0
+        self.routable_instances.exclude(instance, CIRCUIT_OPEN)
+        asyncio.get_running_loop().call_later(self.open_duration, self.half_open, instance, breaker)
+
+    def half_open(self, instance: ServiceInstance, breaker: CircuitBreaker):
+        if breaker.state != CircuitState.OPEN:
+            return
+        logger.info("Half-opening circuit of %s", instance.get_url())
+        breaker.state = CircuitState.HALF_OPEN
+        self.routable_instances.include(instance, CIRCUIT_OPEN)
+
+    def close(self, instance: ServiceInstance, breaker: CircuitBreaker):
+        logger.info("Closing circuit of %s", instance.get_url())
+        breaker.state = CircuitState.CLOSED
+        breaker.consecutive_failures = 0
+        breaker.trial_requests = 0
+        breaker.trial_successes = 0
@@ -1,38 +1,166 @@
 import asyncio
+import heapq
+import random
 import time
 from src.utils.logger_config import setup_logger
 
 from src.utils.http.http_client import HttpClient
+from src.health.routable_instances import RoutableInstances
 from src.models.service_instance import ServiceInstance
 from src.models.health_status import HealthStatus
+from src.metrics.router_metrics import RouterMetrics
 
 logger = setup_logger(__name__)
 
+DEFAULT_MAX_CONCURRENT_PROBES = 100
+DEFAULT_JITTER = 0.1
+DEFAULT_LAG_WARNING_THRESHOLD = 1
+
 
 class HealthChecker:
     def __init__(self, instances: list[ServiceInstance],
                  http_client: HttpClient,
                  config: dict,
-                 time_provider: time.time):
+                 time_provider: time.time,
+                 routable_instances: RoutableInstances = None):
         self.svc_instances = instances
         self.http_client = http_client
         self.config = config
         self.time_provider = time_provider
+        self.routable_instances = routable_instances or RoutableInstances(instances)
+        self.set_scheduler_config(config.get("health_check_scheduler", {}))
+        self.random = random.Random()
+        # Heap of (due time, index, instance) ordered by the time each instance is due next
+        self.schedule: list[tuple[float, int, ServiceInstance]] = []
+        self.is_running = False
+        self.schedule_changed = asyncio.Event()
+        self.next_index = 0 # Tie breaker of instances due at the same time
+        self.instance_set = set(instances)
+        # Time (in seconds) healthchecks started after they were due, latest and worst
+        # since the last health status summary
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.metrics: RouterMetrics = None
+        for instance in self.svc_instances:
+            instance.add_state_listener(self.publish_routable_instances)
+
+    def set_scheduler_config(self, scheduler_config: dict):
+        self.max_concurrent_probes = scheduler_config.get("max_concurrent_probes",
+                                                          DEFAULT_MAX_CONCURRENT_PROBES)
+        # Fraction of the interval by which the next healthcheck of an instance is moved at random
+        self.jitter = scheduler_config.get("jitter", DEFAULT_JITTER)
+        self.lag_warning_threshold = scheduler_config.get("lag_warning_threshold",
+                                                          DEFAULT_LAG_WARNING_THRESHOLD)
+
+    def set_instances(self, instances: list[ServiceInstance], config: dict):
+        """
+        Replaces the instances and the config, e.g. on a config reload.
+        Instances which are kept keep their health status and their place
+        in the schedule, added ones are checked right away and removed ones
+        are no longer checked. The scheduler settings apply from the next
+        healthcheck started on.
+        """
+        self.config = config
+        self.set_scheduler_config(config.get("health_check_scheduler", {}))
+        added_instances = [instance for instance in instances if instance not in self.instance_set]
+        self.svc_instances = instances
+        self.instance_set = set(instances)
+        for instance in added_instances:
+            instance.add_state_listener(self.publish_routable_instances)
+            if self.is_running:
+                heapq.heappush(self.schedule, (asyncio.get_running_loop().time(), self.next_index, instance))
+                self.next_index += 1
+                self.schedule_changed.set()
+
+    def enable_metrics(self, metrics: RouterMetrics):
+        """
+        Records the duration of every healthcheck and how late it started
+        """
+        self.metrics = metrics
 
     async def run(self):
         """
-        Main loop to keep the healthchecker running every 
-        health_check_interval seconds. It sends healthcheck
-        requests to each downstream instance asynchronously.
+        Main loop of the healthchecker. Every instance has its own due time
+        in a heap, initially spread at random over the interval, so the
+        healthchecks do not all hit at once. A due instance is probed as
+        soon as fewer than max_concurrent_probes healthchecks are running,
+        and once its healthcheck is done it is due again after the interval
+        of its health status, with jitter.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        interval = self.config["health_check_interval"]
+        self.schedule = [(now + self.random.uniform(0, self.get_check_interval(instance)), index, instance)
+                         for index, instance in enumerate(self.svc_instances)]
+        heapq.heapify(self.schedule)
+        self.next_index = len(self.schedule)
+        probes = set()
+        next_summary_time = now
+        self.is_running = True
+        try:
+            while True:
+                now = loop.time()
+                if now >= next_summary_time:
+                    self.log_current_health_status()
+                    next_summary_time = now + interval
+                if not self.schedule or self.schedule[0][0] > now:
+                    next_due_time = self.schedule[0][0] if self.schedule else next_summary_time
+                    # Woken up early when instances are added or probes reschedule their instance
+                    self.schedule_changed.clear()
+                    try:
+                        await asyncio.wait_for(self.schedule_changed.wait(),
+                                               min(next_due_time, next_summary_time) - now)
+                    except TimeoutError:
+                        pass
+                    continue
+
+                due_time, index, instance = heapq.heappop(self.schedule)
+                if instance not in self.instance_set:
+                    # Removed on a config reload
+                    continue
+                # Not a semaphore, so a reloaded max_concurrent_probes applies right away
+                while len(probes) >= self.max_concurrent_probes:
+                    await asyncio.wait(probes, return_when=asyncio.FIRST_COMPLETED)
+                self.record_lag(loop.time() - due_time)
+                probe = asyncio.create_task(self.probe(instance, index))
+                probes.add(probe)
+                probe.add_done_callback(probes.discard)
+        finally:
+            self.is_running = False
+            for probe in probes:
+                probe.cancel()
+
+    async def probe(self, instance: ServiceInstance, index: int):
+        """
+        Checks the health of the instance and schedules its next healthcheck
+        """
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        try:
+            await self.check_and_update_instance_health(instance)
+        finally:
+            if self.metrics is not None:
+                self.metrics.probe_duration.observe(loop.time() - start_time)
+            jitter = self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            due_time = loop.time() + self.get_check_interval(instance) * jitter
+            heapq.heappush(self.schedule, (due_time, index, instance))
+            # The loop may be asleep until a later due time
+            self.schedule_changed.set()
+
+    def get_check_interval(self, instance: ServiceInstance) -> float:
         """
-        while True:
-            self.log_current_health_status()
-            start = self.time_provider()
-            tasks = [self.check_and_update_instance_health(instance) for instance in self.svc_instances]
-            await asyncio.gather(*tasks)
-            elapsed = self.time_provider() - start
-            if elapsed < self.config["health_check_interval"]:
-                await asyncio.sleep(self.config["health_check_interval"] - elapsed)
+        DEGRADED instances are checked every degraded_check_interval, all
+        others every health_check_interval
+        """
+        if instance.health_status == HealthStatus.DEGRADED:
+            return self.config["degraded_check_interval"]
+        return self.config["health_check_interval"]
+
+    def record_lag(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if self.metrics is not None:
+            self.metrics.healthcheck_lag.set(lag)
 
     async def check_and_update_instance_health(self, instance: ServiceInstance):
         """
@@ -40,11 +168,7 @@ class HealthChecker:
         and categorizes its heath status based on the response time. It also
         updates the health status of the instance
         """
-        logger.info(f"Starting health check for {instance.get_url()}")
-        if self.skip_degraded_instance(instance):
-            logger.info(f"Skipping healthcheck of DEGRADED instance {instance.get_url()}")
-            return
-
+        logger.info("Starting health check for %s", instance.get_url())
         try:
             start_time = self.time_provider()
             try:
@@ -52,13 +176,13 @@ class HealthChecker:
                     await self.http_client.get(instance.get_url() + "/health")
                     stop_time = self.time_provider()
                     response_time = stop_time - start_time
-                    logger.info(f"Got healthcheck response for {instance.get_url()} in {response_time} seconds")
+                    logger.info("Got healthcheck response for %s in %s seconds", instance.get_url(), response_time)
                     health_status = HealthStatus.HEALTHY
             except TimeoutError:
-                logger.warning(f"Healthcheck timed out for {instance.get_url()}")
+                logger.warning("Healthcheck timed out for %s", instance.get_url())
                 health_status = HealthStatus.DEGRADED
         except Exception as e:
-            logger.error(f"Error while getting health status for {instance.get_url()} : {str(e)}")
+            logger.error("Error while getting health status for %s : %s", instance.get_url(), e)
             health_status = HealthStatus.UNHEALTHY
         finally:
             # Use start_time instead of stop_time otherwise healthcheck
@@ -66,25 +190,29 @@ class HealthChecker:
             instance.update_health_status(health_status)
             instance.update_last_healthcheck_time(start_time)
 
-    def skip_degraded_instance(self, instance: ServiceInstance) -> bool:
+    def publish_routable_instances(self, instance: ServiceInstance):
         """
-        Determines whether healthcheck of a given instance can be skipped
-        in the current healthcheck interval or not
+        Publishes a new snapshot of routable instances for the routers
+        whenever any instance changes its state
         """
-        now = self.time_provider()
-        if (instance.health_status == HealthStatus.DEGRADED and
-                (now - instance.get_last_healthcheck_time() < self.config['degraded_check_interval'])):
-            return True
-        return False
+        snapshot = self.routable_instances.publish()
+        logger.info("Published routable instances version %d with %d instances after %s changed state",
+                    snapshot.version, len(snapshot.instances), instance.get_url())
 
     def log_current_health_status(self):
         """
-        Logs the health status of all configured downstream instances
+        Logs the health status of all configured downstream instances and
+        how far the healthchecks ran behind schedule since the last summary
         """
         logger.info("===================================================================")
         for instance in self.svc_instances:
-            logger.info(
-                f"[Health_Status_Summary] {instance.get_url()}   ->    {instance.get_health_status()}"
-            )
+            logger.info("[Health_Status_Summary] %s   ->    %s", instance.get_url(), instance.get_health_status())
+        if self.max_lag > self.lag_warning_threshold:
+            logger.warning("[Health_Status_Summary] Healthchecks ran up to %.3f seconds behind schedule, "
+                           "consider raising max_concurrent_probes", self.max_lag)
+        else:
+            logger.info("[Health_Status_Summary] Healthchecks ran up to %.3f seconds behind schedule",
+                        self.max_lag)
+        self.max_lag = 0.0
 
         logger.info("===================================================================")
@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_CONSECUTIVE_FAILURES = 5
+DEFAULT_WINDOW_SIZE = 100
+DEFAULT_MIN_REQUESTS = 20
+DEFAULT_ERROR_RATE_THRESHOLD = 0.5
+DEFAULT_BASE_EJECTION_TIME = 10
+DEFAULT_MAX_EJECTION_TIME = 300
+DEFAULT_MAX_EJECTION_PERCENT = 50
+DEFAULT_EJECTION_DECAY_TIME = 60
+
+EJECTED = "ejected"
+
+
+class InstanceOutcomes:
+    """
+    Outcomes of the most recent requests proxied to one instance
+    """
+    def __init__(self, window_size: int):
+        self.window = deque(maxlen=window_size)
+        self.failures_in_window = 0
+        self.consecutive_failures = 0
+        self.times_ejected = 0
+        self.restore_time: float = None # Loop time the instance last returned to rotation
+
+    def record(self, failed: bool):
+        if len(self.window) == self.window.maxlen and self.window[0]:
+            self.failures_in_window -= 1
+        self.window.append(failed)
+        if failed:
+            self.failures_in_window += 1
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+
+    def get_error_rate(self) -> float:
+        return self.failures_in_window / len(self.window) if self.window else 0.0
+
+    def decay_times_ejected(self, now: float, decay_time: float):
+        """
+        Forgets one ejection for every decay_time the instance stayed in
+        rotation since it was last restored
+        """
+        if self.restore_time is None or self.times_ejected == 0:
+            return
+        self.times_ejected = max(self.times_ejected - int((now - self.restore_time) / decay_time), 0)
+
+    def reset(self):
+        self.window.clear()
+        self.failures_in_window = 0
+        self.consecutive_failures = 0
+
+
+class OutlierDetector:
+    """
+    Passive health tracking. The outcome of every proxied request is fed
+    back here, and an instance returning consecutive_failures 5xx/connection
+    errors in a row, or an error rate above error_rate_threshold over its
+    last window_size requests, is ejected from the routable instances right
+    away instead of waiting for several failed healthchecks.
+    An ejected instance comes back after base_ejection_time, doubled on
+    every further ejection up to max_ejection_time, and halved again for
+    every ejection_decay_time it stays in rotation afterwards. At most
+    max_ejection_percent of the instances, but at least one of several,
+    are ejected at a time, so a fleet wide problem does not eject every
+    instance.
+    """
+    def __init__(self, instances: list[ServiceInstance], routable_instances: RoutableInstances,
+                 config: dict):
+        self.svc_instances = instances
+        self.routable_instances = routable_instances
+        self.consecutive_failures = config.get("consecutive_failures", DEFAULT_CONSECUTIVE_FAILURES)
+        self.window_size = config.get("window_size", DEFAULT_WINDOW_SIZE)
+        self.min_requests = config.get("min_requests", DEFAULT_MIN_REQUESTS)
+        self.error_rate_threshold = config.get("error_rate_threshold", DEFAULT_ERROR_RATE_THRESHOLD)
+        self.base_ejection_time = config.get("base_ejection_time", DEFAULT_BASE_EJECTION_TIME)
+        self.max_ejection_time = config.get("max_ejection_time", DEFAULT_MAX_EJECTION_TIME)
+        self.max_ejection_percent = config.get("max_ejection_percent", DEFAULT_MAX_EJECTION_PERCENT)
+        self.ejection_decay_time = config.get("ejection_decay_time", DEFAULT_EJECTION_DECAY_TIME)
+        self.outcomes: dict[ServiceInstance, InstanceOutcomes] = {}
+
+    def set_instances(self, instances: list[ServiceInstance]):
+        """
+        Takes over the instances of a reloaded config, kept instances keep their outcomes
+        """
+        self.svc_instances = instances
+        instance_set = set(instances)
+        self.outcomes = {instance: outcomes for instance, outcomes in self.outcomes.items()
+                         if instance in instance_set}
+
+    def record(self, instance: ServiceInstance, failed: bool):
+        outcomes = self.outcomes.get(instance)
+        if outcomes is None:
+            outcomes = self.outcomes[instance] = InstanceOutcomes(self.window_size)
+        outcomes.record(failed)
+        if not failed or self.routable_instances.is_excluded(instance, EJECTED):
+            return
+
+        if outcomes.consecutive_failures >= self.consecutive_failures:
+            reason = f"{outcomes.consecutive_failures} consecutive failures"
+        elif (len(outcomes.window) >= self.min_requests
+              and outcomes.get_error_rate() >= self.error_rate_threshold):
+            reason = f"error rate of {outcomes.get_error_rate():.0%}"
+        else:
+            return
+        self.eject(instance, outcomes, reason)
+
+    def eject(self, instance: ServiceInstance, outcomes: InstanceOutcomes, reason: str):
+        max_ejected = len(self.svc_instances) * self.max_ejection_percent // 100
+        if len(self.svc_instances) > 1:
+            # Small pools would otherwise never eject an instance
+            max_ejected = max(max_ejected, 1)
+        if self.routable_instances.get_num_excluded(EJECTED) + 1 > max_ejected:
+            logger.warning("Not ejecting %s after %s, %d%% of the instances are already ejected",
+                           instance.get_url(), reason, self.max_ejection_percent)
+            return
+
+        loop = asyncio.get_running_loop()
+        outcomes.decay_times_ejected(loop.time(), self.ejection_decay_time)
+        ejection_time = min(self.base_ejection_time * 2 ** outcomes.times_ejected, self.max_ejection_time)
+        outcomes.times_ejected += 1
+        outcomes.reset()
+        logger.warning("Ejecting %s for %s seconds after %s", instance.get_url(), ejection_time, reason)
+        self.routable_instances.exclude(instance, EJECTED)
+        loop.call_later(ejection_time, self.restore, instance)
+
+    def restore(self, instance: ServiceInstance):
+        logger.info("Returning ejected instance %s to rotation", instance.get_url())
+        outcomes = self.outcomes.get(instance)
+        if outcomes is not None:
+            outcomes.restore_time = asyncio.get_running_loop().time()
+        self.routable_instances.include(instance, EJECTED)
@@ -0,0 +1,79 @@
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+
+
+class InstanceSnapshot:
+    """
+    Immutable, versioned view of the instances which can currently
+    take traffic. The version is bumped on every publish, so readers
+    can cheaply tell whether anything derived from a snapshot is stale.
+    """
+    __slots__ = ("version", "instances")
+
+    def __init__(self, version: int, instances: tuple[ServiceInstance, ...]):
+        self.version = version
+        self.instances = instances
+
+
+class RoutableInstances:
+    """
+    Holds the latest InstanceSnapshot of the configured instances. A
+    publish builds a complete new snapshot and swaps it in with a single
+    reference assignment, so routers can read it on every request
+    without taking a lock or scanning the instance list.
+    """
+    def __init__(self, instances: list[ServiceInstance]):
+        self.svc_instances = instances
+        # Instances taken out of rotation regardless of their health status,
+        # e.g. by passive health tracking, with the reasons why
+        self.excluded_instances: dict[ServiceInstance, set[str]] = {}
+        self.snapshot = InstanceSnapshot(0, ())
+        self.publish()
+
+    def current(self) -> InstanceSnapshot:
+        return self.snapshot
+
+    def publish(self) -> InstanceSnapshot:
+        """
+        Rebuilds the snapshot from the current state of every instance
+        """
+        routable = tuple(instance for instance in self.svc_instances
+                         if instance.get_health_status() == HealthStatus.HEALTHY
+                         and instance not in self.excluded_instances)
+        self.snapshot = InstanceSnapshot(self.snapshot.version + 1, routable)
+        return self.snapshot
+
+    def set_instances(self, instances: list[ServiceInstance]):
+        """
+        Replaces the configured instances, e.g. on a config reload, and
+        publishes the routable ones among them. Exclusions of instances
+        which are kept stay in place.
+        """
+        self.svc_instances = instances
+        kept_instances = set(instances)
+        for instance in [instance for instance in self.excluded_instances if instance not in kept_instances]:
+            del self.excluded_instances[instance]
+        self.publish()
+
+    def exclude(self, instance: ServiceInstance, reason: str):
+        """
+        Takes the instance out of the snapshot, whatever its health status,
+        until it is included again for the same reason
+        """
+        self.excluded_instances.setdefault(instance, set()).add(reason)
+        self.publish()
+
+    def include(self, instance: ServiceInstance, reason: str):
+        reasons = self.excluded_instances.get(instance)
+        if reasons is None:
+            return
+        reasons.discard(reason)
+        if not reasons:
+            del self.excluded_instances[instance]
+        self.publish()
+
+    def is_excluded(self, instance: ServiceInstance, reason: str) -> bool:
+        return reason in self.excluded_instances.get(instance, ())
+
+    def get_num_excluded(self, reason: str) -> int:
+        return sum(1 for reasons in self.excluded_instances.values() if reason in reasons)
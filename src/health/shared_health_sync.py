@@ -0,0 +1,86 @@
+import asyncio
+import fcntl
+
+from src.health.health_checker import HealthChecker
+from src.health.shared_instance_table import SharedInstanceTable, get_lock_path
+from src.models.service_instance import ServiceInstance
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_SYNC_INTERVAL = 0.1
+
+
+class SharedHealthSync:
+    """
+    Shares the health of the instances between the router workers of a
+    host. The worker holding the probe lock file is the only one running
+    the healthcheckers(one per upstream pool) and writes every status
+    transition into the shared instance table. The other workers poll the
+    table every sync_interval and apply the new statuses to their
+    instances, which publishes their routable instances as usual. When the probe owner dies, the OS
+    releases its lock and the next worker to poll takes over.
+    """
+    def __init__(self, name: str, shared_table: SharedInstanceTable, instances: list[ServiceInstance],
+                 health_checkers: list[HealthChecker], config: dict):
+        self.lock_path = get_lock_path(name, "probe")
+        self.shared_table = shared_table
+        self.svc_instances = instances
+        self.health_checkers = health_checkers
+        self.sync_interval = config.get("sync_interval", DEFAULT_SYNC_INTERVAL)
+        self.lock_file = None
+        self.synced_version = None
+        self.probe_task: asyncio.Task = None
+        for index, instance in enumerate(instances):
+            instance.attach_shared_table(shared_table, index)
+            instance.add_state_listener(self.write_health_status)
+
+    def is_probe_owner(self) -> bool:
+        return self.lock_file is not None
+
+    def try_become_probe_owner(self) -> bool:
+        lock_file = open(self.lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        # Statuses synced so far become the starting point of the new owner
+        for index, instance in enumerate(self.svc_instances):
+            self.shared_table.set_status(index, instance.get_health_status())
+        return True
+
+    def write_health_status(self, instance: ServiceInstance):
+        if self.is_probe_owner():
+            self.shared_table.set_status(instance.shared_index, instance.get_health_status())
+
+    def read_health_status(self):
+        """
+        Applies the statuses written by the probe owner since the last read
+        """
+        version = self.shared_table.get_health_version()
+        if version == self.synced_version:
+            return
+        self.synced_version = version
+        for index, instance in enumerate(self.svc_instances):
+            instance.set_health_status(self.shared_table.get_status(index))
+
+    async def run_health_checkers(self):
+        await asyncio.gather(*(health_checker.run() for health_checker in self.health_checkers))
+
+    async def run(self):
+        try:
+            while True:
+                if not self.is_probe_owner() and self.try_become_probe_owner():
+                    logger.info("Became health probe owner of %d instances", len(self.svc_instances))
+                    self.probe_task = asyncio.create_task(self.run_health_checkers())
+                if not self.is_probe_owner():
+                    self.read_health_status()
+                await asyncio.sleep(self.sync_interval)
+        finally:
+            if self.probe_task is not None:
+                self.probe_task.cancel()
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
@@ -0,0 +1,168 @@
+import fcntl
+import os
+import tempfile
+from multiprocessing.shared_memory import SharedMemory
+
+from src.models.health_status import HealthStatus
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SLOT_SIZE = 8 # Every slot of the table is a native int64
+HEADER_SLOTS = 3 # num_instances, num_workers, health_version
+STATUSES = list(HealthStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+def get_lock_path(name: str, purpose: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"{name}.{purpose}.lock")
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedInstanceTable:
+    """
+    State of the configured instances shared by all router workers of a
+    host through a shared memory segment. It is a flat array of int64
+    slots:
+
+        num_instances | num_workers | health_version
+        status of every instance
+        pid of every worker
+        in-flight requests of every worker to every instance
+        in-flight requests of every worker in total
+
+    Every slot has a single writer, i.e. the health probe owner for the
+    statuses and each worker for its own in-flight counts, so nothing
+    takes a lock. Aligned int64 stores are not torn, and readers sum the
+    in-flight counts of all workers.
+    """
+    def __init__(self, shm: SharedMemory, worker_index: int = None):
+        self.shm = shm
+        self.slots = shm.buf.cast("q")
+        self.num_instances = self.slots[0]
+        self.num_workers = self.slots[1]
+        self.status_offset = HEADER_SLOTS
+        self.pid_offset = self.status_offset + self.num_instances
+        self.in_flight_offset = self.pid_offset + self.num_workers
+        self.total_offset = self.in_flight_offset + self.num_workers * self.num_instances
+        self.worker_index = worker_index
+
+    @classmethod
+    def create(cls, name: str, num_instances: int, num_workers: int) -> "SharedInstanceTable":
+        """
+        Creates the zeroed segment. Called by the parent process before it
+        starts the workers, which then attach() to it.
+        """
+        num_slots = HEADER_SLOTS + num_instances + num_workers * (num_instances + 2)
+        try:
+            shm = SharedMemory(name=name, create=True, size=num_slots * SLOT_SIZE)
+        except FileExistsError:
+            logger.warning("Replacing stale shared instance table %s", name)
+            stale_shm = SharedMemory(name=name)
+            stale_shm.close()
+            stale_shm.unlink()
+            shm = SharedMemory(name=name, create=True, size=num_slots * SLOT_SIZE)
+        shm.buf[:num_slots * SLOT_SIZE] = bytes(num_slots * SLOT_SIZE)
+        header = shm.buf.cast("q")
+        header[0] = num_instances
+        header[1] = num_workers
+        header.release()
+        table = cls(shm)
+        for index in range(num_instances):
+            table.slots[table.status_offset + index] = STATUS_CODES[HealthStatus.UNHEALTHY]
+        return table
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedInstanceTable":
+        """
+        Attaches a worker to the segment of the parent process and claims
+        a worker slot for it
+        """
+        # Spawned workers share the resource tracker of the parent process,
+        # so the segment is only cleaned up once the parent is gone
+        shm = SharedMemory(name=name)
+        table = cls(shm)
+        table.claim_worker_slot(name)
+        return table
+
+    def claim_worker_slot(self, name: str):
+        """
+        Claims the slot of a worker which is not running(anymore). The
+        in-flight counts of a worker which died are reset, since its
+        requests died with it.
+        """
+        with open(get_lock_path(name, "workers"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            for worker_index in range(self.num_workers):
+                pid = self.slots[self.pid_offset + worker_index]
+                if pid == 0 or not is_process_alive(pid):
+                    self.worker_index = worker_index
+                    self.slots[self.pid_offset + worker_index] = os.getpid()
+                    break
+            else:
+                raise RuntimeError(f"All {self.num_workers} worker slots of {name} are taken")
+        self.reset_in_flight()
+        logger.info("Worker %d claimed slot %d of shared instance table %s",
+                    os.getpid(), self.worker_index, name)
+
+    def reset_in_flight(self):
+        row = self.in_flight_offset + self.worker_index * self.num_instances
+        for slot in range(row, row + self.num_instances):
+            self.slots[slot] = 0
+        self.slots[self.total_offset + self.worker_index] = 0
+
+    def get_health_version(self) -> int:
+        return self.slots[2]
+
+    def get_status(self, index: int) -> HealthStatus:
+        return STATUSES[self.slots[self.status_offset + index]]
+
+    def set_status(self, index: int, status: HealthStatus):
+        """
+        Only called by the health probe owner. The version is bumped after
+        the status is written, so a reader seeing the new version also sees
+        the new status.
+        """
+        self.slots[self.status_offset + index] = STATUS_CODES[status]
+        self.slots[2] += 1
+
+    def add_in_flight(self, index: int, delta: int):
+        """
+        Adjusts the in-flight requests of this worker to the instance
+        """
+        self.slots[self.in_flight_offset + self.worker_index * self.num_instances + index] += delta
+        self.slots[self.total_offset + self.worker_index] += delta
+
+    def get_in_flight(self, index: int) -> int:
+        """
+        Returns the in-flight requests of all workers to the instance
+        """
+        return sum(self.slots[self.in_flight_offset + index:self.total_offset:self.num_instances])
+
+    def get_total_in_flight(self) -> int:
+        """
+        Returns the in-flight requests of all workers to all instances
+        """
+        return sum(self.slots[self.total_offset:self.total_offset + self.num_workers])
+
+    def close(self, unlink: bool = False):
+        """
+        Releases the worker slot, if any, and detaches from the segment.
+        The parent process unlinks it once all workers are gone.
+        """
+        if self.worker_index is not None:
+            self.reset_in_flight()
+            self.slots[self.pid_offset + self.worker_index] = 0
+        self.slots.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
@@ -0,0 +1,112 @@
+import random
+import time
+
+from src.models.health_status import HealthStatus
+from src.models.service_instance import ServiceInstance
+from src.utils.hashing import stable_hash
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_WINDOW = 30
+DEFAULT_AGGRESSION = 1.0
+DEFAULT_MIN_WEIGHT_PERCENT = 10
+
+# Resolution of the per key admission decision
+KEY_BUCKETS = 10000
+
+
+class SlowStart:
+    """
+    Ramps up the traffic of instances which just turned HEALTHY, so a
+    cold instance(JIT not warmed up, empty caches) is not handed its full
+    share right away. During the window seconds after the transition the
+    effective weight of the instance grows from min_weight_percent to
+    100% of its weight, following (elapsed / window) ^ (1 / aggression).
+    The routers admit a request to a ramping instance with the probability
+    of its effective weight and pick another instance otherwise. Requests
+    with a key are admitted by key, so a key moves to a ramping instance
+    once and then stays there.
+    """
+    def __init__(self, instances: list[ServiceInstance], config: dict, time_provider=time.monotonic):
+        self.window = config.get("window", DEFAULT_WINDOW)
+        self.aggression = config.get("aggression", DEFAULT_AGGRESSION)
+        self.min_weight = config.get("min_weight_percent", DEFAULT_MIN_WEIGHT_PERCENT) / 100
+        self.time_provider = time_provider
+        self.random = random.Random()
+        # Instance -> time its ramp started
+        self.ramping_instances: dict[ServiceInstance, float] = {}
+        self.svc_instances = instances
+        for instance in instances:
+            instance.add_state_listener(self.on_state_change)
+
+    def set_instances(self, instances: list[ServiceInstance]):
+        """
+        Follows the instances of a reloaded config, kept instances keep ramping
+        """
+        instance_set = set(instances)
+        for instance in self.svc_instances:
+            if instance not in instance_set:
+                instance.remove_state_listener(self.on_state_change)
+                self.ramping_instances.pop(instance, None)
+        old_instance_set = set(self.svc_instances)
+        for instance in instances:
+            if instance not in old_instance_set:
+                instance.add_state_listener(self.on_state_change)
+        self.svc_instances = instances
+
+    def close(self):
+        """
+        Stops following the state of the instances, once the router using
+        this slow start has been replaced
+        """
+        for instance in self.svc_instances:
+            instance.remove_state_listener(self.on_state_change)
+
+    def on_state_change(self, instance: ServiceInstance):
+        if instance.get_health_status() == HealthStatus.HEALTHY:
+            logger.info("Ramping up traffic of %s over %s seconds", instance.get_url(), self.window)
+            self.ramping_instances[instance] = self.time_provider()
+        else:
+            self.ramping_instances.pop(instance, None)
+
+    def is_ramping(self) -> bool:
+        """
+        Whether any instance is ramping up, cheap enough to call per request.
+        Instances whose window has elapsed are dropped here, so one which is
+        never selected does not keep the routers on the slow path.
+        """
+        if not self.ramping_instances:
+            return False
+        now = self.time_provider()
+        for instance in [instance for instance, start_time in self.ramping_instances.items()
+                         if now - start_time >= self.window]:
+            del self.ramping_instances[instance]
+            logger.info("Finished ramping up traffic of %s", instance.get_url())
+        return bool(self.ramping_instances)
+
+    def get_weight_factor(self, instance: ServiceInstance) -> float:
+        """
+        Returns the fraction(min_weight to 1) of its weight the instance
+        currently gets
+        """
+        start_time = self.ramping_instances.get(instance)
+        if start_time is None:
+            return 1.0
+        elapsed = self.time_provider() - start_time
+        if elapsed >= self.window:
+            del self.ramping_instances[instance]
+            logger.info("Finished ramping up traffic of %s", instance.get_url())
+            return 1.0
+        return max(self.min_weight, (max(elapsed, 0) / self.window) ** (1 / self.aggression))
+
+    def admit(self, instance: ServiceInstance, request_key: str = None) -> bool:
+        """
+        Whether the request may go to the instance
+        """
+        weight_factor = self.get_weight_factor(instance)
+        if weight_factor >= 1.0:
+            return True
+        if request_key is None:
+            return self.random.random() < weight_factor
+        return stable_hash(request_key) % KEY_BUCKETS < weight_factor * KEY_BUCKETS
@@ -0,0 +1,84 @@
+from array import array
+from bisect import bisect_left
+
+DEFAULT_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket bounds. The bucket counts live in an
+    array preallocated up front, so observing a value is a binary search
+    over the bounds and two in-place updates, without allocating any
+    per-request state.
+    """
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: list[float] = None):
+        self.bounds = tuple(bounds or DEFAULT_LATENCY_BUCKETS)
+        # One count per bound and a last one for +Inf, not cumulative
+        self.counts = array("q", bytes(8 * (len(self.bounds) + 1)))
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def get_count(self) -> int:
+        return sum(self.counts)
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')
+                                      .replace("\n", "\\n"))
+                     for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class MetricsWriter:
+    """
+    Renders metrics in the Prometheus text exposition format
+    """
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def write_header(self, name: str, metric_type: str, description: str):
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def write_sample(self, name: str, labels: dict, value: float):
+        self.lines.append(f"{name}{format_labels(labels)} {value}")
+
+    def write_histogram(self, name: str, labels: dict, histogram: Histogram):
+        cumulative_count = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative_count += count
+            self.write_sample(f"{name}_bucket", {**labels, "le": bound}, cumulative_count)
+        cumulative_count += histogram.counts[-1]
+        self.write_sample(f"{name}_bucket", {**labels, "le": "+Inf"}, cumulative_count)
+        self.write_sample(f"{name}_sum", labels, histogram.sum)
+        self.write_sample(f"{name}_count", labels, cumulative_count)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
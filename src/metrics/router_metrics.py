@@ -0,0 +1,237 @@
+from src.metrics.metrics import Counter, Gauge, Histogram, MetricsWriter
+from src.models.health_status import HealthStatus
+from src.models.service_instance import ServiceInstance
+from src.router.concurrency_limiter import ConcurrencyLimiter
+from src.router.request_batcher import RequestBatcher
+from src.router.response_cache import ResponseCache
+from src.utils.logger_config import get_dropped_log_records
+
+SELECTION_BUCKETS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3]
+# Phases of traced requests, total being the whole time in the router-service
+PHASES = ("parse", "queue", "select", "connect", "upstream", "encode", "total")
+
+
+class InstanceMetrics:
+    """
+    Metrics of one instance, allocated once when the router starts
+    """
+    __slots__ = ("instance", "labels", "successes", "failures", "latency", "transitions")
+
+    def __init__(self, instance: ServiceInstance, latency_buckets: list[float]):
+        self.instance = instance
+        self.labels = {"instance": instance.get_url()}
+        self.successes = Counter()
+        self.failures = Counter()
+        self.latency = Histogram(latency_buckets)
+        self.transitions = {status: Counter() for status in HealthStatus}
+
+
+class RouterMetrics:
+    """
+    Metrics of the router service exposed on /metrics. The hot path only
+    bumps counters and histograms allocated up front, while gauges like
+    the health status and the requests in flight are read from the
+    instances when the metrics are scraped.
+    """
+    def __init__(self, instances: list[ServiceInstance], config: dict):
+        self.latency_buckets = config.get("latency_buckets")
+        self.instance_metrics: dict[ServiceInstance, InstanceMetrics] = {}
+        self.selection_time = Histogram(SELECTION_BUCKETS)
+        self.probe_duration = Histogram(self.latency_buckets)
+        self.healthcheck_lag = Gauge()
+        self.response_caches: list[ResponseCache] = []
+        self.request_batchers: list[RequestBatcher] = []
+        self.concurrency_limiters: list[ConcurrencyLimiter] = []
+        self.phase_durations: dict[str, Histogram] = None
+        self.span_exporter = None
+        self.add_instances(instances)
+
+    def add_instances(self, instances: list[ServiceInstance]):
+        for instance in instances:
+            if instance not in self.instance_metrics:
+                self.instance_metrics[instance] = InstanceMetrics(instance, self.latency_buckets)
+                instance.add_state_listener(self.record_transition)
+
+    def remove_instances(self, instances: list[ServiceInstance]):
+        """
+        Drops the metrics of instances removed on a config reload, once
+        their last request is done
+        """
+        for instance in instances:
+            if self.instance_metrics.pop(instance, None) is not None:
+                instance.remove_state_listener(self.record_transition)
+
+    def observe_response(self, instance: ServiceInstance, response_time: float, failed: bool):
+        instance_metrics = self.instance_metrics.get(instance)
+        if instance_metrics is None:
+            # Removed on a config reload while the request was in flight
+            return
+        instance_metrics.latency.observe(response_time)
+        if failed:
+            instance_metrics.failures.value += 1
+        else:
+            instance_metrics.successes.value += 1
+
+    def add_response_cache(self, response_cache: ResponseCache):
+        """
+        Adds the counters of the response cache of an upstream pool to the
+        cache metrics, which sum up the caches of all pools. A cache taken
+        over by the router of a reloaded pool is only counted once.
+        """
+        if response_cache not in self.response_caches:
+            self.response_caches.append(response_cache)
+
+    def remove_response_cache(self, response_cache: ResponseCache):
+        self.response_caches.remove(response_cache)
+
+    def add_request_batcher(self, request_batcher: RequestBatcher):
+        """
+        Adds the counters of the request batcher of an upstream pool to the
+        batching metrics, which sum up the batchers of all pools. A batcher
+        taken over by the router of a reloaded pool is only counted once.
+        """
+        if request_batcher not in self.request_batchers:
+            self.request_batchers.append(request_batcher)
+
+    def remove_request_batcher(self, request_batcher: RequestBatcher):
+        self.request_batchers.remove(request_batcher)
+
+    def add_concurrency_limiter(self, concurrency_limiter: ConcurrencyLimiter):
+        """
+        Adds the concurrency limiter of an upstream pool to the admission
+        control metrics, which sum up the limiters of all pools
+        """
+        if concurrency_limiter not in self.concurrency_limiters:
+            self.concurrency_limiters.append(concurrency_limiter)
+
+    def remove_concurrency_limiter(self, concurrency_limiter: ConcurrencyLimiter):
+        self.concurrency_limiters.remove(concurrency_limiter)
+
+    def enable_tracing(self, span_exporter=None):
+        """
+        Adds the time traced requests spend in each phase, and the spans
+        dropped by the span exporter if any
+        """
+        self.phase_durations = {phase: Histogram(self.latency_buckets) for phase in PHASES}
+        self.span_exporter = span_exporter
+
+    def observe_phases(self, phases: dict[str, float], duration: float):
+        phase_durations = self.phase_durations
+        for phase, phase_duration in phases.items():
+            phase_durations[phase].observe(phase_duration)
+        phase_durations["total"].observe(duration)
+
+    def record_transition(self, instance: ServiceInstance):
+        self.instance_metrics[instance].transitions[instance.get_health_status()].inc()
+
+    def render(self) -> str:
+        writer = MetricsWriter()
+        all_instance_metrics = self.instance_metrics.values()
+
+        writer.write_header("router_requests_total", "counter",
+                            "Requests proxied to the instance by outcome")
+        for instance_metrics in all_instance_metrics:
+            writer.write_sample("router_requests_total",
+                                {**instance_metrics.labels, "outcome": "success"},
+                                instance_metrics.successes.value)
+            writer.write_sample("router_requests_total",
+                                {**instance_metrics.labels, "outcome": "failure"},
+                                instance_metrics.failures.value)
+
+        writer.write_header("router_upstream_response_seconds", "histogram",
+                            "Response time of the instance")
+        for instance_metrics in all_instance_metrics:
+            writer.write_histogram("router_upstream_response_seconds", instance_metrics.labels,
+                                   instance_metrics.latency)
+
+        writer.write_header("router_in_flight_requests", "gauge", "Requests in flight to the instance")
+        for instance_metrics in all_instance_metrics:
+            writer.write_sample("router_in_flight_requests", instance_metrics.labels,
+                                instance_metrics.instance.get_in_flight_requests())
+
+        writer.write_header("router_instance_health", "gauge",
+                            "1 for the current health status of the instance, 0 for the others")
+        for instance_metrics in all_instance_metrics:
+            health_status = instance_metrics.instance.get_health_status()
+            for status in HealthStatus:
+                writer.write_sample("router_instance_health",
+                                    {**instance_metrics.labels, "status": status.value},
+                                    int(status == health_status))
+
+        writer.write_header("router_health_transitions_total", "counter",
+                            "Health status transitions of the instance by new status")
+        for instance_metrics in all_instance_metrics:
+            for status, transitions in instance_metrics.transitions.items():
+                writer.write_sample("router_health_transitions_total",
+                                    {**instance_metrics.labels, "status": status.value}, transitions.value)
+
+        writer.write_header("router_selection_seconds", "histogram", "Time taken to select an instance")
+        writer.write_histogram("router_selection_seconds", {}, self.selection_time)
+        writer.write_header("router_healthcheck_duration_seconds", "histogram",
+                            "Duration of the healthchecks")
+        writer.write_histogram("router_healthcheck_duration_seconds", {}, self.probe_duration)
+        writer.write_header("router_healthcheck_lag_seconds", "gauge",
+                            "Time the latest healthcheck started after it was due")
+        writer.write_sample("router_healthcheck_lag_seconds", {}, self.healthcheck_lag.value)
+        if self.response_caches:
+            self.write_response_cache_metrics(writer)
+        if self.request_batchers:
+            self.write_batching_metrics(writer)
+        if self.concurrency_limiters:
+            self.write_admission_control_metrics(writer)
+        if self.phase_durations is not None:
+            self.write_tracing_metrics(writer)
+        writer.write_header("router_dropped_log_records_total", "counter",
+                            "Log records dropped because the log queue was full")
+        writer.write_sample("router_dropped_log_records_total", {}, get_dropped_log_records())
+        return writer.render()
+
+    def write_response_cache_metrics(self, writer: MetricsWriter):
+        caches = self.response_caches
+        writer.write_header("router_response_cache_requests_total", "counter",
+                            "Requests to cached routes by result: served from the cache(hit), sent "
+                            "upstream(miss) or waiting for an identical request in flight(coalesced)")
+        for result, get_counter in (("hit", lambda cache: cache.hits),
+                                    ("miss", lambda cache: cache.misses),
+                                    ("coalesced", lambda cache: cache.coalesced)):
+            writer.write_sample("router_response_cache_requests_total", {"result": result},
+                                sum(get_counter(cache).value for cache in caches))
+        writer.write_header("router_response_cache_evictions_total", "counter",
+                            "Cached responses evicted to stay within the size limits")
+        writer.write_sample("router_response_cache_evictions_total", {},
+                            sum(cache.evictions.value for cache in caches))
+        writer.write_header("router_response_cache_entries", "gauge", "Cached responses")
+        writer.write_sample("router_response_cache_entries", {},
+                            sum(cache.get_num_entries() for cache in caches))
+        writer.write_header("router_response_cache_bytes", "gauge",
+                            "Approximate size of the cached responses")
+        writer.write_sample("router_response_cache_bytes", {}, sum(cache.num_bytes for cache in caches))
+
+    def write_batching_metrics(self, writer: MetricsWriter):
+        batchers = self.request_batchers
+        writer.write_header("router_batches_total", "counter", "Batches of requests sent to the instances")
+        writer.write_sample("router_batches_total", {}, sum(batcher.batches.value for batcher in batchers))
+        writer.write_header("router_batched_requests_total", "counter",
+                            "Requests sent to the instances in batches")
+        writer.write_sample("router_batched_requests_total", {},
+                            sum(batcher.batched_requests.value for batcher in batchers))
+
+    def write_admission_control_metrics(self, writer: MetricsWriter):
+        limiters = self.concurrency_limiters
+        writer.write_header("router_shed_requests_total", "counter",
+                            "Requests shed by admission control with a 503")
+        writer.write_sample("router_shed_requests_total", {}, sum(limiter.num_shed for limiter in limiters))
+        writer.write_header("router_concurrency_limit", "gauge",
+                            "Current limit of the requests routed at a time")
+        writer.write_sample("router_concurrency_limit", {}, sum(int(limiter.limit) for limiter in limiters))
+
+    def write_tracing_metrics(self, writer: MetricsWriter):
+        writer.write_header("router_request_phase_seconds", "histogram",
+                            "Time requests spend in each phase of their handling")
+        for phase, phase_duration in self.phase_durations.items():
+            writer.write_histogram("router_request_phase_seconds", {"phase": phase}, phase_duration)
+        if self.span_exporter is not None:
+            writer.write_header("router_dropped_spans_total", "counter",
+                                "Sampled spans dropped because the export queue was full or "
+                                "the export failed")
+            writer.write_sample("router_dropped_spans_total", {}, self.span_exporter.dropped_spans)
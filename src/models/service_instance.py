@@ -8,13 +8,20 @@ logger = setup_logger(__name__)
 
 
 class ServiceInstance:
-    def __init__(self, url: str):
+    def __init__(self, url: str, weight: int = 1):
         self.url = url
+        # relative capacity of the instance, used by weighted routing algorithms
+        self.weight = weight
         # assume every service instance starts out as unhealthy
         self.health_status = HealthStatus.UNHEALTHY 
         self.last_healthcheck_time = time.time()
         self.state_transition_ctr = 0
         self.min_state_transition_requests = 3
+        self.state_listeners = []
+        self.in_flight_requests = 0
+        # Table shared with the other router workers of the host, if any
+        self.shared_table = None
+        self.shared_index = None
 
     def update_health_status(self, new_status: HealthStatus):
         """
@@ -26,15 +33,51 @@ class ServiceInstance:
             return
 
         self.state_transition_ctr += 1
-        logger.info(f"New health status of {new_status} received for {self.url}")
+        logger.info("New health status of %s received for %s", new_status, self.url)
         if self.state_transition_ctr < self.min_state_transition_requests:
-            logger.info(f"Will monitor for {self.min_state_transition_requests - self.state_transition_ctr} "
-                        f"more intervals before transitioning")
+            logger.info("Will monitor for %d more intervals before transitioning",
+                        self.min_state_transition_requests - self.state_transition_ctr)
             return
 
         self.health_status = new_status
         self.state_transition_ctr = 0
-        logger.info(f"Transitioned {self.url} to {new_status}")
+        logger.info("Transitioned %s to %s", self.url, new_status)
+        self.notify_state_listeners()
+
+    def set_health_status(self, new_status: HealthStatus):
+        """
+        Applies a health status decided elsewhere, i.e. by the health probe
+        owner of the host, without waiting for further healthchecks
+        """
+        self.state_transition_ctr = 0
+        if new_status == self.health_status:
+            return
+        self.health_status = new_status
+        logger.info("Transitioned %s to %s", self.url, new_status)
+        self.notify_state_listeners()
+
+    def attach_shared_table(self, shared_table, index: int):
+        """
+        Counts the in-flight requests of the instance in the table shared
+        with the other router workers, at the given row
+        """
+        self.shared_table = shared_table
+        self.shared_index = index
+
+    def add_state_listener(self, listener):
+        """
+        Registers a callable which is invoked with this instance
+        every time its routing related state changes
+        """
+        self.state_listeners.append(listener)
+
+    def remove_state_listener(self, listener):
+        if listener in self.state_listeners:
+            self.state_listeners.remove(listener)
+
+    def notify_state_listeners(self):
+        for listener in self.state_listeners:
+            listener(self)
 
     def get_health_status(self):
         return self.health_status
@@ -42,9 +85,30 @@ class ServiceInstance:
     def get_url(self):
         return self.url
 
+    def get_weight(self):
+        return self.weight
+
     def get_last_healthcheck_time(self):
         return self.last_healthcheck_time
 
     def update_last_healthcheck_time(self, check_time):
         self.last_healthcheck_time = check_time
-        
\ No newline at end of file
+
+    def start_request(self):
+        self.in_flight_requests += 1
+        if self.shared_table is not None:
+            self.shared_table.add_in_flight(self.shared_index, 1)
+
+    def finish_request(self):
+        self.in_flight_requests -= 1
+        if self.shared_table is not None:
+            self.shared_table.add_in_flight(self.shared_index, -1)
+
+    def get_in_flight_requests(self):
+        """
+        Returns the requests in flight to the instance, from all router
+        workers of the host if they share their state
+        """
+        if self.shared_table is not None:
+            return self.shared_table.get_in_flight(self.shared_index)
+        return self.in_flight_requests
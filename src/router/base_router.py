@@ -1,7 +1,574 @@
+import asyncio
+import json
+import time
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable
+
+import httpx
+from fastapi import HTTPException
+
+from src.health.routable_instances import RoutableInstances
+from src.health.outlier_detector import OutlierDetector
+from src.health.circuit_breaker import CircuitBreakers, CircuitOpenError
+from src.health.slow_start import SlowStart
+from src.health.shared_instance_table import SharedInstanceTable
+from src.metrics.router_metrics import RouterMetrics
+from src.router.concurrency_limiter import ConcurrencyLimiter
+from src.router.hedging import HedgingPolicy
+from src.router.request_batcher import RequestBatcher
+from src.router.response_cache import ResponseCache, is_shareable
+from src.router.retry_policy import RetryPolicy
+from src.models.service_instance import ServiceInstance
+from src.tracing.tracer import current_span, record_phase
+from src.utils.http.http_client import HttpClient
+from src.utils.http.upstream_response import UpstreamResponse, UpstreamStream
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def is_instance_failure(error: Exception) -> bool:
+    """
+    Whether the error points at a problem of the instance, i.e. anything
+    but a 4xx response, which is the client's fault
+    """
+    return not (isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500)
+
+
+def is_dropped(error: Exception) -> bool:
+    """
+    Whether a failed request counts as dropped for the concurrency limit,
+    i.e. it timed out, failed to connect or got a 5xx. Failures unrelated
+    to the load of the instances, like a 4xx or no healthy instance, do
+    not lower the limit.
+    """
+    if isinstance(error, HTTPException):
+        # Mapped from the downstream error, if any
+        error = error.__cause__
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (TimeoutError, httpx.TimeoutException, httpx.NetworkError,
+                              httpx.RemoteProtocolError))
+
+
+def get_canonical_json(payload) -> bytes:
+    """
+    Serializes the payload with sorted keys and without whitespace, so
+    equal payloads serialize to the same bytes
+    """
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+
+
+def get_path(endpoint: str, query: str) -> str:
+    """
+    Path of the downstream request, i.e. the endpoint with the query string if any
+    """
+    return f"{endpoint}?{query}" if query else endpoint
 
 
 class Router(ABC):
+    """
+    Base class of all routing algorithms. Subclasses only decide which
+    instance takes the next request in select_instance(); forwarding the
+    request and mapping downstream failures is shared by all of them.
+    """
+    def __init__(self, instances: list[ServiceInstance], http_client: HttpClient,
+                 routable_instances: RoutableInstances = None):
+        self.svc_instances: list = instances
+        self.http_client: HttpClient = http_client
+        # Snapshot of healthy instances published by the healthchecker
+        self.routable_instances = routable_instances or RoutableInstances(instances)
+        self.in_flight_requests = 0 # Requests in flight across all instances
+        self.hedging_policy: HedgingPolicy = None
+        self.retry_policy: RetryPolicy = None
+        self.outlier_detector: OutlierDetector = None
+        self.circuit_breakers: CircuitBreakers = None
+        self.slow_start: SlowStart = None
+        self.shared_table: SharedInstanceTable = None
+        self.metrics: RouterMetrics = None
+        self.concurrency_limiter: ConcurrencyLimiter = None
+        self.response_cache: ResponseCache = None
+        self.request_batcher: RequestBatcher = None
+
     @abstractmethod
-    async def route(self, endpoint:str, request_payload: dict) -> dict:
+    def select_instance(self, request_key: str = None,
+                        is_available: Callable[[ServiceInstance], bool] = None) -> ServiceInstance | None:
+        """
+        Picks the instance which takes the next request from the current
+        snapshot of routable instances. Returns None if there is none.
+        request_key identifies requests which should preferably go to the
+        same instance, if the routing algorithm cares about it.
+        If is_available is given, only instances it returns True for, i.e.
+        which can take the request right now, are picked.
+        """
+        pass
+
+    def get_request_key(self, payload: dict = None,
+                        headers: list[tuple[str, str]] = None, body: bytes = None) -> str | None:
+        """
+        Extracts the request_key passed to select_instance() from the request.
+        Routers with affinity override it.
+        """
+        return None
+
+    def enable_hedging(self, hedging_policy: HedgingPolicy):
+        """
+        Enables hedged requests for the idempotent routes of the policy
+        """
+        self.hedging_policy = hedging_policy
+
+    def enable_retries(self, retry_policy: RetryPolicy):
+        """
+        Enables retrying failed requests on other instances
+        """
+        self.retry_policy = retry_policy
+
+    def enable_outlier_detection(self, outlier_detector: OutlierDetector):
+        """
+        Feeds the outcome of every request to the passive health tracking
+        """
+        self.outlier_detector = outlier_detector
+
+    def enable_circuit_breakers(self, circuit_breakers: CircuitBreakers):
+        """
+        Fails requests to instances with an open circuit fast, without
+        a connection attempt, and probes them again when half-open
+        """
+        self.circuit_breakers = circuit_breakers
+
+    def enable_slow_start(self, slow_start: SlowStart):
+        """
+        Ramps up the share of traffic of instances which just turned HEALTHY
+        """
+        self.slow_start = slow_start
+
+    def enable_shared_table(self, shared_table: SharedInstanceTable):
+        """
+        Takes the requests in flight of the other router workers of the
+        host into account, as counted in their shared instance table
+        """
+        self.shared_table = shared_table
+
+    def enable_admission_control(self, concurrency_limiter: ConcurrencyLimiter):
+        """
+        Limits the requests routed at a time, queueing or shedding the rest
+        """
+        self.concurrency_limiter = concurrency_limiter
+
+    def enable_response_cache(self, response_cache: ResponseCache):
+        """
+        Serves identical requests to the routes of the cache from its
+        cached responses, and coalesces those in flight at the same time
+        """
+        self.response_cache = response_cache
+
+    def enable_batching(self, request_batcher: RequestBatcher):
+        """
+        Sends the JSON requests to the routes of the batcher to each
+        instance in batches, through its batch endpoint
+        """
+        self.request_batcher = request_batcher
+
+    def enable_metrics(self, metrics: RouterMetrics):
+        """
+        Records the outcome and response time of every request and the
+        time taken to select instances
+        """
+        self.metrics = metrics
+        if self.response_cache is not None:
+            metrics.add_response_cache(self.response_cache)
+        if self.request_batcher is not None:
+            metrics.add_request_batcher(self.request_batcher)
+        if self.concurrency_limiter is not None:
+            metrics.add_concurrency_limiter(self.concurrency_limiter)
+
+    def take_over(self, previous_router: "Router"):
+        """
+        Called on a config reload which keeps the routing algorithm and its
+        config, with the router this one replaces. Routers which learn about
+        the instances override it to carry that over for the kept instances.
+        """
         pass
+
+    def close(self, kept_router: "Router" = None):
+        """
+        Called once the router has been replaced, e.g. on a config reload,
+        or discarded. Requests still in flight through it complete as usual.
+        The components it shares with kept_router, the router which stays in
+        use, follow the instances of that router instead of being closed.
+        """
+        if self.slow_start is not None:
+            if kept_router is not None and kept_router.slow_start is self.slow_start:
+                self.slow_start.set_instances(kept_router.svc_instances)
+            else:
+                self.slow_start.close()
+        if kept_router is not None and kept_router.outlier_detector is self.outlier_detector is not None:
+            self.outlier_detector.set_instances(kept_router.svc_instances)
+        if kept_router is not None and kept_router.circuit_breakers is self.circuit_breakers is not None:
+            self.circuit_breakers.set_instances(kept_router.svc_instances)
+        if self.metrics is not None and self.response_cache is not None and (
+                kept_router is None or kept_router.response_cache is not self.response_cache):
+            self.metrics.remove_response_cache(self.response_cache)
+        if self.metrics is not None and self.request_batcher is not None and (
+                kept_router is None or kept_router.request_batcher is not self.request_batcher):
+            self.metrics.remove_request_batcher(self.request_batcher)
+        if self.metrics is not None and self.concurrency_limiter is not None and (
+                kept_router is None or kept_router.concurrency_limiter is not self.concurrency_limiter):
+            self.metrics.remove_concurrency_limiter(self.concurrency_limiter)
+
+    def record_response(self, instance: ServiceInstance, response_time: float, failed: bool):
+        """
+        Called once the downstream response of a request routed to the given
+        instance arrived or failed. Routers which adapt to the observed
+        latency or errors override it.
+        """
+        pass
+
+    async def get_next_service_instance(self, request_key: str = None):
+        """
+        Determines the next available healthy instance to route 
+        the incoming request. Returns the instance URL if a healthy
+        instance is found, else returns None.
+        """
+        instance = self.select_instance(request_key)
+        if instance is None:
+            logger.error("No healthy instances available")
+            return None
+        return instance.get_url()
+
+    async def route(self, endpoint: str, request_payload: dict,
+                    headers: list[tuple[str, str]] = None, query: str = "") -> dict:
+        """
+        Routes the incoming request to the next available healthy instance.
+        Returns the response received from downstream instance if it is available,
+        else returns an appropriate HTTP error. The headers are not forwarded,
+        they only carry the priority class of the request. Requests to the
+        routes of the request batcher go to their instance in a batch.
+        """
+        request_batcher = self.request_batcher
+        if request_batcher is not None and request_batcher.is_batched(endpoint):
+            path = get_path(request_batcher.get_batch_endpoint(endpoint), query)
+            send = lambda target_url: request_batcher.submit(target_url + path, request_payload)
+        else:
+            path = get_path(endpoint, query)
+            send = lambda target_url: self.http_client.post(target_url + path, request_payload)
+        send_request = lambda: self.forward_to_next_instance(
+            send,
+            self.get_request_key(payload=request_payload),
+            endpoint,
+            headers,
+            "POST"
+        )
+        response_cache = self.response_cache
+        if response_cache is None or not response_cache.is_cached("POST", endpoint):
+            return await send_request()
+        # The headers are not forwarded, so they can not change the response
+        key = response_cache.get_key("POST", endpoint, query, get_canonical_json(request_payload))
+        return await response_cache.get_or_load(key, send_request,
+                                                lambda response: len(get_canonical_json(response)))
+
+    async def route_bytes(self, endpoint: str, body: bytes, headers: list[tuple[str, str]],
+                          method: str = "POST", query: str = "") -> UpstreamResponse:
+        """
+        Passthrough variant of route() which forwards the raw request bytes
+        and returns the upstream response unchanged, whatever its status.
+        Raises an appropriate HTTP error if no instance could be reached.
+        """
+        path = get_path(endpoint, query)
+        send_request = lambda: self.forward_to_next_instance(
+            lambda target_url: self.http_client.forward(method, target_url + path, body, headers),
+            self.get_request_key(headers=headers, body=body),
+            endpoint,
+            headers,
+            method
+        )
+        response_cache = self.response_cache
+        if response_cache is None or not response_cache.is_cached(method, endpoint):
+            return await send_request()
+        key = response_cache.get_key(method, endpoint, query, body, headers)
+        return await response_cache.get_or_load(key, send_request, UpstreamResponse.get_size,
+                                                lambda response: response.status_code == 200,
+                                                lambda response: is_shareable(response.headers))
+
+    async def route_stream(self, endpoint: str, body: AsyncIterator[bytes] | None,
+                           headers: list[tuple[str, str]], method: str = "POST",
+                           query: str = "") -> UpstreamStream:
+        """
+        Streaming variant of route_bytes() which forwards the request body
+        chunk by chunk and returns as soon as the upstream response starts.
+        Raises an appropriate HTTP error if no instance could be reached.
+        """
+        path = get_path(endpoint, query)
+        return await self.forward_to_next_instance(
+            lambda target_url: self.http_client.stream(method, target_url + path, body, headers),
+            self.get_request_key(headers=headers),
+            headers=headers
+        )
+
+    async def forward_to_next_instance(self, send, request_key: str = None, endpoint: str = None,
+                                       headers: list[tuple[str, str]] = None, method: str = "POST"):
+        """
+        Calls send() with the URL of the next available healthy instance
+        and maps failures to the HTTP errors returned to the client.
+        Requests may be retried on other instances and, for routes of the
+        hedging policy, hedged. Streamed requests pass no endpoint and are
+        neither, since their body can only be sent once.
+        With admission control, the request first has to be admitted by the
+        concurrency limiter, according to the priority class in its headers,
+        and the time until the response(headers of a stream) adapts the limit.
+        """
+        concurrency_limiter = self.concurrency_limiter
+        if concurrency_limiter is None:
+            return await self.send_request(send, request_key, endpoint, method)
+
+        queue_start_time = time.monotonic()
+        await concurrency_limiter.acquire(concurrency_limiter.get_priority(headers))
+        record_phase("queue", queue_start_time)
+        start_time = time.monotonic()
+        dropped = False
+        try:
+            response = await self.send_request(send, request_key, endpoint, method)
+            dropped = isinstance(response, (UpstreamResponse, UpstreamStream)) and response.status_code >= 500
+            return response
+        except Exception as e:
+            dropped = is_dropped(e)
+            raise
+        finally:
+            concurrency_limiter.release(time.monotonic() - start_time, dropped)
+
+    async def send_request(self, send, request_key: str = None, endpoint: str = None,
+                           method: str = "POST"):
+        try:
+            if endpoint is None:
+                return await self.send_to_instance(self.pick_instance(request_key), send)
+            return await self.send_with_retries(send, request_key, endpoint, method)
+        except HTTPException:
+            raise
+        except httpx.HTTPStatusError as e:
+            # The error status of the instance, e.g. of a JSON request, is passed on to the client
+            logger.error("Error from downstream instance: %s", e)
+            raise HTTPException(status_code=e.response.status_code,
+                                detail="Error received from downstream instance") from e
+        except Exception as e:
+            logger.error("Error from downstream instance: %s", e)
+            raise HTTPException(status_code=500,
+                                detail="Error received from downstream instance") from e
+
+    def pick_instance(self, request_key: str = None) -> ServiceInstance:
+        metrics = self.metrics
+        span = current_span.get()
+        if metrics is None and span is None:
+            instance = self.select_available_instance(request_key)
+        else:
+            start_time = time.perf_counter()
+            instance = self.select_available_instance(request_key)
+            selection_time = time.perf_counter() - start_time
+            if metrics is not None:
+                metrics.selection_time.observe(selection_time)
+            if span is not None:
+                span.add_phase("select", selection_time)
+        if instance is None:
+            logger.error("No healthy instances available")
+            raise HTTPException(status_code=500,
+                                detail="No healthy downstream instance available")
+        return instance
+
+    async def send_to_instance(self, instance: ServiceInstance, send):
+        """
+        Calls send() with the URL of the given instance. The instance
+        counts the request as in flight until its response is complete,
+        which for a stream is when the stream gets closed.
+        Raises CircuitOpenError right away if the circuit of the instance
+        does not let the request through.
+        """
+        circuit_breakers = self.circuit_breakers
+        if circuit_breakers is not None and not circuit_breakers.try_acquire(instance):
+            raise CircuitOpenError(f"Circuit of {instance.get_url()} is open")
+        self.start_request(instance)
+        span = current_span.get()
+        if span is not None:
+            span.instances.append(instance.get_url())
+        start_time = time.monotonic()
+        try:
+            response = await send(instance.get_url())
+        except Exception as e:
+            self.finish_request(instance)
+            self.observe_response(instance, time.monotonic() - start_time, is_instance_failure(e))
+            raise
+        except BaseException:
+            self.finish_request(instance)
+            if circuit_breakers is not None:
+                circuit_breakers.release(instance)
+            raise
+        failed = isinstance(response, (UpstreamResponse, UpstreamStream)) and response.status_code >= 500
+        self.observe_response(instance, time.monotonic() - start_time, failed)
+        if isinstance(response, UpstreamStream):
+            response.add_close_callback(lambda: self.finish_request(instance))
+        else:
+            self.finish_request(instance)
+        return response
+
+    async def send_with_retries(self, send, request_key: str, endpoint: str, method: str = "POST"):
+        """
+        Sends the request and, on a connection error or, if the request is
+        idempotent, a retryable status code, retries it on an instance which
+        has not been tried yet, with jittered backoff, as long as the retry
+        budget permits. Returns the last response or raises the last error
+        once out of retries or out of untried instances.
+        """
+        retry_policy = self.retry_policy
+        if retry_policy is not None:
+            retry_policy.budget.deposit()
+        instance = self.pick_instance(request_key)
+        tried_instances = []
+        retry = 0
+        while True:
+            tried_instances.append(instance)
+            try:
+                response = await self.send_attempt(instance, send, request_key, endpoint, tried_instances)
+            except Exception as e:
+                if (retry_policy is None or not retry_policy.is_retryable_error(e, method, endpoint)
+                        or retry >= retry_policy.max_retries):
+                    raise
+                failed_instance = instance
+                instance = self.select_other_instance(tried_instances, request_key)
+                if instance is None or not retry_policy.budget.try_spend():
+                    raise
+                logger.warning("Retrying request to %s after error from %s: %s",
+                               endpoint, failed_instance.get_url(), e)
+            else:
+                if (retry_policy is None
+                        or not retry_policy.is_retryable_response(response, method, endpoint)
+                        or retry >= retry_policy.max_retries):
+                    return response
+                failed_instance = instance
+                instance = self.select_other_instance(tried_instances, request_key)
+                if instance is None or not retry_policy.budget.try_spend():
+                    return response
+                logger.warning("Retrying request to %s after status %d from %s",
+                               endpoint, response.status_code, failed_instance.get_url())
+
+            await asyncio.sleep(retry_policy.get_backoff(retry))
+            retry += 1
+
+    async def send_attempt(self, instance: ServiceInstance, send, request_key: str, endpoint: str,
+                           tried_instances: list[ServiceInstance]):
+        if self.hedging_policy is not None and self.hedging_policy.is_hedged(endpoint):
+            return await self.send_hedged(instance, send, request_key, endpoint, tried_instances)
+        return await self.send_to_instance(instance, send)
+
+    async def send_hedged(self, primary: ServiceInstance, send, request_key: str, endpoint: str,
+                          tried_instances: list[ServiceInstance]):
+        """
+        Sends the request to the primary instance and, if it has not answered
+        within the hedge delay of the route, once more to another instance
+        not tried yet, budget permitting, which is added to tried_instances.
+        The first successful response wins and the other request is
+        cancelled. An error, or a response with a retryable status code,
+        loses while the other request is still running.
+        """
+        start_time = time.monotonic()
+        hedge_delay = self.hedging_policy.start_request(endpoint)
+        tasks = [asyncio.ensure_future(self.send_to_instance(primary, send))]
+        try:
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self.hedging_policy.try_hedge(endpoint):
+                    secondary = self.select_other_instance(tried_instances, request_key)
+                    if secondary is not None:
+                        logger.debug("Hedging request to %s on %s", endpoint, secondary.get_url())
+                        tried_instances.append(secondary)
+                        tasks.append(asyncio.ensure_future(self.send_to_instance(secondary, send)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and (
+                            not pending or not self.is_retryable_status(task.result())):
+                        self.hedging_policy.record_latency(endpoint, time.monotonic() - start_time)
+                        return task.result()
+            # Every attempt failed, report the failure of the first one
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def is_retryable_status(self, response) -> bool:
+        """
+        Whether a response has a status code the retry policy retries, or
+        without one a 5xx. Hedged routes are idempotent, so the method does
+        not matter.
+        """
+        if not isinstance(response, (UpstreamResponse, UpstreamStream)):
+            return False
+        if self.retry_policy is not None:
+            return response.status_code in self.retry_policy.retryable_status_codes
+        return response.status_code >= 500
+
+    def select_other_instance(self, excluded_instances: list[ServiceInstance],
+                              request_key: str = None) -> ServiceInstance | None:
+        """
+        Selects an instance other than the excluded ones, or None if there
+        is no other available instance
+        """
+        return self.select_available_instance(request_key, excluded_instances)
+
+    def select_available_instance(self, request_key: str = None,
+                                  excluded_instances: list[ServiceInstance] = ()) -> ServiceInstance | None:
+        """
+        Selects an instance which is not excluded, whose circuit lets a
+        request through and which slow start admits the request to, or
+        None if there is none. An instance only turned down by slow start
+        is still returned over None.
+        Without any of these this is select_instance().
+        """
+        circuit_breakers = self.circuit_breakers
+        slow_start = self.slow_start if self.slow_start is not None and self.slow_start.is_ramping() else None
+        if circuit_breakers is None and slow_start is None and not excluded_instances:
+            return self.select_instance(request_key)
+
+        def is_available(instance: ServiceInstance) -> bool:
+            return (instance not in excluded_instances
+                    and (circuit_breakers is None or circuit_breakers.is_available(instance)))
+
+        ramping_instance = None
+        for _ in range(len(excluded_instances) + 2):
+            instance = self.select_instance(request_key, is_available)
+            if instance is None or not is_available(instance):
+                continue
+            if slow_start is not None and not slow_start.admit(instance, request_key):
+                ramping_instance = ramping_instance or instance
+                continue
+            return instance
+        return ramping_instance
+
+    def observe_response(self, instance: ServiceInstance, response_time: float, failed: bool):
+        self.record_response(instance, response_time, failed)
+        if self.outlier_detector is not None:
+            self.outlier_detector.record(instance, failed)
+        if self.circuit_breakers is not None:
+            self.circuit_breakers.record(instance, failed)
+        if self.metrics is not None:
+            self.metrics.observe_response(instance, response_time, failed)
+
+    def get_total_in_flight_requests(self) -> int:
+        """
+        Returns the requests in flight across all instances, from all
+        router workers of the host if they share their state
+        """
+        if self.shared_table is not None:
+            if self.shared_table.num_instances == len(self.svc_instances):
+                return self.shared_table.get_total_in_flight()
+            # The table also counts the requests to the instances of other upstream pools
+            return sum(instance.get_in_flight_requests() for instance in self.svc_instances)
+        return self.in_flight_requests
+
+    def start_request(self, instance: ServiceInstance):
+        instance.start_request()
+        self.in_flight_requests += 1
+
+    def finish_request(self, instance: ServiceInstance):
+        instance.finish_request()
+        self.in_flight_requests -= 1
@@ -0,0 +1,197 @@
+import asyncio
+import math
+from collections import deque
+
+from fastapi import HTTPException
+
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_ALGORITHM = "vegas"
+DEFAULT_INITIAL_LIMIT = 20
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 1000
+DEFAULT_MAX_QUEUE_SIZE = 100
+DEFAULT_MAX_QUEUE_TIME = 0.05
+DEFAULT_PRIORITY_HEADER = "x-priority"
+DEFAULT_PRIORITY_CLASSES = ["critical", "normal", "batch"]
+DEFAULT_PRIORITY_CLASS = "normal"
+DEFAULT_BACKOFF_RATIO = 0.9
+DEFAULT_SMOOTHING = 1.0
+
+
+class AimdLimit:
+    """
+    Additive increase, multiplicative decrease. The limit grows by one
+    while requests succeed and use at least half of it, and is cut by
+    backoff_ratio whenever a request fails or times out.
+    """
+    def __init__(self, config: dict):
+        self.backoff_ratio = config.get("backoff_ratio", DEFAULT_BACKOFF_RATIO)
+
+    def update(self, limit: float, response_time: float, in_flight: int, dropped: bool) -> float:
+        if dropped:
+            return limit * self.backoff_ratio
+        if in_flight * 2 >= limit:
+            return limit + 1
+        return limit
+
+
+class VegasLimit:
+    """
+    Delay based limit in the style of TCP Vegas. The lowest response time
+    seen is taken as the response time without queueing, and the number
+    of requests queued downstream is estimated as
+    limit * (1 - no_load_response_time / response_time). The limit grows
+    while that queue is small and shrinks once it gets long, so it settles
+    just above what the instances can serve without queueing.
+    """
+    def __init__(self, config: dict):
+        self.smoothing = config.get("smoothing", DEFAULT_SMOOTHING)
+        self.no_load_response_time = math.inf
+
+    def update(self, limit: float, response_time: float, in_flight: int, dropped: bool) -> float:
+        if response_time > 0:
+            self.no_load_response_time = min(self.no_load_response_time, response_time)
+        log_limit = math.log10(max(limit, 1)) or 1
+        if dropped:
+            new_limit = limit - log_limit
+        elif in_flight * 2 < limit or response_time <= 0:
+            # Not using the limit, so the response times say nothing about it
+            return limit
+        else:
+            queue_size = math.ceil(limit * (1 - self.no_load_response_time / response_time))
+            if queue_size <= log_limit:
+                new_limit = limit + 6 * log_limit
+            elif queue_size < 3 * log_limit:
+                new_limit = limit + log_limit
+            elif queue_size > 6 * log_limit:
+                new_limit = limit - log_limit
+            else:
+                return limit
+        return limit * (1 - self.smoothing) + new_limit * self.smoothing
+
+
+LIMIT_ALGORITHMS = {"aimd": AimdLimit, "vegas": VegasLimit}
+
+
+class ConcurrencyLimiter:
+    """
+    Admission control in front of the router. At most limit requests are
+    routed at a time, where the limit adapts to the observed response
+    times(AIMD or Vegas). Further requests wait in a queue, by priority
+    class, for at most max_queue_time and are then shed with a 503, as are
+    requests arriving when the queue already holds max_queue_size. A request
+    of a higher priority class arriving at a full queue takes the place of
+    the newest queued request of the lowest class below it.
+    """
+    def __init__(self, config: dict):
+        algorithm = config.get("algorithm", DEFAULT_ALGORITHM)
+        if algorithm not in LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown concurrency limit algorithm {algorithm}")
+        self.limit_algorithm = LIMIT_ALGORITHMS[algorithm](config)
+        self.min_limit = config.get("min_limit", DEFAULT_MIN_LIMIT)
+        self.max_limit = config.get("max_limit", DEFAULT_MAX_LIMIT)
+        self.limit = float(config.get("initial_limit", DEFAULT_INITIAL_LIMIT))
+        self.max_queue_size = config.get("max_queue_size", DEFAULT_MAX_QUEUE_SIZE)
+        self.max_queue_time = config.get("max_queue_time", DEFAULT_MAX_QUEUE_TIME)
+        self.priority_header = config.get("priority_header", DEFAULT_PRIORITY_HEADER).lower()
+        priority_classes = config.get("priority_classes", DEFAULT_PRIORITY_CLASSES)
+        # Class name -> priority, 0 being the highest
+        self.priorities = {name.lower(): priority for priority, name in enumerate(priority_classes)}
+        self.default_priority = self.priorities[config.get("default_priority_class",
+                                                           DEFAULT_PRIORITY_CLASS).lower()]
+        self.queues: list[deque[asyncio.Future]] = [deque() for _ in priority_classes]
+        self.num_queued = 0
+        self.in_flight = 0
+        self.num_shed = 0
+
+    def get_priority(self, headers: list[tuple[str, str]] = None) -> int:
+        """
+        Returns the priority of the class named in the priority header,
+        or of the default class
+        """
+        if headers:
+            for name, value in headers:
+                if name.lower() == self.priority_header:
+                    return self.priorities.get(value.strip().lower(), self.default_priority)
+        return self.default_priority
+
+    async def acquire(self, priority: int):
+        """
+        Waits for the request to be admitted. Raises a 503 HTTPException
+        if it is shed instead.
+        """
+        if self.in_flight < int(self.limit) and not self.has_queued(priority):
+            self.in_flight += 1
+            return
+        if self.num_queued >= self.max_queue_size and not self.displace_lower_priority(priority):
+            self.shed("queue full")
+
+        admission = asyncio.get_running_loop().create_future()
+        self.queues[priority].append(admission)
+        self.num_queued += 1
+        try:
+            await asyncio.wait((admission,), timeout=self.max_queue_time)
+        except asyncio.CancelledError:
+            if not self.withdraw(admission, priority):
+                self.release_slot()
+            raise
+        if not admission.done():
+            self.withdraw(admission, priority)
+            self.shed("queued too long")
+        if admission.cancelled():
+            # Displaced by a request of a higher priority class
+            self.shed("displaced")
+
+    def release(self, response_time: float, dropped: bool):
+        """
+        Called once an admitted request is done, to adapt the limit and
+        admit the next queued request
+        """
+        new_limit = self.limit_algorithm.update(self.limit, response_time, self.in_flight, dropped)
+        self.limit = min(max(new_limit, self.min_limit), self.max_limit)
+        self.release_slot()
+
+    def release_slot(self):
+        self.in_flight -= 1
+        while self.num_queued and self.in_flight < int(self.limit):
+            admission = self.pop_highest_priority()
+            admission.set_result(None)
+            self.in_flight += 1
+
+    def has_queued(self, priority: int) -> bool:
+        return any(self.queues[higher_priority] for higher_priority in range(priority + 1))
+
+    def pop_highest_priority(self) -> asyncio.Future:
+        for queue in self.queues:
+            if queue:
+                self.num_queued -= 1
+                return queue.popleft()
+
+    def displace_lower_priority(self, priority: int) -> bool:
+        for lower_priority in range(len(self.queues) - 1, priority, -1):
+            if self.queues[lower_priority]:
+                self.num_queued -= 1
+                self.queues[lower_priority].pop().cancel()
+                return True
+        return False
+
+    def withdraw(self, admission: asyncio.Future, priority: int) -> bool:
+        """
+        Removes a request which is still queued. Returns False if it has
+        been admitted already.
+        """
+        if admission.done():
+            return admission.cancelled()
+        self.queues[priority].remove(admission)
+        self.num_queued -= 1
+        admission.cancel()
+        return True
+
+    def shed(self, reason: str):
+        self.num_shed += 1
+        logger.debug("Shedding request, %s, limit %d, %d in flight, %d queued",
+                     reason, int(self.limit), self.in_flight, self.num_queued)
+        raise HTTPException(status_code=503, detail="Router overloaded")
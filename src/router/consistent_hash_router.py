@@ -0,0 +1,113 @@
+import bisect
+import json
+import math
+from typing import Callable
+
+from src.router.base_router import Router
+from src.utils.http.http_client import HttpClient
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.hashing import stable_hash
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_KEY_FIELD = "gameid"
+DEFAULT_VIRTUAL_NODES = 100
+DEFAULT_LOAD_FACTOR = 1.25
+
+
+class ConsistentHashRouter(Router):
+    """
+    Sends all requests with the same key(a payload field or a header) to
+    the same instance, so per-key caches on the instances stay warm.
+    Every configured instance owns virtual_nodes points on a hash ring and
+    a key goes to the first routable instance clockwise from its hash.
+    When an instance becomes unroutable or comes back, only the keys of
+    that instance(~1/N of them) move.
+    To keep one hot key from overloading an instance, an instance already
+    serving more than load_factor times the average number of requests in
+    flight is passed over for the next one on the ring(bounded load).
+    Instances which cannot take the request right now, e.g. with an open
+    circuit, are passed over the same way.
+    """
+    def __init__(self, instances: list[ServiceInstance], http_client: HttpClient,
+                 routable_instances: RoutableInstances = None, config: dict = None):
+        super().__init__(instances, http_client, routable_instances)
+        config = config or {}
+        self.key_field = config.get("key_field", DEFAULT_KEY_FIELD)
+        key_header = config.get("key_header")
+        self.key_header = key_header.lower() if key_header else None
+        self.load_factor = config.get("load_factor", DEFAULT_LOAD_FACTOR)
+        self.ring_hashes, self.ring_instances = self.build_ring(config.get("virtual_nodes",
+                                                                           DEFAULT_VIRTUAL_NODES))
+        self.routable_version = None
+        self.routable_set = frozenset()
+        self.cur_index: int = 0 # Round-robin counter for requests without a key
+
+    def build_ring(self, virtual_nodes: int) -> tuple[list[int], list[ServiceInstance]]:
+        """
+        Returns the sorted hashes of all virtual nodes and, at the same
+        index, the instance owning each of them
+        """
+        ring = sorted(((stable_hash(f"{instance.get_url()}#{node}"), instance)
+                       for instance in self.svc_instances for node in range(virtual_nodes)),
+                      key=lambda virtual_node: virtual_node[0])
+        return [node_hash for node_hash, _ in ring], [instance for _, instance in ring]
+
+    def get_request_key(self, payload: dict = None,
+                        headers: list[tuple[str, str]] = None, body: bytes = None) -> str | None:
+        if self.key_header and headers:
+            for name, value in headers:
+                if name.lower() == self.key_header:
+                    return value
+        if not self.key_field:
+            return None
+        if payload is None and body:
+            # Only parses the raw body in passthrough mode when there is no key header
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return None
+        if isinstance(payload, dict) and payload.get(self.key_field) is not None:
+            return str(payload[self.key_field])
+        return None
+
+    def select_instance(self, request_key: str = None,
+                        is_available: Callable[[ServiceInstance], bool] = None) -> ServiceInstance | None:
+        snapshot = self.routable_instances.current()
+        if not snapshot.instances:
+            return None
+        if snapshot.version != self.routable_version:
+            self.routable_set = frozenset(snapshot.instances)
+            self.routable_version = snapshot.version
+
+        if request_key is None:
+            for _ in range(len(snapshot.instances)):
+                cur_instance = snapshot.instances[self.cur_index % len(snapshot.instances)]
+                self.cur_index += 1
+                if is_available is None or is_available(cur_instance):
+                    return cur_instance
+            return None
+
+        capacity = math.ceil(self.load_factor * (self.get_total_in_flight_requests() + 1)
+                             / len(snapshot.instances))
+        num_nodes = len(self.ring_hashes)
+        start = bisect.bisect(self.ring_hashes, stable_hash(request_key))
+        slow_start = self.slow_start if self.slow_start is not None and self.slow_start.is_ramping() else None
+        first_routable = None
+        first_ramping = None
+        for offset in range(num_nodes):
+            instance = self.ring_instances[(start + offset) % num_nodes]
+            if instance not in self.routable_set or (is_available is not None and not is_available(instance)):
+                continue
+            if slow_start is not None and not slow_start.admit(instance, request_key):
+                # Keys not yet admitted to a ramping instance stay with the next one on the ring
+                if first_ramping is None:
+                    first_ramping = instance
+                continue
+            if instance.get_in_flight_requests() < capacity:
+                return instance
+            if first_routable is None:
+                first_routable = instance
+        return first_routable or first_ramping
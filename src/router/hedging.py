@@ -0,0 +1,91 @@
+from collections import deque
+
+from src.router.request_budget import RequestBudget
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_WINDOW = 1000
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_MIN_DELAY = 0.005
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_BUDGET_MAX_TOKENS = 10
+RECOMPUTE_INTERVAL = 50
+
+
+class LatencyTracker:
+    """
+    Keeps the response times of the last window requests of a route and
+    a percentile of them. The percentile is recomputed every
+    RECOMPUTE_INTERVAL samples instead of on every request.
+    """
+    def __init__(self, percentile: float, window: int, min_samples: int):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=window)
+        self.samples_since_recompute = 0
+        self.cached_percentile: float | None = None
+
+    def record(self, response_time: float):
+        self.samples.append(response_time)
+        self.samples_since_recompute += 1
+        if self.cached_percentile is None or self.samples_since_recompute >= RECOMPUTE_INTERVAL:
+            self.recompute()
+
+    def recompute(self):
+        self.samples_since_recompute = 0
+        if len(self.samples) < self.min_samples:
+            self.cached_percentile = None
+            return
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        self.cached_percentile = ordered[index]
+
+    def get_percentile(self) -> float | None:
+        """
+        Returns the percentile, or None while there are too few samples
+        """
+        return self.cached_percentile
+
+
+class HedgingPolicy:
+    """
+    Decides when a request to an idempotent route is hedged, i.e. sent a
+    second time to another instance because the first one is slow. The
+    hedge is sent once the request has taken longer than the observed
+    percentile latency of its route, and each route has a budget capping
+    hedges to a ratio of its traffic.
+    """
+    def __init__(self, config: dict):
+        self.routes = set(config.get("routes", []))
+        self.min_delay = config.get("min_delay", DEFAULT_MIN_DELAY)
+        self.latency_trackers = {
+            route: LatencyTracker(config.get("percentile", DEFAULT_PERCENTILE),
+                                  config.get("window", DEFAULT_WINDOW),
+                                  config.get("min_samples", DEFAULT_MIN_SAMPLES))
+            for route in self.routes
+        }
+        self.budgets = {
+            route: RequestBudget(config.get("budget_ratio", DEFAULT_BUDGET_RATIO),
+                                 config.get("budget_max_tokens", DEFAULT_BUDGET_MAX_TOKENS))
+            for route in self.routes
+        }
+
+    def is_hedged(self, endpoint: str) -> bool:
+        return endpoint in self.routes
+
+    def start_request(self, endpoint: str) -> float | None:
+        """
+        Accounts a new request to the route and returns how long to wait
+        for its response before hedging, or None if it is not hedged
+        because there is no latency data yet
+        """
+        self.budgets[endpoint].deposit()
+        delay = self.latency_trackers[endpoint].get_percentile()
+        if delay is None:
+            return None
+        return max(delay, self.min_delay)
+
+    def try_hedge(self, endpoint: str) -> bool:
+        return self.budgets[endpoint].try_spend()
+
+    def record_latency(self, endpoint: str, response_time: float):
+        self.latency_trackers[endpoint].record(response_time)
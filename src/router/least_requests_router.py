@@ -0,0 +1,57 @@
+import random
+from typing import Callable
+
+from src.router.base_router import Router
+from src.utils.http.http_client import HttpClient
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class LeastRequestsRouter(Router):
+    """
+    Sends each request to the less loaded of two randomly chosen healthy
+    instances(power of two choices), where load is the number of requests
+    in flight to the instance. This steers traffic away from slow instances
+    which accumulate a backlog, without scanning every instance.
+    """
+    def __init__(self, instances: list[ServiceInstance], http_client: HttpClient,
+                 routable_instances: RoutableInstances = None):
+        super().__init__(instances, http_client, routable_instances)
+        self.random = random.Random()
+
+    def select_instance(self, request_key: str = None,
+                        is_available: Callable[[ServiceInstance], bool] = None) -> ServiceInstance | None:
+        healthy_instances = self.routable_instances.current().instances
+        instance = self.choose(healthy_instances)
+        if instance is None or is_available is None or is_available(instance):
+            return instance
+        # Only scans the instances when the choice cannot take the request
+        return self.choose([instance for instance in healthy_instances if is_available(instance)])
+
+    def choose(self, healthy_instances: list[ServiceInstance]) -> ServiceInstance | None:
+        num_instances = len(healthy_instances)
+        if num_instances == 0:
+            return None
+        if num_instances == 1:
+            return healthy_instances[0]
+
+        # Two distinct random indices
+        first_index = self.random.randrange(num_instances)
+        second_index = self.random.randrange(num_instances - 1)
+        if second_index >= first_index:
+            second_index += 1
+
+        first = healthy_instances[first_index]
+        second = healthy_instances[second_index]
+        if self.get_load(second) < self.get_load(first):
+            return second
+        return first
+
+    def get_load(self, instance: ServiceInstance) -> float:
+        """
+        Load of the instance compared between the two choices
+        """
+        return instance.get_in_flight_requests()
@@ -0,0 +1,91 @@
+import math
+import time
+
+from src.router.least_requests_router import LeastRequestsRouter
+from src.utils.http.http_client import HttpClient
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_DECAY_TIME = 10
+DEFAULT_LATENCY = 0.1
+DEFAULT_FAILURE_PENALTY = 5
+
+
+class LatencyEwma:
+    """
+    Peak sensitive, time decayed moving average of the response times of
+    one instance. A response slower than the average replaces it right
+    away, while faster responses only pull it down gradually, so a latency
+    spike is acted upon immediately and forgotten slowly.
+    """
+    __slots__ = ("value", "timestamp")
+
+    def __init__(self, value: float, timestamp: float):
+        self.value = value
+        self.timestamp = timestamp
+
+    def observe(self, response_time: float, now: float, decay_time: float):
+        if response_time > self.value:
+            self.value = response_time
+        else:
+            weight = math.exp(-max(now - self.timestamp, 0) / decay_time)
+            self.value = self.value * weight + response_time * (1 - weight)
+        self.timestamp = now
+
+    def get(self, now: float, decay_time: float) -> float:
+        """
+        Returns the average decayed towards zero for the time elapsed since
+        the last response, so an instance penalised by a spike gets tried
+        again once it has been idle for a while
+        """
+        return self.value * math.exp(-max(now - self.timestamp, 0) / decay_time)
+
+
+class PeakEwmaRouter(LeastRequestsRouter):
+    """
+    Latency aware router. It keeps a peak EWMA of the real response times
+    of every instance and sends each request to the one of two randomly
+    chosen healthy instances with the lower expected latency, i.e. its
+    average response time scaled by the requests it already has in flight.
+    """
+    def __init__(self, instances: list[ServiceInstance], http_client: HttpClient,
+                 routable_instances: RoutableInstances = None, config: dict = None,
+                 time_provider=time.monotonic):
+        super().__init__(instances, http_client, routable_instances)
+        config = config or {}
+        # Time (in seconds) it takes for an old response time to lose ~63% of its weight
+        self.decay_time = config.get("decay_time", DEFAULT_DECAY_TIME)
+        # Assumed response time (in seconds) of an instance which has not served any request yet
+        self.default_latency = config.get("default_latency", DEFAULT_LATENCY)
+        # Response time (in seconds) recorded for a failed request, so an instance
+        # failing fast does not look like the fastest one
+        self.failure_penalty = config.get("failure_penalty", DEFAULT_FAILURE_PENALTY)
+        self.time_provider = time_provider
+        self.latencies: dict[ServiceInstance, LatencyEwma] = {}
+
+    def take_over(self, previous_router: "PeakEwmaRouter"):
+        instance_set = set(self.svc_instances)
+        # Shared, so the requests still in flight through the previous router update them too
+        self.latencies = {instance: latency for instance, latency in previous_router.latencies.items()
+                          if instance in instance_set}
+
+    def get_load(self, instance: ServiceInstance) -> float:
+        latency = self.latencies.get(instance)
+        if latency is None:
+            expected_latency = self.default_latency
+        else:
+            expected_latency = latency.get(self.time_provider(), self.decay_time)
+        return expected_latency * (instance.get_in_flight_requests() + 1)
+
+    def record_response(self, instance: ServiceInstance, response_time: float, failed: bool):
+        if failed:
+            response_time = max(response_time, self.failure_penalty)
+        now = self.time_provider()
+        latency = self.latencies.get(instance)
+        if latency is None:
+            self.latencies[instance] = LatencyEwma(response_time, now)
+        else:
+            latency.observe(response_time, now, self.decay_time)
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import os
+import time
+
+import httpx
+
+from src.metrics.metrics import Counter
+from src.tracing.tracer import Span, current_span
+from src.utils.http.http_client import HttpClient
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_BATCH_PATH_SUFFIX = "/batch"
+DEFAULT_MAX_DELAY = 0.002
+DEFAULT_MAX_ITEMS = 32
+DEFAULT_ERROR_FIELD = "error"
+DEFAULT_STATUS_FIELD = "status"
+DEFAULT_ERROR_STATUS = 500
+
+
+class PendingBatch:
+    __slots__ = ("items", "timer")
+
+    def __init__(self, timer: asyncio.TimerHandle):
+        # Payload, future and span, if traced, of every request in the batch
+        self.items: list[tuple[dict, asyncio.Future, Span | None]] = []
+        self.timer = timer
+
+
+class RequestBatcher:
+    """
+    Collects the JSON requests to the configured routes per target
+    instance for up to max_delay seconds or max_items requests, and sends
+    them as one JSON array to the batch endpoint of the route, i.e. the
+    route followed by batch_path_suffix. The instance answers with an
+    array holding the response of every request, in order, which is
+    handed back to the request waiting for it.
+    A response which is an object with error_field fails its request
+    only, with the HTTPStatusError of the status in status_field, as if
+    it had been sent on its own. A failed batch fails all its requests.
+    A batch is sent in a context of its own rather than the one of the
+    request which started it, and the span of every traced request gets
+    the id and size of its batch and the time the batch took upstream.
+    """
+    def __init__(self, config: dict, http_client: HttpClient):
+        self.routes = set(config.get("routes", []))
+        self.batch_path_suffix = config.get("batch_path_suffix", DEFAULT_BATCH_PATH_SUFFIX)
+        self.max_delay = config.get("max_delay", DEFAULT_MAX_DELAY)
+        self.max_items = config.get("max_items", DEFAULT_MAX_ITEMS)
+        self.error_field = config.get("error_field", DEFAULT_ERROR_FIELD)
+        self.status_field = config.get("status_field", DEFAULT_STATUS_FIELD)
+        self.http_client = http_client
+        self.pending_batches: dict[str, PendingBatch] = {} # Keyed by the URL of the batch endpoint
+        self.send_tasks: set[asyncio.Task] = set()
+        self.batches = Counter()
+        self.batched_requests = Counter()
+
+    def is_batched(self, endpoint: str) -> bool:
+        return endpoint in self.routes
+
+    def get_batch_endpoint(self, endpoint: str) -> str:
+        return endpoint.rstrip("/") + self.batch_path_suffix
+
+    async def submit(self, batch_url: str, payload: dict) -> dict:
+        """
+        Adds the request to the pending batch of the batch endpoint and
+        returns its response once the batch has been answered
+        """
+        loop = asyncio.get_running_loop()
+        batch = self.pending_batches.get(batch_url)
+        if batch is None:
+            batch = PendingBatch(loop.call_later(self.max_delay, self.flush, batch_url,
+                                                 context=contextvars.Context()))
+            self.pending_batches[batch_url] = batch
+        future = loop.create_future()
+        batch.items.append((payload, future, current_span.get()))
+        if len(batch.items) >= self.max_items:
+            self.flush(batch_url)
+        return await future
+
+    def flush(self, batch_url: str):
+        batch = self.pending_batches.pop(batch_url, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        # Requests cancelled while waiting, e.g. losing a hedge, are left out
+        items = [item for item in batch.items if not item[1].done()]
+        if not items:
+            return
+        # Not in the context of the request which filled or started the batch
+        send_task = asyncio.get_running_loop().create_task(self.send_batch(batch_url, items),
+                                                           context=contextvars.Context())
+        self.send_tasks.add(send_task)
+        send_task.add_done_callback(self.send_tasks.discard)
+
+    async def send_batch(self, batch_url: str, items: list[tuple[dict, asyncio.Future, Span | None]]):
+        self.batches.value += 1
+        self.batched_requests.value += len(items)
+        start_time = time.monotonic()
+        try:
+            responses = await self.http_client.post(batch_url, [payload for payload, _, _ in items])
+            if not isinstance(responses, list) or len(responses) != len(items):
+                raise ValueError(f"Batch response of {batch_url} does not hold one response "
+                                 f"for each of the {len(items)} requests")
+        except Exception as e:
+            logger.debug("Batch of %d requests to %s failed: %s", len(items), batch_url, e)
+            self.record_batch(items, time.monotonic() - start_time)
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.record_batch(items, time.monotonic() - start_time)
+        for (_, future, _), response in zip(items, responses):
+            if future.done():
+                continue
+            if isinstance(response, dict) and self.error_field in response:
+                future.set_exception(self.get_item_error(batch_url, response))
+            else:
+                future.set_result(response)
+
+    def record_batch(self, items: list[tuple[dict, asyncio.Future, Span | None]], duration: float):
+        """
+        Links the spans of the traced requests of a batch by its id
+        """
+        batch = None
+        for _, _, span in items:
+            if span is not None:
+                batch = batch or {"id": os.urandom(8).hex(), "size": len(items)}
+                span.batch = batch
+                span.add_phase("upstream", duration)
+
+    def get_item_error(self, batch_url: str, response: dict) -> httpx.HTTPStatusError:
+        status_code = response.get(self.status_field, DEFAULT_ERROR_STATUS)
+        request = httpx.Request("POST", batch_url)
+        return httpx.HTTPStatusError(f"Batched request to {batch_url} failed with status {status_code}: "
+                                     f"{response[self.error_field]}",
+                                     request=request,
+                                     response=httpx.Response(status_code, json=response, request=request))
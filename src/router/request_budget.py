@@ -0,0 +1,20 @@
+class RequestBudget:
+    """
+    Token bucket which caps extra requests, like hedges or retries, to a
+    ratio of the regular traffic. Every regular request deposits ratio
+    tokens, up to max_tokens, and every extra request spends one token,
+    so extra requests can not multiply the load during an incident.
+    """
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from src.metrics.metrics import Counter
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_TTL = 5
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_KEY_HEADERS = ["authorization", "cookie"]
+CACHEABLE_METHODS = frozenset(["GET", "HEAD", "POST"])
+ENTRY_OVERHEAD_BYTES = 200 # Rough size of the key, the entry and its slot in the dict
+# Cache-Control directives of responses meant for the one client which asked for them
+PRIVATE_CACHE_DIRECTIVES = frozenset(["no-store", "private", "no-cache"])
+
+
+def is_shareable(headers: list[tuple[str, str]]) -> bool:
+    """
+    Whether a response with the given headers may be handed to other
+    clients, i.e. it sets no cookie and Cache-Control does not keep it
+    from being stored or reused
+    """
+    for name, value in headers:
+        name = name.lower()
+        if name == "set-cookie":
+            return False
+        if name == "cache-control" and any(directive.split("=", 1)[0].strip().lower()
+                                           in PRIVATE_CACHE_DIRECTIVES
+                                           for directive in value.split(",")):
+            return False
+    return True
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Caches the successful responses of the configured routes for ttl
+    seconds, keyed by a hash of the method, the path with its query
+    string, the body and the key_headers of the request, so clients
+    retrying identical requests within the ttl do not reach the instances
+    again. At most max_entries responses of max_bytes in total are kept,
+    evicting the least recently used ones first.
+    Identical requests arriving while the first of them is still in
+    flight wait for its response instead of being sent as well
+    (single-flight), so N concurrent identical requests cost one upstream
+    request. The upstream request is not cancelled when the client which
+    sent it goes away, since the others still wait for it. A response
+    which is not shareable, e.g. setting a cookie, is neither cached nor
+    handed to the waiting requests, which are sent on their own instead.
+    """
+    def __init__(self, config: dict, time_provider=time.monotonic):
+        self.routes = set(config.get("routes", []))
+        self.ttl = config.get("ttl", DEFAULT_TTL)
+        self.max_entries = config.get("max_entries", DEFAULT_MAX_ENTRIES)
+        self.max_bytes = config.get("max_bytes", DEFAULT_MAX_BYTES)
+        self.key_headers = frozenset(name.lower() for name in config.get("key_headers", DEFAULT_KEY_HEADERS))
+        self.time_provider = time_provider
+        self.entries: OrderedDict[bytes, CacheEntry] = OrderedDict() # Least recently used first
+        self.num_bytes = 0
+        self.in_flight: dict[bytes, asyncio.Task] = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.coalesced = Counter()
+        self.evictions = Counter()
+
+    def is_cached(self, method: str, endpoint: str) -> bool:
+        return endpoint in self.routes and method in CACHEABLE_METHODS
+
+    def get_key(self, method: str, endpoint: str, query: str, body: bytes,
+                headers: list[tuple[str, str]] = None) -> bytes:
+        """
+        Hashes the parts of the request which make up its identity. The
+        query parameters are sorted, so their order does not matter.
+        """
+        key_hash = hashlib.blake2b(digest_size=16)
+        for part in (method, endpoint, "&".join(sorted(query.split("&"))) if query else ""):
+            key_hash.update(part.encode())
+            key_hash.update(b"\0")
+        if headers and self.key_headers:
+            for name, value in sorted((name.lower(), value) for name, value in headers
+                                      if name.lower() in self.key_headers):
+                key_hash.update(f"{name}:{value}\0".encode("latin-1"))
+        key_hash.update(len(body).to_bytes(8, "little"))
+        key_hash.update(body)
+        return key_hash.digest()
+
+    async def get_or_load(self, key: bytes, load, get_size, is_cacheable=None, is_shareable=None):
+        """
+        Returns the cached response of the key or, on a miss, the response
+        of load(), which is cached if is_cacheable(response) and
+        is_shareable(response), with its size taken as get_size(response)
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires_at > self.time_provider():
+                self.entries.move_to_end(key)
+                self.hits.value += 1
+                return entry.value
+            self.remove(key)
+
+        task = self.in_flight.get(key)
+        if task is None:
+            self.misses.value += 1
+            task = asyncio.ensure_future(load())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done_task: self.store(key, done_task, get_size, is_cacheable,
+                                                                is_shareable))
+            # Shielded, so a client going away does not cancel the request the others wait for
+            return await asyncio.shield(task)
+
+        self.coalesced.value += 1
+        response = await asyncio.shield(task)
+        if is_shareable is not None and not is_shareable(response):
+            return await load()
+        return response
+
+    def store(self, key: bytes, task: asyncio.Task, get_size, is_cacheable, is_shareable):
+        del self.in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        if ((is_cacheable is not None and not is_cacheable(response))
+                or (is_shareable is not None and not is_shareable(response))):
+            return
+        size = get_size(response) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = CacheEntry(response, size, self.time_provider() + self.ttl)
+        self.num_bytes += size
+        while len(self.entries) > self.max_entries or self.num_bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions.value += 1
+
+    def remove(self, key: bytes):
+        self.num_bytes -= self.entries.pop(key).size
+
+    def get_num_entries(self) -> int:
+        return len(self.entries)
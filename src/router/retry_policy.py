@@ -0,0 +1,64 @@
+import random
+
+import httpx
+
+from src.health.circuit_breaker import CircuitOpenError
+from src.router.request_budget import RequestBudget
+from src.utils.http.upstream_response import UpstreamResponse
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRYABLE_STATUS_CODES = [502, 503, 504]
+DEFAULT_BACKOFF_BASE = 0.01
+DEFAULT_BACKOFF_MAX = 0.2
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_BUDGET_MAX_TOKENS = 10
+
+# Errors raised before the request reached the instance, so it is safe to send it again
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, CircuitOpenError)
+# Methods whose requests have the same effect however often they are handled
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed request is retried on another instance and
+    how long to back off before. Retries across all routes share one
+    budget capping them to a ratio of the regular traffic, so a struggling
+    fleet does not get hit by a retry storm.
+    A retryable status code may come back after the instance already
+    handled the request, so only requests with an idempotent method, or
+    to one of the idempotent_routes, are retried on it. Any other request
+    is only retried when it never reached the instance.
+    """
+    def __init__(self, config: dict):
+        self.max_retries = config.get("max_retries", DEFAULT_MAX_RETRIES)
+        self.retryable_status_codes = frozenset(config.get("retryable_status_codes",
+                                                           DEFAULT_RETRYABLE_STATUS_CODES))
+        self.idempotent_routes = frozenset(config.get("idempotent_routes", []))
+        self.backoff_base = config.get("backoff_base", DEFAULT_BACKOFF_BASE)
+        self.backoff_max = config.get("backoff_max", DEFAULT_BACKOFF_MAX)
+        self.budget = RequestBudget(config.get("budget_ratio", DEFAULT_BUDGET_RATIO),
+                                    config.get("budget_max_tokens", DEFAULT_BUDGET_MAX_TOKENS))
+        self.random = random.Random()
+
+    def is_idempotent(self, method: str, endpoint: str) -> bool:
+        return method in IDEMPOTENT_METHODS or endpoint in self.idempotent_routes
+
+    def is_retryable_error(self, error: Exception, method: str, endpoint: str) -> bool:
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return (error.response.status_code in self.retryable_status_codes
+                    and self.is_idempotent(method, endpoint))
+        return False
+
+    def is_retryable_response(self, response, method: str, endpoint: str) -> bool:
+        return (isinstance(response, UpstreamResponse)
+                and response.status_code in self.retryable_status_codes
+                and self.is_idempotent(method, endpoint))
+
+    def get_backoff(self, retry: int) -> float:
+        """
+        Exponential backoff with full jitter for the given retry(starting at 0)
+        """
+        return self.random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
@@ -0,0 +1,50 @@
+from src.router.base_router import Router
+
+
+class RouteNode:
+    __slots__ = ("children", "target")
+
+    def __init__(self):
+        self.children: dict[str, RouteNode] = {}
+        self.target = None
+
+
+class RouteTable:
+    """
+    Maps request paths to the router of the upstream pool serving them,
+    by the longest matching path prefix. Prefixes match whole path
+    segments, i.e. "/api" matches "/api" and "/api/games" but not
+    "/apis". The prefixes are kept in a trie of path segments, so a
+    lookup walks the segments of the path once, however many routes
+    there are.
+    """
+    def __init__(self):
+        self.root = RouteNode()
+
+    def add(self, prefix: str, target: Router):
+        node = self.root
+        for segment in prefix.split("/"):
+            if segment:
+                node = node.children.setdefault(segment, RouteNode())
+        node.target = target
+
+    def replace(self, route_table: "RouteTable"):
+        """
+        Takes over the routes of the given table, e.g. on a config reload.
+        Swapping the root is a single reference assignment, so a lookup
+        sees either all old or all new routes.
+        """
+        self.root = route_table.root
+
+    def match(self, path: str) -> Router | None:
+        node = self.root
+        target = node.target
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.target is not None:
+                target = node.target
+        return target
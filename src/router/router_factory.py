@@ -1,18 +1,97 @@
 from src.models.service_instance import ServiceInstance
 from src.utils.http.http_client import HttpClient
+from src.health.routable_instances import RoutableInstances
+from src.health.outlier_detector import OutlierDetector
+from src.health.circuit_breaker import CircuitBreakers
+from src.health.slow_start import SlowStart
 from src.router.base_router import Router
+from src.router.concurrency_limiter import ConcurrencyLimiter
+from src.router.hedging import HedgingPolicy
+from src.router.request_batcher import RequestBatcher
+from src.router.response_cache import ResponseCache
+from src.router.retry_policy import RetryPolicy
 from src.router.round_robin_router import RoundRobinRouter
+from src.router.least_requests_router import LeastRequestsRouter
+from src.router.peak_ewma_router import PeakEwmaRouter
+from src.router.consistent_hash_router import ConsistentHashRouter
+from src.router.weighted_round_robin_router import WeightedRoundRobinRouter
 
 
-def create_router(config: dict, svc_instances: list[ServiceInstance]) -> Router:
+def create_router(config: dict, svc_instances: list[ServiceInstance],
+                  http_client: HttpClient, routable_instances: RoutableInstances,
+                  previous_router: Router = None, previous_config: dict = None) -> Router:
     """
     Uses factory design pattern to create an appropriate router service
-    based on the routing algorithm in config.json
+    based on the routing algorithm in config.json, with passive health
+    tracking, circuit breakers, slow start, retries, hedged requests,
+    admission control, the response cache and request batching enabled
+    if configured. On a config reload the components of previous_router
+    whose config section did not change are taken over along with their
+    state, only the others are built anew.
+    """
+    def is_unchanged(*sections: str) -> bool:
+        return previous_router is not None and all(
+            config.get(section) == previous_config.get(section) for section in sections)
+
+    router = create_routing_algorithm(config, svc_instances, http_client, routable_instances)
+    routing_algo = config["routing_algorithm"]
+    if is_unchanged("routing_algorithm", routing_algo) and type(previous_router) is type(router):
+        router.take_over(previous_router)
+    outlier_detection_config = config.get("outlier_detection", {})
+    if outlier_detection_config.get("enabled", False):
+        router.enable_outlier_detection(
+            previous_router.outlier_detector if is_unchanged("outlier_detection")
+            else OutlierDetector(svc_instances, routable_instances, outlier_detection_config))
+    circuit_breaker_config = config.get("circuit_breaker", {})
+    if circuit_breaker_config.get("enabled", False):
+        router.enable_circuit_breakers(
+            previous_router.circuit_breakers if is_unchanged("circuit_breaker")
+            else CircuitBreakers(svc_instances, routable_instances, circuit_breaker_config))
+    slow_start_config = config.get("slow_start", {})
+    if slow_start_config.get("window", 0) > 0:
+        router.enable_slow_start(previous_router.slow_start if is_unchanged("slow_start")
+                                 else SlowStart(svc_instances, slow_start_config))
+    retries_config = config.get("retries", {})
+    if retries_config.get("max_retries", 0) > 0:
+        router.enable_retries(previous_router.retry_policy if is_unchanged("retries")
+                              else RetryPolicy(retries_config))
+    hedging_config = config.get("hedging", {})
+    if hedging_config.get("routes"):
+        router.enable_hedging(previous_router.hedging_policy if is_unchanged("hedging")
+                              else HedgingPolicy(hedging_config))
+    admission_control_config = config.get("admission_control", {})
+    if admission_control_config.get("enabled", False):
+        router.enable_admission_control(
+            previous_router.concurrency_limiter if is_unchanged("admission_control")
+            else ConcurrencyLimiter(admission_control_config))
+    response_cache_config = config.get("response_cache", {})
+    if response_cache_config.get("routes"):
+        router.enable_response_cache(previous_router.response_cache if is_unchanged("response_cache")
+                                     else ResponseCache(response_cache_config))
+    batching_config = config.get("batching", {})
+    if batching_config.get("routes"):
+        router.enable_batching(previous_router.request_batcher if is_unchanged("batching")
+                               else RequestBatcher(batching_config, http_client))
+    return router
+
+
+def create_routing_algorithm(config: dict, svc_instances: list[ServiceInstance],
+                             http_client: HttpClient, routable_instances: RoutableInstances) -> Router:
+    """
+    Creates the router implementing the routing algorithm in config.json
     """
     routing_algo = config["routing_algorithm"]
-    http_client = HttpClient()
 
     if routing_algo == "round_robin":
-        return RoundRobinRouter(svc_instances, http_client)
+        return RoundRobinRouter(svc_instances, http_client, routable_instances)
+    elif routing_algo == "weighted_round_robin":
+        return WeightedRoundRobinRouter(svc_instances, http_client, routable_instances)
+    elif routing_algo == "least_requests":
+        return LeastRequestsRouter(svc_instances, http_client, routable_instances)
+    elif routing_algo == "peak_ewma":
+        return PeakEwmaRouter(svc_instances, http_client, routable_instances, config.get("peak_ewma", {}))
+    elif routing_algo == "consistent_hash":
+        return ConsistentHashRouter(svc_instances, http_client, routable_instances,
+                                    config.get("consistent_hash", {}))
     else:
         raise ValueError(f"Unknown routing algorithm {routing_algo}")
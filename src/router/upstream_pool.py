@@ -0,0 +1,290 @@
+import asyncio
+import time
+
+from src.models.service_instance import ServiceInstance
+from src.health.health_checker import HealthChecker
+from src.health.routable_instances import RoutableInstances
+from src.health.shared_instance_table import SharedInstanceTable
+from src.metrics.router_metrics import RouterMetrics
+from src.router.base_router import Router
+from src.router.route_table import RouteTable
+from src.router.router_factory import create_router
+from src.utils.http.http_client import HttpClient
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_POOL = "default"
+DEFAULT_DRAIN_TIMEOUT = 30
+DRAIN_POLL_INTERVAL = 0.1
+# Top level settings which pools do not take over
+POOL_KEYS = ("app_instances", "discovery", "pools", "routes")
+
+
+def create_service_instance(app_instance) -> ServiceInstance:
+    """
+    Creates a service instance from an app_instances entry of config.json,
+    which is either a URL or an object with a url and an optional weight
+    """
+    return ServiceInstance(get_instance_url(app_instance), get_instance_weight(app_instance))
+
+
+def get_instance_url(app_instance) -> str:
+    return app_instance if isinstance(app_instance, str) else app_instance['url']
+
+
+def get_instance_weight(app_instance) -> int:
+    """
+    Returns the weight of an app_instances entry, raising a ValueError
+    unless it is a positive integer
+    """
+    weight = 1 if isinstance(app_instance, str) else app_instance.get('weight', 1)
+    if not isinstance(weight, int) or isinstance(weight, bool) or weight <= 0:
+        raise ValueError(f"Weight of {get_instance_url(app_instance)} must be a positive integer, "
+                         f"not {weight!r}")
+    return weight
+
+
+def get_pool_configs(config: dict) -> dict[str, dict]:
+    """
+    Returns the config of every upstream pool in config.json. A pool
+    takes the top level settings, apart from the instances and their
+    discovery, with the sections it sets itself replacing them. Without
+    pools, the top level app_instances form the single default pool.
+    """
+    pools = config.get("pools")
+    if not pools:
+        return {DEFAULT_POOL: config}
+    shared_config = {key: value for key, value in config.items() if key not in POOL_KEYS}
+    return {name: {**shared_config, **pool_config} for name, pool_config in pools.items()}
+
+
+class UpstreamPool:
+    """
+    Instances serving one or more route prefixes, with their own routing
+    algorithm and healthchecks
+    """
+    def __init__(self, name: str, config: dict, http_client: HttpClient):
+        self.name = name
+        self.config = config
+        self.http_client = http_client
+        self.svc_instances = [create_service_instance(app_instance)
+                              for app_instance in config.get('app_instances', [])]
+        # Snapshot of routable instances, published by the healthchecker and read by the router
+        self.routable_instances = RoutableInstances(self.svc_instances)
+        self.router: Router = create_router(config, self.svc_instances, http_client, self.routable_instances)
+        self.health_checker = HealthChecker(self.svc_instances, http_client, config, time.time,
+                                            self.routable_instances)
+        self.metrics: RouterMetrics = None
+        self.shared_table: SharedInstanceTable = None
+        self.health_task: asyncio.Task = None
+
+    def enable_metrics(self, metrics: RouterMetrics):
+        self.metrics = metrics
+        metrics.add_instances(self.svc_instances)
+        self.router.enable_metrics(metrics)
+        self.health_checker.enable_metrics(metrics)
+
+    def enable_shared_table(self, shared_table: SharedInstanceTable):
+        self.shared_table = shared_table
+        self.router.enable_shared_table(shared_table)
+
+    def start_health_checks(self):
+        self.health_task = asyncio.create_task(self.health_checker.run())
+
+    def stop_health_checks(self) -> asyncio.Task | None:
+        if self.health_task is not None:
+            self.health_task.cancel()
+        return self.health_task
+
+    def prepare_update(self, config: dict) -> tuple[list[ServiceInstance], Router]:
+        """
+        Builds the instances and the router of a reloaded config, without
+        touching the current ones yet. Instances whose URL is kept are
+        reused, so they keep their health status and requests in flight,
+        and so is the state the router components track about them.
+        """
+        instances_by_url = {instance.get_url(): instance for instance in self.svc_instances}
+        instances = [instances_by_url.get(get_instance_url(app_instance))
+                     or create_service_instance(app_instance)
+                     for app_instance in config.get('app_instances', [])]
+        # The weights of kept instances are only taken over in update(), but rejected right away
+        for app_instance in config.get('app_instances', []):
+            get_instance_weight(app_instance)
+        router = create_router(config, instances, self.http_client, self.routable_instances,
+                               self.router, self.config)
+        if self.metrics is not None:
+            router.enable_metrics(self.metrics)
+        if self.shared_table is not None:
+            router.enable_shared_table(self.shared_table)
+        return instances, router
+
+    def update(self, config: dict, instances: list[ServiceInstance], router: Router) -> list[ServiceInstance]:
+        """
+        Switches the pool over to the instances and the router prepared
+        for the config. Returns the removed instances, which get no new
+        requests but finish the ones in flight.
+        """
+        weights = {get_instance_url(app_instance): get_instance_weight(app_instance)
+                   for app_instance in config.get('app_instances', [])}
+        for instance in instances:
+            instance.weight = weights[instance.get_url()]
+        kept_instances = set(instances)
+        removed_instances = [instance for instance in self.svc_instances if instance not in kept_instances]
+        num_added = len(instances) - (len(self.svc_instances) - len(removed_instances))
+
+        self.config = config
+        self.svc_instances = instances
+        if self.metrics is not None:
+            self.metrics.add_instances(instances)
+        self.health_checker.set_instances(instances, config)
+        self.routable_instances.set_instances(instances)
+        old_router, self.router = self.router, router
+        old_router.close(router)
+        logger.info("Reloaded upstream pool %s with %d instances, %d added and %d removed",
+                    self.name, len(instances), num_added, len(removed_instances))
+        return removed_instances
+
+
+def create_route_table(config: dict, routers: dict[str, Router]) -> RouteTable:
+    """
+    Builds the route table from the routes in config.json, each mapping
+    a path prefix to the router of a pool. Without routes, every path
+    goes to the first pool.
+    """
+    routes = config.get("routes") or [{"prefix": "/", "pool": next(iter(routers))}]
+    route_table = RouteTable()
+    for route in routes:
+        if route["pool"] not in routers:
+            raise ValueError(f"Unknown upstream pool {route['pool']} of route {route['prefix']}")
+        route_table.add(route["prefix"], routers[route["pool"]])
+    return route_table
+
+
+class UpstreamPools:
+    """
+    All upstream pools of the router service and the route table mapping
+    request paths to them. A reloaded config is applied in place: pools
+    and instances which are kept keep their state, the routers are
+    rebuilt, taking over the components whose config did not change,
+    and swapped in along with the route table, and removed instances
+    are drained.
+    """
+    def __init__(self, config: dict, http_client: HttpClient):
+        self.http_client = http_client
+        self.drain_timeout = config.get("config_reload", {}).get("drain_timeout", DEFAULT_DRAIN_TIMEOUT)
+        self.pools = {name: UpstreamPool(name, pool_config, http_client)
+                      for name, pool_config in get_pool_configs(config).items()}
+        self.route_table = create_route_table(config, self.get_routers())
+        self.metrics: RouterMetrics = None
+        self.shared_table: SharedInstanceTable = None
+        self.is_running = False
+        self.drain_tasks = set()
+
+    def get_routers(self) -> dict[str, Router]:
+        return {name: pool.router for name, pool in self.pools.items()}
+
+    def get_instances(self) -> list[ServiceInstance]:
+        return [instance for pool in self.pools.values() for instance in pool.svc_instances]
+
+    def get_health_checkers(self) -> list[HealthChecker]:
+        return [pool.health_checker for pool in self.pools.values()]
+
+    def enable_metrics(self, metrics: RouterMetrics):
+        self.metrics = metrics
+        for pool in self.pools.values():
+            pool.enable_metrics(metrics)
+
+    def enable_shared_table(self, shared_table: SharedInstanceTable):
+        """
+        Counts the requests in flight in the table shared by all workers,
+        which has a fixed row per instance, so the instances can not
+        change on reload anymore
+        """
+        self.shared_table = shared_table
+        for pool in self.pools.values():
+            pool.enable_shared_table(shared_table)
+
+    def start_health_checks(self):
+        self.is_running = True
+        for pool in self.pools.values():
+            pool.start_health_checks()
+
+    async def stop(self):
+        self.is_running = False
+        tasks = [task for task in (pool.stop_health_checks() for pool in self.pools.values())
+                 if task is not None]
+        for task in self.drain_tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *self.drain_tasks, return_exceptions=True)
+
+    def update(self, config: dict):
+        """
+        Applies a reloaded config. Everything is built before anything is
+        switched over, so an invalid config raises a ValueError or
+        KeyError and leaves the current pools as they are.
+        """
+        pool_configs = get_pool_configs(config)
+        if self.shared_table is not None and (
+                [get_instance_url(app_instance) for pool_config in pool_configs.values()
+                 for app_instance in pool_config.get('app_instances', [])]
+                != [instance.get_url() for instance in self.get_instances()]):
+            raise ValueError("Instances can not change while workers share their state, "
+                             "restart the router-service instead")
+        prepared_updates = {}
+        added_pools = {}
+        try:
+            for name, pool_config in pool_configs.items():
+                if name in self.pools:
+                    prepared_updates[name] = self.pools[name].prepare_update(pool_config)
+                else:
+                    added_pools[name] = UpstreamPool(name, pool_config, self.http_client)
+            route_table = create_route_table(config, {
+                name: added_pools[name].router if name in added_pools else prepared_updates[name][1]
+                for name in pool_configs})
+        except Exception:
+            for name, (_, router) in prepared_updates.items():
+                router.close(self.pools[name].router)
+            for pool in added_pools.values():
+                pool.router.close()
+            raise
+
+        removed_instances = []
+        for name, (instances, router) in prepared_updates.items():
+            removed_instances.extend(self.pools[name].update(pool_configs[name], instances, router))
+        for name in [name for name in self.pools if name not in pool_configs]:
+            pool = self.pools.pop(name)
+            pool.stop_health_checks()
+            pool.router.close()
+            removed_instances.extend(pool.svc_instances)
+            logger.info("Removed upstream pool %s", name)
+        for name, pool in added_pools.items():
+            if self.metrics is not None:
+                pool.enable_metrics(self.metrics)
+            if self.is_running:
+                pool.start_health_checks()
+            logger.info("Added upstream pool %s with %d instances", name, len(pool.svc_instances))
+        self.pools = {name: added_pools.get(name) or self.pools[name] for name in pool_configs}
+        self.route_table.replace(route_table)
+        if removed_instances:
+            drain_task = asyncio.get_running_loop().create_task(self.drain(removed_instances))
+            self.drain_tasks.add(drain_task)
+            drain_task.add_done_callback(self.drain_tasks.discard)
+
+    async def drain(self, instances: list[ServiceInstance]):
+        """
+        Waits, at most drain_timeout, for the requests in flight to the
+        removed instances to finish and then drops their metrics
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while loop.time() < deadline and any(instance.get_in_flight_requests() for instance in instances):
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        num_in_flight = sum(instance.get_in_flight_requests() for instance in instances)
+        if num_in_flight:
+            logger.warning("Gave up draining %d removed instances with %d requests still in flight",
+                           len(instances), num_in_flight)
+        else:
+            logger.info("Drained %d removed instances", len(instances))
+        if self.metrics is not None:
+            self.metrics.remove_instances(instances)
@@ -0,0 +1,66 @@
+import heapq
+import math
+from typing import Callable
+
+from src.router.base_router import Router
+from src.utils.http.http_client import HttpClient
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def build_schedule(instances: tuple[ServiceInstance, ...]) -> list[ServiceInstance]:
+    """
+    Builds one cycle of a smooth weighted round-robin schedule, in which
+    every instance appears weight times(reduced by the gcd of all weights)
+    and the appearances of each instance are spread evenly over the
+    cycle, e.g. weights a=5, b=1, c=1 give a a a b c a a rather than
+    a a a a a b c. Instance i is due at (k + 0.5) / weight_i for its
+    k-th appearance and a heap yields the next due instance in O(log n).
+    """
+    weights = [instance.get_weight() for instance in instances]
+    divisor = math.gcd(*weights)
+    weights = [weight // divisor for weight in weights]
+
+    # (due time, tie breaker, appearances so far, index)
+    heap = [(0.5 / weight, -weight, 0, index) for index, weight in enumerate(weights)]
+    heapq.heapify(heap)
+    schedule = []
+    for _ in range(sum(weights)):
+        _, tie_breaker, appearances, index = heapq.heappop(heap)
+        schedule.append(instances[index])
+        appearances += 1
+        heapq.heappush(heap, ((appearances + 0.5) / weights[index], tie_breaker, appearances, index))
+    return schedule
+
+
+class WeightedRoundRobinRouter(Router):
+    """
+    Round-robin over the healthy instances where each instance gets a
+    share of the traffic proportional to its weight. The schedule is
+    only recomputed when a new snapshot of healthy instances is
+    published, and picking from it is O(1).
+    """
+    def __init__(self, instances: list[ServiceInstance], http_client: HttpClient,
+                 routable_instances: RoutableInstances = None):
+        super().__init__(instances, http_client, routable_instances)
+        self.schedule_version = None
+        self.schedule: list[ServiceInstance] = []
+        self.cur_index: int = 0 # Monotonic counter used to index into the schedule
+
+    def select_instance(self, request_key: str = None,
+                        is_available: Callable[[ServiceInstance], bool] = None) -> ServiceInstance | None:
+        snapshot = self.routable_instances.current()
+        if snapshot.version != self.schedule_version:
+            self.schedule = build_schedule(snapshot.instances) if snapshot.instances else []
+            self.schedule_version = snapshot.version
+            logger.info("Rebuilt weighted schedule of %d slots for routable instances version %d",
+                        len(self.schedule), snapshot.version)
+        for _ in range(len(self.schedule)):
+            cur_instance = self.schedule[self.cur_index % len(self.schedule)]
+            self.cur_index += 1
+            if is_available is None or is_available(cur_instance):
+                return cur_instance
+        return None
@@ -0,0 +1,126 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_LAG_INTERVAL = 0.01
+DEFAULT_MAX_SECONDS = 60
+DEFAULT_TOP_FUNCTIONS = 20
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+async def measure_loop_lag(duration: float, interval: float) -> dict:
+    """
+    Sleeps for interval over and over for duration seconds and returns
+    how much later than due the event loop woke up, i.e. how long
+    callbacks waited for the loop while it was busy
+    """
+    loop = asyncio.get_running_loop()
+    lags = []
+    deadline = loop.time() + duration
+    while loop.time() < deadline:
+        start_time = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start_time - interval))
+    return {"samples": len(lags), "mean": sum(lags) / len(lags) if lags else 0.0,
+            "p99": get_percentile(lags, 99), "max": max(lags, default=0.0)}
+
+
+def get_frame_label(frame, labels: dict) -> str:
+    code = frame.f_code
+    label = labels.get(code)
+    if label is None:
+        label = f"{frame.f_globals.get('__name__', code.co_filename)}:{code.co_qualname}"
+        labels[code] = label
+    return label
+
+
+def sample_stacks(thread_id: int, duration: float, interval: float) -> Counter:
+    """
+    Samples the stack of the given thread every interval seconds for
+    duration seconds, from the calling thread. Returns the number of
+    samples of every stack, outermost frame first.
+    """
+    stacks = Counter()
+    labels = {}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(get_frame_label(frame, labels))
+            frame = frame.f_back
+        if stack:
+            stacks[tuple(reversed(stack))] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+class Profiler:
+    """
+    Profiles the event loop thread on demand for a few seconds: the lag
+    of the event loop, and a sampling CPU profile taken by a background
+    thread which records the stack of the event loop thread every
+    sample_interval seconds. Sampling costs nothing while no profile
+    is taken. Samples waiting in the selector of the event loop are idle
+    time. Only one profile is taken at a time.
+    """
+    def __init__(self, config: dict):
+        self.sample_interval = config.get("sample_interval", DEFAULT_SAMPLE_INTERVAL)
+        self.lag_interval = config.get("lag_interval", DEFAULT_LAG_INTERVAL)
+        self.max_seconds = config.get("max_seconds", DEFAULT_MAX_SECONDS)
+        self.is_running = False
+
+    async def profile(self, seconds: float) -> tuple[dict, Counter]:
+        """
+        Returns the event loop lag and the sampled stacks of the event
+        loop thread over the next seconds
+        """
+        if self.is_running:
+            raise RuntimeError("A profile is already being taken")
+        self.is_running = True
+        try:
+            loop_lag, stacks = await asyncio.gather(
+                measure_loop_lag(seconds, self.lag_interval),
+                asyncio.to_thread(sample_stacks, threading.get_ident(), seconds, self.sample_interval))
+        finally:
+            self.is_running = False
+        return loop_lag, stacks
+
+
+def summarize_stacks(stacks: Counter, top: int = DEFAULT_TOP_FUNCTIONS) -> dict:
+    """
+    Returns the functions with the most samples on top of the stack(self)
+    and anywhere on it(total)
+    """
+    self_samples = Counter()
+    total_samples = Counter()
+    for stack, samples in stacks.items():
+        self_samples[stack[-1]] += samples
+        for function in set(stack):
+            total_samples[function] += samples
+    num_samples = sum(stacks.values())
+    return {
+        "samples": num_samples,
+        "top_self": [{"function": function, "samples": samples, "percent": 100 * samples / num_samples}
+                     for function, samples in self_samples.most_common(top)],
+        "top_total": [{"function": function, "samples": samples, "percent": 100 * samples / num_samples}
+                      for function, samples in total_samples.most_common(top)],
+    }
+
+
+def format_collapsed_stacks(stacks: Counter) -> str:
+    """
+    Formats the stacks in the collapsed format of flamegraph.pl and
+    speedscope, one "outer;...;inner samples" line per stack
+    """
+    return "".join(f"{';'.join(stack)} {samples}\n" for stack, samples in stacks.most_common())
@@ -0,0 +1,96 @@
+import json
+import queue
+import threading
+
+import httpx
+
+from src.utils.logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_FILE = "spans.jsonl"
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BATCH_SIZE = 512
+DEFAULT_FLUSH_INTERVAL = 1
+COLLECTOR_TIMEOUT = 5
+EXPORTERS = ("file", "collector")
+
+
+class SpanExporter:
+    """
+    Hands finished spans over to a bounded queue which a background thread
+    writes out in batches, every flush_interval seconds or once
+    max_batch_size spans are queued, so exporting never blocks the event
+    loop on disk or network I/O. The "file" exporter appends the spans to
+    file as JSON lines, the "collector" exporter POSTs them as a JSON
+    array to collector_url. When the queue is full the span is dropped and
+    counted instead of waiting for the writer to catch up.
+    """
+    def __init__(self, config: dict):
+        self.exporter = config.get("exporter", "file")
+        if self.exporter not in EXPORTERS:
+            raise ValueError(f"Unknown span exporter {self.exporter}")
+        self.file = config.get("file", DEFAULT_FILE)
+        self.collector_url = config.get("collector_url")
+        if self.exporter == "collector" and not self.collector_url:
+            raise ValueError("The collector span exporter needs a collector_url")
+        self.max_batch_size = config.get("max_batch_size", DEFAULT_MAX_BATCH_SIZE)
+        self.flush_interval = config.get("flush_interval", DEFAULT_FLUSH_INTERVAL)
+        self.queue = queue.Queue(maxsize=config.get("queue_size", DEFAULT_QUEUE_SIZE))
+        self.dropped_spans = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="span-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, span: dict):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped_spans += 1
+
+    def run(self):
+        client = httpx.Client(timeout=COLLECTOR_TIMEOUT) if self.exporter == "collector" else None
+        try:
+            while not self.stopped.is_set() or not self.queue.empty():
+                spans = self.take_batch()
+                if spans:
+                    self.write(spans, client)
+        finally:
+            if client is not None:
+                client.close()
+
+    def take_batch(self) -> list[dict]:
+        """
+        Waits up to flush_interval for the first span, then takes whatever
+        else is queued, up to max_batch_size spans
+        """
+        try:
+            spans = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(spans) < self.max_batch_size:
+            try:
+                spans.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def write(self, spans: list[dict], client: httpx.Client | None):
+        try:
+            if client is not None:
+                client.post(self.collector_url, json=spans).raise_for_status()
+            else:
+                with open(self.file, "a", encoding="utf-8") as spans_file:
+                    # A single write, so the batches of workers appending to the same file do not interleave
+                    spans_file.write("".join(json.dumps(span, separators=(",", ":")) + "\n"
+                                             for span in spans))
+        except (OSError, httpx.HTTPError) as e:
+            self.dropped_spans += len(spans)
+            logger.warning("Dropped %d spans, failed to export them: %s", len(spans), e)
+
+    def close(self):
+        """
+        Writes out the queued spans and stops the background thread
+        """
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,123 @@
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from src.tracing.span_exporter import SpanExporter
+
+DEFAULT_SAMPLE_RATE = 0.01
+TRACEPARENT_HEADER = "traceparent"
+# version-trace_id-parent_id-flags, see https://www.w3.org/TR/trace-context/#traceparent-header
+TRACEPARENT_PATTERN = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+SAMPLED_FLAG = 0x01
+
+# Span of the request being handled, if it is traced
+current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(traceparent: str | None) -> tuple[str, str, bool] | None:
+    """
+    Returns the trace id, parent span id and sampled flag of a traceparent
+    header, or None if it is missing or invalid
+    """
+    if not traceparent:
+        return None
+    match = TRACEPARENT_PATTERN.match(traceparent.strip().lower())
+    if match is None or match.group(1) == "ff":
+        return None
+    _, trace_id, parent_span_id, flags = match.groups()
+    if trace_id == INVALID_TRACE_ID or parent_span_id == INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_span_id, bool(int(flags, 16) & SAMPLED_FLAG)
+
+
+def record_phase(phase: str, start_time: float = None):
+    """
+    Adds the time since start_time(time.monotonic()), or since the
+    request arrived, to the phase of the current span, if any
+    """
+    span = current_span.get()
+    if span is not None:
+        span.add_phase(phase, time.monotonic() - (span.start_monotonic if start_time is None else start_time))
+
+
+class Span:
+    """
+    Timings of one request through the router-service. Phases add up
+    the time spent in each step, so retried and hedged requests add the
+    time of every attempt.
+    """
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "sampled", "start_time",
+                 "start_monotonic", "duration", "status_code", "phases", "instances", "batch")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_span_id: str | None, sampled: bool):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.start_time = time.time()
+        self.start_monotonic = time.monotonic()
+        self.duration: float = None
+        self.status_code: int = None
+        self.phases: dict[str, float] = {}
+        self.instances: list[str] = [] # Instances the request was sent to
+        self.batch: dict = None # Id and size of the batch the request was sent in, shared by its members
+
+    def add_phase(self, phase: str, duration: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def get_traceparent(self) -> str:
+        """
+        traceparent header of the requests to the instances, which makes
+        this span the parent of their spans
+        """
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_span_id": self.parent_span_id, "start_time": self.start_time,
+                "duration": self.duration, "status_code": self.status_code,
+                "phases": self.phases, "instances": self.instances, "batch": self.batch}
+
+
+class Tracer:
+    """
+    Starts a span for every request, continuing the trace of its
+    traceparent header if it has one. Whether a trace is sampled is
+    decided where it starts: requests continuing a trace follow the
+    sampled flag of their parent, new traces are sampled at sample_rate.
+    Only sampled spans are exported, while the phase timings of all of
+    them go to the metrics.
+    """
+    def __init__(self, config: dict, exporter: SpanExporter = None):
+        self.sample_rate = config.get("sample_rate", DEFAULT_SAMPLE_RATE)
+        self.exporter = exporter
+        self.metrics = None
+        self.random = random.Random()
+
+    def enable_metrics(self, metrics):
+        self.metrics = metrics
+
+    def start_span(self, name: str, traceparent: str = None) -> Span:
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_span_id, sampled = parent
+        else:
+            trace_id = f"{self.random.getrandbits(128) or 1:032x}"
+            parent_span_id = None
+            sampled = self.random.random() < self.sample_rate
+        return Span(name, trace_id, f"{self.random.getrandbits(64) or 1:016x}", parent_span_id, sampled)
+
+    def finish_span(self, span: Span):
+        span.duration = time.monotonic() - span.start_monotonic
+        if self.metrics is not None:
+            self.metrics.observe_phases(span.phases, span.duration)
+        if span.sampled and self.exporter is not None:
+            self.exporter.export(span.to_dict())
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
@@ -0,0 +1,38 @@
+from src.tracing.tracer import TRACEPARENT_HEADER, Tracer, current_span
+
+TRACEPARENT_HEADER_BYTES = TRACEPARENT_HEADER.encode()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing every HTTP request from the moment the server
+    hands it over until the last chunk of its response is sent. The span
+    is the current span while the request is handled, so the router and
+    the HTTP client add their phases to it.
+    """
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = next((value.decode("latin-1") for name, value in scope["headers"]
+                            if name == TRACEPARENT_HEADER_BYTES), None)
+        span = self.tracer.start_span(f"{scope['method']} {scope['path']}", traceparent)
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                span.status_code = message["status"]
+            await send(message)
+
+        token = current_span.set(span)
+        try:
+            await self.app(scope, receive, send_traced)
+        except Exception:
+            span.status_code = span.status_code or 500
+            raise
+        finally:
+            current_span.reset(token)
+            self.tracer.finish_span(span)
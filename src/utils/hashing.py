@@ -0,0 +1,8 @@
+import hashlib
+
+
+def stable_hash(value: str) -> int:
+    """
+    64 bit hash which, unlike hash(), is the same in every process
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
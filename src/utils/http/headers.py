@@ -0,0 +1,31 @@
+# Hop-by-hop headers (RFC 9110 section 7.6.1) only apply to a single
+# connection and must not be forwarded by a proxy. content-length is
+# recomputed by whichever side writes the body.
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+})
+
+
+def filter_headers(headers) -> list[tuple[str, str]]:
+    """
+    Returns the (name, value) pairs of the given headers which can be
+    forwarded as-is to the other side of the proxy. Repeated headers
+    like set-cookie are kept as separate pairs.
+    """
+    items = headers.multi_items() if hasattr(headers, "multi_items") else headers.items()
+    connection_headers = set()
+    for name, value in items:
+        if name.lower() == "connection":
+            connection_headers.update(token.strip().lower() for token in value.split(","))
+
+    return [(name, value) for name, value in items
+            if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in connection_headers]
@@ -1,23 +1,282 @@
+import importlib.util
+import time
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
 import httpx
+from src.tracing.tracer import TRACEPARENT_HEADER, Span, current_span, record_phase
+from src.utils.http.headers import filter_headers
+from src.utils.http.upstream_response import UpstreamResponse, UpstreamStream
 from src.utils.logger_config import setup_logger
 
+# httpx only speaks HTTP/2 with the optional h2 package installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 logger = setup_logger(__name__)
 
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_HTTP2_MAX_CONNECTIONS = 2
+DEFAULT_HTTP2_REPROBE_INTERVAL = 300
+# How an HTTP/1.1 only server answering the HTTP/2 preface shows up
+# on the client: a garbled response or a closed connection
+HTTP2_REJECTED_ERRORS = (httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError)
+# A closed connection may as well be a transient reset, so HTTP/2 is tried again later
+HTTP2_MAYBE_REJECTED_ERRORS = (httpx.ReadError, httpx.WriteError)
+# httpcore trace events of opening a connection
+CONNECT_EVENTS = ("connection.connect_tcp.", "connection.start_tls.")
+
+
+def get_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def set_traceparent(headers: list[tuple[str, str]] | None, traceparent: str) -> list[tuple[str, str]]:
+    """
+    Returns the headers with the traceparent replaced by the given one
+    """
+    return [*((name, value) for name, value in headers or () if name.lower() != TRACEPARENT_HEADER),
+            (TRACEPARENT_HEADER, traceparent)]
+
+
+class ConnectionTimer:
+    """
+    httpx trace extension adding the time a request spends opening a
+    connection, i.e. on the TCP connect and the TLS handshake, to the
+    connect phase of its span
+    """
+    __slots__ = ("span", "start_time", "duration")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.start_time: float = None
+        self.duration = 0.0
+
+    async def __call__(self, event_name: str, info: dict):
+        if not event_name.startswith(CONNECT_EVENTS):
+            return
+        if event_name.endswith(".started"):
+            self.start_time = time.monotonic()
+        elif self.start_time is not None:
+            duration = time.monotonic() - self.start_time
+            self.start_time = None
+            self.duration += duration
+            self.span.add_phase("connect", duration)
+
 
 class HttpClient:
-    # response timeout can be instance variable
+    """
+    Process wide HTTP client used to talk to the downstream instances.
+    It keeps one long-lived httpx.AsyncClient per upstream origin so that
+    each instance gets its own keep-alive connection pool, instead of
+    paying a new TCP handshake on every request.
+    With HTTP/2 enabled, the requests to an instance are multiplexed over
+    at most http2.max_connections connections instead of taking one
+    connection each. Plain http instances are spoken to in HTTP/2 with
+    prior knowledge(h2c), https ones negotiate it. An instance which turns
+    out not to speak HTTP/2, answering garbage or negotiating HTTP/1.1,
+    falls back to HTTP/1.1 for good, and a request which failed on the
+    HTTP/2 handshake is sent again. One which closed the connection on
+    its first HTTP/2 request only falls back for http2.reprobe_interval
+    seconds, as that may have been a transient reset, doubled whenever
+    it does so again.
+    """
+    def __init__(self, config: dict = None):
+        config = config or {}
+        self.limits = httpx.Limits(
+            max_connections=config.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=config.get("max_keepalive_connections",
+                                                 DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+            keepalive_expiry=config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY)
+        )
+        self.timeout = httpx.Timeout(config.get("read_timeout", DEFAULT_READ_TIMEOUT),
+                                     connect=config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT))
+        self.clients: dict[str, httpx.AsyncClient] = {}
+        http2_config = config.get("http2", {})
+        self.http2 = http2_config.get("enabled", False)
+        if self.http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 needs the h2 package(pip install h2), using HTTP/1.1")
+            self.http2 = False
+        self.http2_reprobe_interval = http2_config.get("reprobe_interval", DEFAULT_HTTP2_REPROBE_INTERVAL)
+        http2_max_connections = http2_config.get("max_connections", DEFAULT_HTTP2_MAX_CONNECTIONS)
+        self.http2_limits = httpx.Limits(max_connections=http2_max_connections,
+                                         max_keepalive_connections=http2_max_connections,
+                                         keepalive_expiry=self.limits.keepalive_expiry)
+        # Origins which answered in HTTP/2, and those which fell back to HTTP/1.1
+        self.http2_origins: set[str] = set()
+        self.http1_origins: set[str] = set()
+        # Origins which fell back after a closed connection -> time HTTP/2 is tried again
+        self.http2_reprobe_times: dict[str, float] = {}
+        # Origins which fell back after a closed connection -> interval of their next fall back
+        self.http2_reprobe_intervals: dict[str, float] = {}
+        # HTTP/2 clients replaced on fall back, closed along with the others
+        self.retired_clients: list[httpx.AsyncClient] = []
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """
+        Returns the pooled client of the upstream origin of the given url,
+        creating it on first use
+        """
+        origin = get_origin(url)
+        client = self.clients.get(origin)
+        if client is None:
+            client = self.create_client(origin)
+        return client
+
+    def create_client(self, origin: str) -> httpx.AsyncClient:
+        if self.http2 and origin not in self.http1_origins:
+            logger.info("Creating HTTP/2 connection pool for %s", origin)
+            # Without TLS there is no negotiation, so HTTP/1.1 is ruled out
+            client = httpx.AsyncClient(http1=origin.startswith("https:"), http2=True,
+                                       limits=self.http2_limits, timeout=self.timeout)
+        else:
+            logger.info("Creating connection pool for %s", origin)
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        # No default Accept, Accept-Encoding or User-Agent, only the headers of the request go upstream
+        client.headers.clear()
+        self.clients[origin] = client
+        return client
+
+    def is_http2_pending(self, origin: str) -> bool:
+        """
+        Whether requests to the origin go out in HTTP/2 while it is not
+        known yet whether it speaks it
+        """
+        return self.http2 and origin not in self.http2_origins and origin not in self.http1_origins
+
+    def fall_back_to_http1(self, origin: str, reprobe: bool = False):
+        if origin in self.http1_origins:
+            return
+        if reprobe:
+            reprobe_interval = self.http2_reprobe_intervals.get(origin, self.http2_reprobe_interval)
+            logger.warning("%s closed the connection on HTTP/2, falling back to HTTP/1.1 for %s seconds",
+                           origin, reprobe_interval)
+            self.http2_reprobe_times[origin] = time.monotonic() + reprobe_interval
+            self.http2_reprobe_intervals[origin] = reprobe_interval * 2
+        else:
+            logger.warning("%s does not speak HTTP/2, falling back to HTTP/1.1", origin)
+        self.http1_origins.add(origin)
+        self.retire_client(origin)
+
+    def reprobe_http2(self, origin: str):
+        logger.info("Trying HTTP/2 with %s again", origin)
+        del self.http2_reprobe_times[origin]
+        self.http1_origins.discard(origin)
+        self.retire_client(origin)
+
+    def retire_client(self, origin: str):
+        client = self.clients.pop(origin, None)
+        if client is not None:
+            # Not closed right away, requests to the origin may still be using it
+            self.retired_clients.append(client)
+
+    async def send(self, method: str, url: str, resendable: bool = True, stream: bool = False,
+                   **kwargs) -> httpx.Response:
+        """
+        Sends the request with the pooled client of its origin. Sends it
+        again in HTTP/1.1 if it failed because the origin does not speak
+        HTTP/2, unless its body can only be sent once.
+        A request sent while handling a traced request carries the
+        traceparent of its span, and adds the time taken to connect and
+        until the response(headers of a stream) to the connect and
+        upstream phases of the span.
+        """
+        span = current_span.get()
+        if span is None:
+            return await self.send_with_fallback(method, url, resendable, stream, **kwargs)
+        kwargs["headers"] = set_traceparent(kwargs.get("headers"), span.get_traceparent())
+        connection_timer = ConnectionTimer(span)
+        kwargs["extensions"] = {"trace": connection_timer}
+        start_time = time.monotonic()
+        try:
+            return await self.send_with_fallback(method, url, resendable, stream, **kwargs)
+        finally:
+            span.add_phase("upstream", time.monotonic() - start_time - connection_timer.duration)
+
+    async def send_with_fallback(self, method: str, url: str, resendable: bool, stream: bool,
+                                 **kwargs) -> httpx.Response:
+        origin = get_origin(url)
+        reprobe_time = self.http2_reprobe_times.get(origin)
+        if reprobe_time is not None and time.monotonic() >= reprobe_time:
+            self.reprobe_http2(origin)
+        client = self.clients.get(origin) or self.create_client(origin)
+        http2_pending = self.is_http2_pending(origin)
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except HTTP2_REJECTED_ERRORS as e:
+            if not http2_pending or origin in self.http2_origins:
+                raise
+            self.fall_back_to_http1(origin, reprobe=isinstance(e, HTTP2_MAYBE_REJECTED_ERRORS))
+            if not resendable:
+                raise
+            client = self.get_client(url)
+            return await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        if http2_pending:
+            if response.http_version == "HTTP/2":
+                self.http2_origins.add(origin)
+                self.http2_reprobe_intervals.pop(origin, None)
+            else:
+                # An https origin which negotiated HTTP/1.1
+                self.fall_back_to_http1(origin)
+        return response
+
     async def post(self, url: str, payload: dict) -> dict:
-        logger.info(f"Sending post request to {url}")
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(url, json=payload)
-            logger.info(f"Obtained response for post {response.status_code}")
-            response.raise_for_status()
-            return response.json()
+        logger.debug("Sending post request to %s", url)
+        response = await self.send("POST", url, json=payload)
+        logger.debug("Obtained response for post %d", response.status_code)
+        response.raise_for_status()
+        return response.json()
 
     async def get(self, url: str) -> dict:
-        logger.info(f"Sending get request to {url}")
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.get(url)
-            logger.info(f"Obtained response for get {response.status_code}")
-            response.raise_for_status()
-            return response.json()
+        logger.debug("Sending get request to %s", url)
+        response = await self.send("GET", url)
+        logger.debug("Obtained response for get %d", response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+    async def forward(self, method: str, url: str, body: bytes,
+                      headers: list[tuple[str, str]]) -> UpstreamResponse:
+        """
+        Forwards the raw request body and headers to the given url and
+        returns the upstream status, headers and body bytes unchanged.
+        Neither the request nor the response body is parsed.
+        """
+        logger.debug("Forwarding %s request to %s", method, url)
+        response = await self.send(method, url, stream=True, content=body, headers=headers)
+        body_start_time = time.monotonic()
+        try:
+            # aiter_raw skips content decoding, so compressed bodies pass through as is
+            content = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+            record_phase("upstream", body_start_time)
+        logger.debug("Obtained response for %s %d", method, response.status_code)
+        return UpstreamResponse(response.status_code, filter_headers(response.headers), content)
+
+    async def stream(self, method: str, url: str, body: AsyncIterator[bytes] | None,
+                     headers: list[tuple[str, str]]) -> UpstreamStream:
+        """
+        Streams the request body to the given url and returns as soon as
+        the upstream response headers arrive. The response body is read
+        lazily through UpstreamStream.iter_body(), which the caller must
+        exhaust or close to release the connection.
+        """
+        logger.debug("Streaming %s request to %s", method, url)
+        # The body iterator can not be rewound to send it again
+        response = await self.send(method, url, resendable=False, stream=True, content=body,
+                                   headers=headers)
+        logger.debug("Obtained response headers for %s %d", method, response.status_code)
+        return UpstreamStream(response)
+
+    async def close(self):
+        """
+        Closes the connection pools of all upstream origins
+        """
+        for client in [*self.clients.values(), *self.retired_clients]:
+            await client.aclose()
+        self.clients.clear()
+        self.retired_clients.clear()
@@ -0,0 +1,21 @@
+from typing import AsyncIterator
+
+
+async def limit_chunk_size(stream: AsyncIterator[bytes], max_chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Re-yields the chunks of the given byte stream, splitting any chunk
+    larger than max_chunk_size, so no larger chunk is forwarded. Chunks
+    are never merged, so a slow stream is not held back waiting for a
+    buffer to fill up. The stream is only pulled when the consumer asks
+    for the next chunk, but a chunk being split is held in full, so the
+    memory per request is bounded by the read sizes of the server and of
+    the HTTP client rather than by max_chunk_size.
+    """
+    async for chunk in stream:
+        if len(chunk) <= max_chunk_size:
+            if chunk:
+                yield chunk
+            continue
+        view = memoryview(chunk)
+        for offset in range(0, len(chunk), max_chunk_size):
+            yield bytes(view[offset:offset + max_chunk_size])
@@ -0,0 +1,55 @@
+from typing import AsyncIterator
+
+import httpx
+from src.utils.http.headers import filter_headers
+from src.utils.http.streaming import limit_chunk_size
+
+
+class UpstreamResponse:
+    """
+    Raw response of a downstream instance, passed back to the client
+    without decoding the body
+    """
+    def __init__(self, status_code: int, headers: list[tuple[str, str]], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def get_size(self) -> int:
+        """
+        Returns the approximate number of bytes the response takes in memory
+        """
+        return len(self.content) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+class UpstreamStream:
+    """
+    Streamed response of a downstream instance. The body is pulled from
+    the upstream connection only as fast as the client consumes it, and
+    the connection is released once the body is exhausted or abandoned.
+    """
+    def __init__(self, response: httpx.Response):
+        self.status_code = response.status_code
+        self.headers = filter_headers(response.headers)
+        self.response = response
+        self.close_callbacks = []
+
+    async def iter_body(self, max_chunk_size: int) -> AsyncIterator[bytes]:
+        try:
+            # aiter_raw skips content decoding, so compressed bodies pass through as is
+            async for chunk in limit_chunk_size(self.response.aiter_raw(), max_chunk_size):
+                yield chunk
+        finally:
+            await self.aclose()
+
+    def add_close_callback(self, callback):
+        """
+        Registers a callable which is invoked once the stream is closed
+        """
+        self.close_callbacks.append(callback)
+
+    async def aclose(self):
+        await self.response.aclose()
+        callbacks, self.close_callbacks = self.close_callbacks, []
+        for callback in callbacks:
+            callback()
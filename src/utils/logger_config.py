@@ -1,18 +1,117 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_LOG_FILE = "router.log"
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands log records over to a bounded queue which a background thread
+    writes to the log file, so logging never blocks the event loop on
+    disk I/O. When the queue is full the record is dropped and counted
+    instead of waiting for the writer to catch up.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped_records = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+
+# Shared by the loggers of all modules, started on first use
+queue_handler: DroppingQueueHandler = None
+queue_listener: QueueListener = None
+# Logger name prefix -> level, the longest matching prefix wins
+module_levels: dict[str, int] = {}
+default_level: int = logging.getLevelName(DEFAULT_LOG_LEVEL)
+configured_loggers: set[str] = set()
+
+
+def start_queue_listener(log_file: str = DEFAULT_LOG_FILE, queue_size: int = DEFAULT_QUEUE_SIZE):
+    """
+    (Re)starts the background thread writing queued records to log_file.
+    Records still queued when it is restarted are written out first.
+    """
+    global queue_handler, queue_listener
+    if queue_listener is not None:
+        queue_listener.stop()
+
+    handler = logging.FileHandler(log_file)
+    formatter = logging.Formatter(
+        '[%(asctime)s] [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    if queue_handler is None:
+        queue_handler = DroppingQueueHandler(log_queue)
+    else:
+        queue_handler.queue = log_queue
+    queue_listener = QueueListener(log_queue, handler)
+    queue_listener.start()
+
+
+def stop_queue_listener():
+    """
+    Flushes the queued records and stops the background writer thread
+    """
+    global queue_listener
+    if queue_listener is not None:
+        queue_listener.stop()
+        queue_listener = None
+
+
+atexit.register(stop_queue_listener)
+
+
+def get_level(name: str) -> int:
+    matches = [prefix for prefix in module_levels if name == prefix or name.startswith(prefix + ".")]
+    if not matches:
+        return default_level
+    return module_levels[max(matches, key=len)]
+
+
+def configure_logging(config: dict):
+    """
+    Applies the logging section of config.json: the log file, the size
+    of the queue in front of it, the default level and per module levels,
+    e.g. {"src.router": "WARNING"}
+    """
+    global default_level, module_levels
+    default_level = logging.getLevelName(config.get("level", DEFAULT_LOG_LEVEL))
+    module_levels = {prefix: logging.getLevelName(level)
+                     for prefix, level in config.get("module_levels", {}).items()}
+    start_queue_listener(config.get("file", DEFAULT_LOG_FILE),
+                         config.get("queue_size", DEFAULT_QUEUE_SIZE))
+    for name in configured_loggers:
+        logging.getLogger(name).setLevel(get_level(name))
+
+
+def get_dropped_log_records() -> int:
+    """
+    Returns the number of records dropped because the log queue was full
+    """
+    return queue_handler.dropped_records if queue_handler is not None else 0
 
 
 def setup_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(get_level(name))
+    configured_loggers.add(name)
 
+    if queue_listener is None:
+        start_queue_listener()
     if not logger.handlers:
-        handler = logging.FileHandler("router.log")
-        formatter = logging.Formatter(
-            '[%(asctime)s] [%(levelname)s] %(name)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(queue_handler)
 
     return logger
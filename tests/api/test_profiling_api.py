@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.profiling_api import create_profiling_api_router
+from src.tracing.profiler import Profiler
+
+
+def create_client(config: dict = None) -> TestClient:
+    app = FastAPI()
+    app.include_router(create_profiling_api_router(Profiler(config or {})))
+    return TestClient(app)
+
+
+def test_profile_returns_loop_lag_and_cpu_profile():
+    client = create_client()
+
+    profile = client.get("/debug/profile?seconds=0.1").json()
+    assert profile["seconds"] == 0.1
+    assert profile["loop_lag"]["samples"] > 0
+    assert profile["cpu"]["samples"] > 0
+
+    collapsed = client.get("/debug/profile?seconds=0.1&format=collapsed")
+    assert collapsed.headers["content-type"].startswith("text/plain")
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.text.splitlines())
+
+
+def test_invalid_profile_requests_rejected():
+    client = create_client({"max_seconds": 1})
+
+    assert client.get("/debug/profile?seconds=2").status_code == 422
+    assert client.get("/debug/profile?seconds=0").status_code == 422
+    assert client.get("/debug/profile?seconds=0.1&format=pprof").status_code == 422
@@ -0,0 +1,104 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from src.api.router_api import UpstreamStreamingResponse, create_api_router
+from src.router.route_table import RouteTable
+from src.utils.http.upstream_response import UpstreamResponse, UpstreamStream
+
+
+def create_client(route_table: RouteTable, config: dict = None) -> TestClient:
+    app = FastAPI()
+    app.include_router(create_api_router(route_table, config))
+    return TestClient(app)
+
+
+def create_router() -> Mock:
+    router = Mock()
+    router.route = AsyncMock(return_value={"status": "success"})
+    router.route_bytes = AsyncMock(return_value=UpstreamResponse(200, [("x-upstream", "1")], b"ok"))
+    return router
+
+
+def test_every_method_and_path_is_proxied_to_the_matching_pool():
+    api_router, default_router = create_router(), create_router()
+    route_table = RouteTable()
+    route_table.add("/", default_router)
+    route_table.add("/api", api_router)
+    client = create_client(route_table, {"passthrough": True})
+
+    response = client.delete("/api/games/42?force=true")
+    assert response.status_code == 200
+    assert response.content == b"ok"
+    assert response.headers["x-upstream"] == "1"
+    endpoint, body, _, method, query = api_router.route_bytes.call_args.args
+    assert (endpoint, body, method, query) == ("/api/games/42", b"", "DELETE", "force=true")
+
+    client.put("/players/7", content=b"payload")
+    endpoint, body, _, method, query = default_router.route_bytes.call_args.args
+    assert (endpoint, body, method, query) == ("/players/7", b"payload", "PUT", "")
+    api_router.route_bytes.assert_awaited_once()
+
+
+def test_json_mode_parses_json_object_posts_to_json_routes_only():
+    router = create_router()
+    router.route_bytes = AsyncMock(return_value=UpstreamResponse(201, [("x-upstream", "1")], b"created"))
+    route_table = RouteTable()
+    route_table.add("/", router)
+    client = create_client(route_table, {"json_routes": ["/echo"]})
+
+    response = client.post("/echo", json={"gameid": "coolknight"})
+    assert response.json() == {"status": "success"}
+    router.route.assert_awaited_once()
+    assert router.route.call_args.args[1] == {"gameid": "coolknight"}
+
+    # Anything else is passed through with the status and headers of the instance
+    for response in [client.post("/echo", content=b"[1, 2]"), client.post("/games", json={"n": 1}),
+                     client.get("/echo")]:
+        assert response.status_code == 201
+        assert response.headers["x-upstream"] == "1"
+    assert router.route_bytes.await_count == 3
+    router.route.assert_awaited_once()
+
+
+def test_unrouted_path_gets_404():
+    route_table = RouteTable()
+    route_table.add("/api", create_router())
+    client = create_client(route_table)
+
+    assert client.get("/other").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_upstream_stream_closed_when_client_disconnects_before_body():
+    upstream_stream = UpstreamStream(httpx.Response(200, content=b"ok"))
+    on_close = Mock()
+    upstream_stream.add_close_callback(on_close)
+    response = UpstreamStreamingResponse(upstream_stream, 1024)
+
+    async def send(message):
+        raise OSError("Client disconnected")
+
+    with pytest.raises(ClientDisconnect):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, AsyncMock(), send)
+
+    on_close.assert_called_once()
+
+
+def test_streaming_request_without_body_sent_without_one():
+    router = create_router()
+    router.route_stream = AsyncMock(
+        side_effect=lambda *args: UpstreamStream(httpx.Response(200, stream=httpx.ByteStream(b"ok"))))
+    route_table = RouteTable()
+    route_table.add("/", router)
+    client = create_client(route_table, {"streaming": {"enabled": True}})
+
+    assert client.get("/echo").content == b"ok"
+    assert router.route_stream.call_args.args[1] is None
+
+    assert client.post("/echo", content=b"payload").content == b"ok"
+    assert router.route_stream.call_args.args[1] is not None
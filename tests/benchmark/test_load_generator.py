@@ -0,0 +1,45 @@
+import httpx
+import pytest
+
+from benchmarks.load_generator import LoadGenerator, generate_traffic, get_percentile
+from benchmarks.stub_upstream import StubUpstream
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 1001)]
+
+    assert get_percentile(values, 50) == 0.5
+    assert get_percentile(values, 99) == 0.99
+    assert get_percentile(values, 99.9) == 0.999
+    assert get_percentile([], 99) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_stub_upstream_echoes_and_fails_at_error_rate():
+    stub = StubUpstream(latency=0, error_rate=1.0)
+    server = await stub.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with httpx.AsyncClient() as client:
+        health_response = await client.get(f"http://127.0.0.1:{port}/health")
+        echo_response = await client.post(f"http://127.0.0.1:{port}/echo", content=b'{"a": 1}')
+
+    assert health_response.status_code == 200
+    assert echo_response.status_code == 500
+    assert stub.num_requests == 1
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_loop_load_reports_latencies():
+    stub = StubUpstream(latency=0.001, latency_distribution="exponential")
+    server = await stub.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    load_generator = LoadGenerator(f"http://127.0.0.1:{port}/echo", generate_traffic(10))
+
+    result = (await load_generator.run_closed_loop(concurrency=4, duration=0.3)).to_dict()
+
+    assert result["requests"] == stub.num_requests > 0
+    assert result["errors"] == 0
+    assert 0 < result["p50"] <= result["p99"] <= result["p999"] <= result["max"]
+    server.close()
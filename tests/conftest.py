@@ -0,0 +1,19 @@
+import pytest
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+
+
+@pytest.fixture
+def create_instances():
+    """
+    Creates the given number of healthy instances on consecutive ports
+    """
+    def create(num_instances: int) -> list[ServiceInstance]:
+        instances = []
+        for i in range(num_instances):
+            instance = ServiceInstance(f"http://localhost:{9990 + i}")
+            instance.health_status = HealthStatus.HEALTHY
+            instances.append(instance)
+        return instances
+    return create
@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+from unittest.mock import Mock
+
+from src.discovery.config_reloader import ConfigReloader
+from src.discovery.instance_discovery import DnsDiscovery
+
+
+def write_json(path, content):
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(content, json_file)
+
+
+def create_reloader(config_path, config: dict, apply_config) -> ConfigReloader:
+    def read_config():
+        with open(config_path, "r", encoding="utf-8") as conf_file:
+            return json.load(conf_file)
+    return ConfigReloader(str(config_path), config, read_config, apply_config)
+
+
+@pytest.mark.asyncio
+async def test_changed_config_file_applied(tmp_path):
+    config_path = tmp_path / "config.json"
+    config = {"app_instances": ["http://localhost:9001"], "routing_algorithm": "round_robin"}
+    write_json(config_path, config)
+    apply_config = Mock()
+    reloader = create_reloader(config_path, config, apply_config)
+
+    await reloader.reload()
+    apply_config.assert_not_called()
+
+    new_config = {**config, "routing_algorithm": "least_requests"}
+    write_json(config_path, new_config)
+    os.utime(config_path, ns=(0, 1))
+    await reloader.reload()
+    apply_config.assert_called_once_with(new_config)
+
+
+@pytest.mark.asyncio
+async def test_invalid_config_file_keeps_config_in_effect(tmp_path):
+    config_path = tmp_path / "config.json"
+    config = {"app_instances": ["http://localhost:9001"]}
+    write_json(config_path, config)
+    apply_config = Mock()
+    reloader = create_reloader(config_path, config, apply_config)
+
+    config_path.write_text("{not json")
+    await reloader.reload(force=True)
+
+    apply_config.assert_not_called()
+    assert reloader.file_config == config
+
+
+@pytest.mark.asyncio
+async def test_failure_to_apply_config_keeps_reloader_running(tmp_path):
+    config_path = tmp_path / "config.json"
+    config = {"app_instances": ["http://localhost:9001"]}
+    write_json(config_path, config)
+    apply_config = Mock(side_effect=[RuntimeError("Unexpected"), None])
+    reloader = create_reloader(config_path, config, apply_config)
+
+    write_json(config_path, {"app_instances": ["http://localhost:9002"]})
+    await reloader.reload(force=True)
+    new_config = {"app_instances": ["http://localhost:9003"]}
+    write_json(config_path, new_config)
+    await reloader.reload(force=True)
+
+    assert apply_config.call_count == 2
+    apply_config.assert_called_with(new_config)
+
+@pytest.mark.asyncio
+async def test_discovered_instances_replace_app_instances_of_pool(tmp_path):
+    config_path = tmp_path / "config.json"
+    instances_path = tmp_path / "instances.json"
+    write_json(instances_path, ["http://localhost:9002", {"url": "http://localhost:9003", "weight": 2}])
+    config = {"pools": {"api": {"discovery": {"type": "file", "path": str(instances_path)}},
+                        "web": {"app_instances": ["http://localhost:9001"]}}}
+    write_json(config_path, config)
+    apply_config = Mock()
+    reloader = create_reloader(config_path, config, apply_config)
+
+    await reloader.reload()
+    applied_config = apply_config.call_args.args[0]
+    assert applied_config["pools"]["api"]["app_instances"] == ["http://localhost:9002",
+                                                               {"url": "http://localhost:9003", "weight": 2}]
+    assert applied_config["pools"]["web"] == config["pools"]["web"]
+
+    # A failing source keeps the instances it returned last
+    instances_path.unlink()
+    await reloader.reload()
+    apply_config.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_dns_discovery_resolves_localhost():
+    discovery = DnsDiscovery({"hostname": "localhost", "port": 9001})
+
+    urls = await discovery.discover()
+
+    assert "http://127.0.0.1:9001" in urls or "http://[::1]:9001" in urls
@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock
+
+from src.models.circuit_state import CircuitState
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.health.circuit_breaker import CircuitBreakers, CircuitOpenError, CIRCUIT_OPEN
+from src.router.round_robin_router import RoundRobinRouter
+from src.router.retry_policy import RetryPolicy
+
+
+def create_circuit_breakers(instances: list[ServiceInstance], **config) -> CircuitBreakers:
+    return CircuitBreakers(instances, RoutableInstances(instances),
+                           {"failure_threshold": 3, "open_duration": 0.05,
+                            "half_open_max_requests": 1, "success_threshold": 2, **config})
+
+
+@pytest.mark.asyncio
+async def test_consecutive_failures_open_circuit(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+
+    for _ in range(3):
+        breakers.record(instances[0], failed=True)
+
+    assert breakers.get_state(instances[0]) == CircuitState.OPEN
+    assert not breakers.try_acquire(instances[0])
+    assert breakers.routable_instances.is_excluded(instances[0], CIRCUIT_OPEN)
+    assert instances[0] not in breakers.routable_instances.current().instances
+
+
+@pytest.mark.asyncio
+async def test_success_keeps_circuit_closed(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+
+    for _ in range(5):
+        breakers.record(instances[0], failed=True)
+        breakers.record(instances[0], failed=False)
+
+    assert breakers.get_state(instances[0]) == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_limits_trial_requests_and_closes_on_success(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+    for _ in range(3):
+        breakers.record(instances[0], failed=True)
+
+    await asyncio.sleep(0.1)
+
+    assert breakers.get_state(instances[0]) == CircuitState.HALF_OPEN
+    assert instances[0] in breakers.routable_instances.current().instances
+    assert breakers.try_acquire(instances[0])
+    assert not breakers.try_acquire(instances[0])
+    breakers.record(instances[0], failed=False)
+    assert breakers.try_acquire(instances[0])
+    breakers.record(instances[0], failed=False)
+    assert breakers.get_state(instances[0]) == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_trial_request_reopens_circuit(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+    for _ in range(3):
+        breakers.record(instances[0], failed=True)
+    await asyncio.sleep(0.1)
+
+    assert breakers.try_acquire(instances[0])
+    breakers.record(instances[0], failed=True)
+
+    assert breakers.get_state(instances[0]) == CircuitState.OPEN
+    assert instances[0] not in breakers.routable_instances.current().instances
+
+
+@pytest.mark.asyncio
+async def test_released_trial_request_frees_its_slot(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+    for _ in range(3):
+        breakers.record(instances[0], failed=True)
+    await asyncio.sleep(0.1)
+
+    assert breakers.try_acquire(instances[0])
+    breakers.release(instances[0])
+
+    assert breakers.try_acquire(instances[0])
+
+
+@pytest.mark.asyncio
+async def test_router_fails_fast_on_open_circuit(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+    router = RoundRobinRouter(instances, AsyncMock(), breakers.routable_instances)
+    router.enable_circuit_breakers(breakers)
+    breakers.breakers[instances[0]].state = CircuitState.OPEN
+    send = AsyncMock()
+
+    with pytest.raises(CircuitOpenError):
+        await router.send_to_instance(instances[0], send)
+
+    send.assert_not_called()
+    assert instances[0].get_in_flight_requests() == 0
+
+
+@pytest.mark.asyncio
+async def test_router_opens_circuit_and_fails_over(create_instances):
+    instances = create_instances(2)
+    breakers = create_circuit_breakers(instances)
+    router = RoundRobinRouter(instances, AsyncMock(), breakers.routable_instances)
+    router.enable_circuit_breakers(breakers)
+    router.enable_retries(RetryPolicy({"max_retries": 1, "backoff_base": 0, "budget_max_tokens": 100}))
+
+    async def post(url, payload):
+        if url.startswith(instances[0].get_url()):
+            raise httpx.ConnectError("Connection refused")
+        return {"served_by": url}
+
+    router.http_client.post.side_effect = post
+    for _ in range(6):
+        assert await router.route("/echo", {"a": 1}) == {"served_by": instances[1].get_url() + "/echo"}
+
+    assert breakers.get_state(instances[0]) == CircuitState.OPEN
+    assert router.select_available_instance() is instances[1]
@@ -107,68 +107,188 @@ async def test_healthcheck_passes_sets_instance_healthy():
     mock_svc_instance.update_health_status.assert_called_once_with(HealthStatus.HEALTHY)
 
 
-
 @pytest.mark.asyncio
-async def test_healthcheck_skips_degraded_instance():
-    cur_time = time.time()
-    mock_svc_instance = Mock(spec=ServiceInstance)
-    mock_svc_instance.get_url.return_value = "http://localhost:9999"
-    mock_svc_instance.health_status = HealthStatus.DEGRADED
-    mock_svc_instance.get_last_healthcheck_time.return_value = cur_time - 10
-    mock_svc_instance.update_health_status = MagicMock()
+async def test_state_change_publishes_routable_instances():
+    svc_instance = ServiceInstance("http://localhost:9999")
+    svc_instance.min_state_transition_requests = 1
 
     mock_http_client = Mock()
-    async def successful_get(url):
-        await asyncio.sleep(0.5)
-    mock_http_client.get = AsyncMock(side_effect=successful_get)
+    mock_http_client.get = AsyncMock(return_value={})
 
+    cur_time = time.time()
     mock_time_provider = Mock()
-    start_time = cur_time
-    mock_time_provider.side_effect = [start_time, start_time + 2, start_time + 3]
+    mock_time_provider.side_effect = [cur_time, cur_time, cur_time + 1]
 
     mock_config = {
         'healthcheck_response_time_threshold': 5,
         'degraded_check_interval': 30
     }
 
-    health_checker = HealthChecker(instances=[mock_svc_instance],
+    health_checker = HealthChecker(instances=[svc_instance],
                                    http_client=mock_http_client,
                                    config=mock_config,
                                    time_provider=mock_time_provider)
+    initial_snapshot = health_checker.routable_instances.current()
+    assert initial_snapshot.instances == ()
 
-    await health_checker.check_and_update_instance_health(mock_svc_instance)
+    await health_checker.check_and_update_instance_health(svc_instance)
+
+    snapshot = health_checker.routable_instances.current()
+    assert snapshot.instances == (svc_instance,)
+    assert snapshot.version == initial_snapshot.version + 1
+
+
+def test_degraded_instance_checked_less_often():
+    healthy_instance = ServiceInstance("http://localhost:9990")
+    healthy_instance.health_status = HealthStatus.HEALTHY
+    degraded_instance = ServiceInstance("http://localhost:9991")
+    degraded_instance.health_status = HealthStatus.DEGRADED
+
+    health_checker = HealthChecker(instances=[healthy_instance, degraded_instance],
+                                   http_client=Mock(),
+                                   config={'health_check_interval': 10, 'degraded_check_interval': 30},
+                                   time_provider=time.time)
 
-    mock_svc_instance.update_health_status.assert_not_called()
+    assert health_checker.get_check_interval(healthy_instance) == 10
+    assert health_checker.get_check_interval(degraded_instance) == 30
 
 
 @pytest.mark.asyncio
-async def test_healthcheck_does_not_skip_degraded_instance():
-    cur_time = time.time()
-    mock_svc_instance = Mock(spec=ServiceInstance)
-    mock_svc_instance.get_url.return_value = "http://localhost:9999"
-    mock_svc_instance.health_status = HealthStatus.DEGRADED
-    mock_svc_instance.get_last_healthcheck_time.return_value = cur_time - 40
-    mock_svc_instance.update_health_status = MagicMock()
+async def test_scheduler_caps_concurrent_probes_and_reports_lag():
+    instances = [ServiceInstance(f"http://localhost:{9990 + i}") for i in range(20)]
+    running_probes = 0
+    max_running_probes = 0
+    probed_urls = set()
+
+    async def slow_get(url):
+        nonlocal running_probes, max_running_probes
+        running_probes += 1
+        max_running_probes = max(max_running_probes, running_probes)
+        probed_urls.add(url)
+        await asyncio.sleep(0.02)
+        running_probes -= 1
 
     mock_http_client = Mock()
-    async def successful_get(url):
-        await asyncio.sleep(0.5)
-    mock_http_client.get = AsyncMock(side_effect=successful_get)
+    mock_http_client.get = AsyncMock(side_effect=slow_get)
+    mock_config = {
+        'healthcheck_response_time_threshold': 5,
+        'health_check_interval': 0.05,
+        'degraded_check_interval': 0.1,
+        'health_check_scheduler': {'max_concurrent_probes': 3, 'jitter': 0.1}
+    }
+    health_checker = HealthChecker(instances=instances,
+                                   http_client=mock_http_client,
+                                   config=mock_config,
+                                   time_provider=time.time)
 
-    mock_time_provider = Mock()
-    start_time = cur_time
-    mock_time_provider.side_effect = [start_time, start_time + 2, start_time + 3]
+    run_task = asyncio.create_task(health_checker.run())
+    await asyncio.sleep(0.3)
+    run_task.cancel()
+
+    assert len(probed_urls) == 20
+    assert max_running_probes == 3
+    # 20 probes of 20ms, 3 at a time, can not all start within the 50ms interval
+    assert health_checker.last_lag > 0
+    assert len(health_checker.schedule) > 0
 
+
+@pytest.mark.asyncio
+async def test_set_instances_checks_added_and_stops_checking_removed():
+    instances = [ServiceInstance("http://localhost:9990"), ServiceInstance("http://localhost:9991")]
+    probed_urls = []
+
+    async def get(url):
+        probed_urls.append(url)
+
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(side_effect=get)
     mock_config = {
         'healthcheck_response_time_threshold': 5,
-        'degraded_check_interval': 30
+        'health_check_interval': 10,
+        'degraded_check_interval': 10
     }
+    health_checker = HealthChecker(instances=instances,
+                                   http_client=mock_http_client,
+                                   config=mock_config,
+                                   time_provider=time.time)
+    health_checker.random.uniform = lambda low, high: low
 
-    health_checker = HealthChecker(instances=[mock_svc_instance],
+    run_task = asyncio.create_task(health_checker.run())
+    await asyncio.sleep(0.01)
+    added_instance = ServiceInstance("http://localhost:9992")
+    health_checker.set_instances([instances[0], added_instance],
+                                 {**mock_config, 'health_check_interval': 0.05})
+    await asyncio.sleep(0.01)
+    assert probed_urls[-1] == "http://localhost:9992/health"
+
+    probed_urls.clear()
+    await asyncio.sleep(0.05)
+    run_task.cancel()
+    assert "http://localhost:9991/health" not in probed_urls
+
+
+@pytest.mark.asyncio
+async def test_set_instances_applies_scheduler_config():
+    instances = [ServiceInstance(f"http://localhost:{9990 + index}") for index in range(4)]
+    running_probes = 0
+    max_running_probes = 0
+
+    async def slow_get(url):
+        nonlocal running_probes, max_running_probes
+        running_probes += 1
+        max_running_probes = max(max_running_probes, running_probes)
+        await asyncio.sleep(0.02)
+        running_probes -= 1
+
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(side_effect=slow_get)
+    mock_config = {
+        'healthcheck_response_time_threshold': 5,
+        'health_check_interval': 0.05,
+        'degraded_check_interval': 0.1,
+        'health_check_scheduler': {'max_concurrent_probes': 4}
+    }
+    health_checker = HealthChecker(instances=instances,
                                    http_client=mock_http_client,
                                    config=mock_config,
-                                   time_provider=mock_time_provider)
+                                   time_provider=time.time)
+    health_checker.set_instances(instances, {**mock_config, 'health_check_scheduler': {
+        'max_concurrent_probes': 1, 'jitter': 0.5, 'lag_warning_threshold': 2}})
 
-    await health_checker.check_and_update_instance_health(mock_svc_instance)
+    run_task = asyncio.create_task(health_checker.run())
+    await asyncio.sleep(0.1)
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+
+    assert max_running_probes == 1
+    assert health_checker.jitter == 0.5
+    assert health_checker.lag_warning_threshold == 2
+
+
+@pytest.mark.asyncio
+async def test_rescheduled_instance_checked_on_time():
+    probed_urls = []
+
+    async def get(url):
+        probed_urls.append(url)
+
+    mock_http_client = Mock()
+    mock_http_client.get = AsyncMock(side_effect=get)
+    mock_config = {
+        'healthcheck_response_time_threshold': 5,
+        'health_check_interval': 10,
+        'degraded_check_interval': 10
+    }
+    health_checker = HealthChecker(instances=[ServiceInstance("http://localhost:9990")],
+                                   http_client=mock_http_client,
+                                   config=mock_config,
+                                   time_provider=time.time)
+    health_checker.random.uniform = lambda low, high: low
+    # Next check due well before the loop would wake up for the summary
+    health_checker.get_check_interval = lambda instance: 0.02
+
+    run_task = asyncio.create_task(health_checker.run())
+    await asyncio.sleep(0.2)
+    run_task.cancel()
 
-    mock_svc_instance.update_health_status.assert_called_once_with(HealthStatus.HEALTHY)
\ No newline at end of file
+    assert len(probed_urls) >= 3
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.health.routable_instances import RoutableInstances
+from src.health.outlier_detector import OutlierDetector, EJECTED
+from src.router.round_robin_router import RoundRobinRouter
+from src.utils.http.upstream_response import UpstreamResponse
+
+
+def create_outlier_detector(instances: list[ServiceInstance], **config) -> OutlierDetector:
+    return OutlierDetector(instances, RoutableInstances(instances),
+                           {"consecutive_failures": 3, "min_requests": 10, "base_ejection_time": 10,
+                            "max_ejection_percent": 50, **config})
+
+
+@pytest.mark.asyncio
+async def test_consecutive_failures_eject_instance(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances)
+
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+
+    snapshot = detector.routable_instances.current()
+    assert instances[0] not in snapshot.instances
+    assert len(snapshot.instances) == 3
+
+
+@pytest.mark.asyncio
+async def test_success_resets_consecutive_failures(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances)
+
+    for _ in range(5):
+        detector.record(instances[0], failed=True)
+        detector.record(instances[0], failed=False)
+
+    assert not detector.routable_instances.is_excluded(instances[0], EJECTED)
+
+
+@pytest.mark.asyncio
+async def test_error_rate_ejects_instance(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances, consecutive_failures=100, error_rate_threshold=0.5)
+
+    for _ in range(5):
+        detector.record(instances[0], failed=False)
+        detector.record(instances[0], failed=True)
+
+    assert detector.routable_instances.is_excluded(instances[0], EJECTED)
+
+
+@pytest.mark.asyncio
+async def test_max_ejection_percent_respected(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances, max_ejection_percent=50)
+
+    for instance in instances:
+        for _ in range(3):
+            detector.record(instance, failed=True)
+
+    assert detector.routable_instances.get_num_excluded(EJECTED) == 2
+
+
+@pytest.mark.asyncio
+async def test_one_instance_of_small_pool_ejected(create_instances):
+    instances = create_instances(3)
+    detector = create_outlier_detector(instances, max_ejection_percent=10)
+
+    for instance in instances:
+        for _ in range(3):
+            detector.record(instance, failed=True)
+
+    assert detector.routable_instances.get_num_excluded(EJECTED) == 1
+
+
+@pytest.mark.asyncio
+async def test_ejected_instance_restored_with_growing_ejection_time(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances, base_ejection_time=0.01)
+
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+    await asyncio.sleep(0.02)
+    assert not detector.routable_instances.is_excluded(instances[0], EJECTED)
+
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+    await asyncio.sleep(0.015)
+    # The second ejection lasts twice as long
+    assert detector.routable_instances.is_excluded(instances[0], EJECTED)
+    await asyncio.sleep(0.01)
+    assert not detector.routable_instances.is_excluded(instances[0], EJECTED)
+
+
+@pytest.mark.asyncio
+async def test_ejection_time_decays_while_instance_in_rotation(create_instances):
+    instances = create_instances(4)
+    detector = create_outlier_detector(instances, base_ejection_time=0.01, ejection_decay_time=0.02)
+    outcomes = detector.outcomes
+
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+    await asyncio.sleep(0.015)
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+    assert outcomes[instances[0]].times_ejected == 2
+
+    # Back in rotation for over two decay times after the 20ms ejection
+    await asyncio.sleep(0.07)
+    for _ in range(3):
+        detector.record(instances[0], failed=True)
+    assert outcomes[instances[0]].times_ejected == 1
+
+@pytest.mark.asyncio
+async def test_router_stops_sending_to_failing_instance(create_instances):
+    instances = create_instances(2)
+    routable_instances = RoutableInstances(instances)
+
+    async def forward(method, url, body, headers):
+        if url.startswith("http://localhost:9990"):
+            return UpstreamResponse(500, [], b"")
+        return UpstreamResponse(200, [], b"")
+
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=forward)
+    router = RoundRobinRouter(instances=instances, http_client=mock_http_client,
+                              routable_instances=routable_instances)
+    router.enable_outlier_detection(OutlierDetector(instances, routable_instances,
+                                                    {"consecutive_failures": 3}))
+
+    statuses = [(await router.route_bytes("/echo", b"{}", [])).status_code for _ in range(20)]
+
+    assert statuses.count(500) == 3
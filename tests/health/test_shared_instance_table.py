@@ -0,0 +1,102 @@
+import uuid
+
+import pytest
+from unittest.mock import Mock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.health.shared_instance_table import SharedInstanceTable
+from src.health.shared_health_sync import SharedHealthSync
+
+
+@pytest.fixture
+def table_name():
+    name = f"router-test-{uuid.uuid4().hex[:8]}"
+    parent_table = SharedInstanceTable.create(name, 2, 3)
+    yield name
+    parent_table.close(unlink=True)
+
+
+def create_worker(name: str) -> tuple[SharedInstanceTable, list[ServiceInstance]]:
+    shared_table = SharedInstanceTable.attach(name)
+    instances = [ServiceInstance(f"http://localhost:{9990 + i}") for i in range(2)]
+    for index, instance in enumerate(instances):
+        instance.attach_shared_table(shared_table, index)
+    return shared_table, instances
+
+
+def test_workers_claim_separate_slots(table_name):
+    table_1, _ = create_worker(table_name)
+    table_2, _ = create_worker(table_name)
+
+    assert table_1.worker_index != table_2.worker_index
+    table_1.close()
+    table_2.close()
+
+
+def test_in_flight_requests_summed_across_workers(table_name):
+    table_1, instances_1 = create_worker(table_name)
+    table_2, instances_2 = create_worker(table_name)
+
+    instances_1[0].start_request()
+    instances_2[0].start_request()
+    instances_2[0].start_request()
+    instances_2[1].start_request()
+    instances_2[0].finish_request()
+
+    assert instances_1[0].get_in_flight_requests() == 2
+    assert instances_1[1].get_in_flight_requests() == 1
+    assert table_1.get_total_in_flight() == 3
+    table_1.close()
+    table_2.close()
+
+
+def test_closed_worker_releases_slot_and_in_flight(table_name):
+    table_1, instances_1 = create_worker(table_name)
+    table_2, instances_2 = create_worker(table_name)
+    instances_2[0].start_request()
+
+    table_2.close()
+    table_3, _ = create_worker(table_name)
+
+    assert instances_1[0].get_in_flight_requests() == 0
+    assert table_3.worker_index == 1
+    table_1.close()
+    table_3.close()
+
+
+def test_single_probe_owner_shares_health_status(table_name):
+    table_1, instances_1 = create_worker(table_name)
+    table_2, instances_2 = create_worker(table_name)
+    sync_1 = SharedHealthSync(table_name, table_1, instances_1, [Mock()], {})
+    sync_2 = SharedHealthSync(table_name, table_2, instances_2, [Mock()], {})
+    published = []
+    instances_2[0].add_state_listener(published.append)
+
+    assert sync_1.try_become_probe_owner()
+    assert not sync_2.try_become_probe_owner()
+    for _ in range(instances_1[0].min_state_transition_requests):
+        instances_1[0].update_health_status(HealthStatus.HEALTHY)
+    sync_2.read_health_status()
+
+    assert instances_2[0].get_health_status() == HealthStatus.HEALTHY
+    assert instances_2[1].get_health_status() == HealthStatus.UNHEALTHY
+    assert published == [instances_2[0]]
+    sync_1.lock_file.close()
+    table_1.close()
+    table_2.close()
+
+
+def test_probe_ownership_taken_over_when_owner_releases_lock(table_name):
+    table_1, instances_1 = create_worker(table_name)
+    table_2, instances_2 = create_worker(table_name)
+    sync_1 = SharedHealthSync(table_name, table_1, instances_1, [Mock()], {})
+    sync_2 = SharedHealthSync(table_name, table_2, instances_2, [Mock()], {})
+    assert sync_1.try_become_probe_owner()
+
+    sync_1.lock_file.close()
+
+    assert sync_2.try_become_probe_owner()
+    sync_2.lock_file.close()
+    table_1.close()
+    table_2.close()
@@ -0,0 +1,111 @@
+from unittest.mock import AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.health.routable_instances import RoutableInstances
+from src.health.slow_start import SlowStart
+from src.router.round_robin_router import RoundRobinRouter
+from src.router.consistent_hash_router import ConsistentHashRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def recover(instance: ServiceInstance):
+    instance.health_status = HealthStatus.UNHEALTHY
+    for _ in range(instance.min_state_transition_requests):
+        instance.update_health_status(HealthStatus.HEALTHY)
+
+
+def test_recovered_instance_ramps_up_to_full_weight(create_instances):
+    instances = create_instances(2)
+    clock = FakeClock()
+    slow_start = SlowStart(instances, {"window": 10, "min_weight_percent": 10}, clock)
+
+    recover(instances[0])
+
+    assert slow_start.is_ramping()
+    assert slow_start.get_weight_factor(instances[0]) == 0.1
+    assert slow_start.get_weight_factor(instances[1]) == 1.0
+    clock.now += 5
+    assert slow_start.get_weight_factor(instances[0]) == 0.5
+    clock.now += 5
+    assert slow_start.get_weight_factor(instances[0]) == 1.0
+    assert not slow_start.is_ramping()
+
+
+def test_ramp_ends_after_window_without_being_selected(create_instances):
+    instances = create_instances(2)
+    clock = FakeClock()
+    slow_start = SlowStart(instances, {"window": 10}, clock)
+    recover(instances[0])
+
+    assert slow_start.is_ramping()
+    clock.now += 10
+    assert not slow_start.is_ramping()
+    assert instances[0] not in slow_start.ramping_instances
+
+
+def test_aggression_ramps_up_faster(create_instances):
+    instances = create_instances(1)
+    clock = FakeClock()
+    slow_start = SlowStart(instances, {"window": 10, "aggression": 2.0}, clock)
+
+    recover(instances[0])
+    clock.now += 2.5
+
+    assert slow_start.get_weight_factor(instances[0]) == 0.5
+
+
+def test_unhealthy_instance_stops_ramping(create_instances):
+    instances = create_instances(1)
+    slow_start = SlowStart(instances, {"window": 10}, FakeClock())
+    recover(instances[0])
+
+    for _ in range(instances[0].min_state_transition_requests):
+        instances[0].update_health_status(HealthStatus.UNHEALTHY)
+
+    assert not slow_start.is_ramping()
+
+
+def test_round_robin_sends_reduced_share_to_ramping_instance(create_instances):
+    instances = create_instances(2)
+    clock = FakeClock()
+    slow_start = SlowStart(instances, {"window": 10, "min_weight_percent": 10}, clock)
+    router = RoundRobinRouter(instances, AsyncMock(), RoutableInstances(instances))
+    router.enable_slow_start(slow_start)
+    slow_start.random.seed(1)
+
+    recover(instances[0])
+    router.routable_instances.publish()
+    picks = [router.select_available_instance() for _ in range(1000)]
+
+    assert 20 < picks.count(instances[0]) < 150
+
+
+def test_consistent_hash_moves_keys_to_ramping_instance_gradually(create_instances):
+    instances = create_instances(3)
+    clock = FakeClock()
+    slow_start = SlowStart(instances, {"window": 10, "min_weight_percent": 0}, clock)
+    router = ConsistentHashRouter(instances, AsyncMock(), RoutableInstances(instances))
+    keys = [f"game-{i}" for i in range(300)]
+    owners = {key: router.select_instance(key) for key in keys}
+    router.enable_slow_start(slow_start)
+
+    recover(instances[0])
+    clock.now += 5
+    halfway = {key: router.select_available_instance(key) for key in keys}
+    # The decision is sticky per key
+    assert halfway == {key: router.select_available_instance(key) for key in keys}
+    clock.now += 5
+    recovered = {key: router.select_available_instance(key) for key in keys}
+
+    owned_keys = [key for key in keys if owners[key] is instances[0]]
+    moved_back = [key for key in owned_keys if halfway[key] is instances[0]]
+    assert 0 < len(moved_back) < len(owned_keys)
+    assert recovered == owners
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+
+from src.metrics.metrics import Histogram
+from src.metrics.router_metrics import RouterMetrics
+from src.models.health_status import HealthStatus
+from src.router.concurrency_limiter import ConcurrencyLimiter
+from src.router.request_batcher import RequestBatcher
+from src.router.response_cache import ResponseCache
+from src.router.round_robin_router import RoundRobinRouter
+
+
+def test_histogram_counts_values_into_buckets():
+    histogram = Histogram([0.1, 1])
+
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value)
+
+    assert list(histogram.counts) == [2, 1, 1]
+    assert histogram.get_count() == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_render_exposes_cumulative_buckets(create_instances):
+    instances = create_instances(1)
+    metrics = RouterMetrics(instances, {"latency_buckets": [0.1, 1]})
+
+    metrics.observe_response(instances[0], 0.05, failed=False)
+    metrics.observe_response(instances[0], 0.5, failed=True)
+    text = metrics.render()
+
+    labels = 'instance="http://localhost:9990"'
+    assert f'router_requests_total{{{labels},outcome="success"}} 1' in text
+    assert f'router_requests_total{{{labels},outcome="failure"}} 1' in text
+    assert f'router_upstream_response_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'router_upstream_response_seconds_bucket{{{labels},le="1"}} 2' in text
+    assert f'router_upstream_response_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'router_upstream_response_seconds_count{{{labels}}} 2' in text
+    assert f'router_instance_health{{{labels},status="healthy"}} 1' in text
+    assert "# TYPE router_selection_seconds histogram" in text
+
+
+def test_health_transitions_counted(create_instances):
+    instances = create_instances(1)
+    metrics = RouterMetrics(instances, {})
+
+    for _ in range(instances[0].min_state_transition_requests):
+        instances[0].update_health_status(HealthStatus.DEGRADED)
+
+    assert metrics.instance_metrics[instances[0]].transitions[HealthStatus.DEGRADED].value == 1
+    assert 'router_instance_health{instance="http://localhost:9990",status="degraded"} 1' in metrics.render()
+
+
+@pytest.mark.asyncio
+async def test_router_records_responses_and_selection_time(create_instances):
+    instances = create_instances(2)
+    metrics = RouterMetrics(instances, {})
+    router = RoundRobinRouter(instances, AsyncMock())
+    router.enable_metrics(metrics)
+    router.http_client.post.return_value = {"ok": True}
+
+    for _ in range(4):
+        await router.route("/echo", {"a": 1})
+
+    assert all(metrics.instance_metrics[instance].successes.value == 2 for instance in instances)
+    assert metrics.selection_time.get_count() == 4
+
+
+def test_response_cache_counters_summed_over_pools(create_instances):
+    metrics = RouterMetrics(create_instances(1), {})
+    caches = [ResponseCache({"routes": ["/echo"]}) for _ in range(2)]
+    caches[0].hits.value = 3
+    caches[1].hits.value = 4
+    caches[1].coalesced.value = 2
+    for cache in caches:
+        metrics.add_response_cache(cache)
+    text = metrics.render()
+
+    assert 'router_response_cache_requests_total{result="hit"} 7' in text
+    assert 'router_response_cache_requests_total{result="coalesced"} 2' in text
+    assert "router_response_cache_entries 0" in text
+
+
+def test_batching_counters_summed_over_pools(create_instances):
+    metrics = RouterMetrics(create_instances(1), {})
+    batchers = [RequestBatcher({"routes": ["/echo"]}, None) for _ in range(2)]
+    batchers[0].batches.value, batchers[0].batched_requests.value = 2, 10
+    batchers[1].batches.value, batchers[1].batched_requests.value = 1, 5
+    for batcher in batchers:
+        metrics.add_request_batcher(batcher)
+    text = metrics.render()
+
+    assert "router_batches_total 3" in text
+    assert "router_batched_requests_total 15" in text
+    metrics.remove_request_batcher(batchers[0])
+    assert "router_batches_total 1" in metrics.render()
+
+
+def test_admission_control_counters_summed_over_pools(create_instances):
+    metrics = RouterMetrics(create_instances(1), {})
+    limiters = [ConcurrencyLimiter({"initial_limit": limit}) for limit in (10, 20.5)]
+    limiters[0].num_shed = 3
+    for limiter in limiters:
+        metrics.add_concurrency_limiter(limiter)
+    text = metrics.render()
+
+    assert "router_shed_requests_total 3" in text
+    assert "router_concurrency_limit 30" in text
+
+
+class NoMetrics:
+    def observe_response(self, instance, response_time: float, failed: bool):
+        pass
+
+
+def measure_observation_time(metrics, instances) -> float:
+    """
+    Best time per observation over a few runs, including the overhead of the loop
+    """
+    num_observations = 20000
+    per_observation = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for i in range(num_observations):
+            metrics.observe_response(instances[i % 10], 0.003, False)
+        per_observation = min(per_observation, (time.perf_counter() - start) / num_observations)
+    return per_observation
+
+
+def test_recording_a_response_is_cheap(create_instances):
+    instances = create_instances(10)
+
+    baseline_per_observation = measure_observation_time(NoMetrics(), instances)
+    per_observation = measure_observation_time(RouterMetrics(instances, {}), instances)
+
+    # A few in-place updates, not much more than calling a method which does nothing
+    assert per_observation < 10 * baseline_per_observation
@@ -0,0 +1,17 @@
+import pytest
+
+from src.router.round_robin_router import RoundRobinRouter
+from src.router.weighted_round_robin_router import WeightedRoundRobinRouter
+from src.router.least_requests_router import LeastRequestsRouter
+from src.router.peak_ewma_router import PeakEwmaRouter
+from src.router.consistent_hash_router import ConsistentHashRouter
+
+
+@pytest.fixture(params=[RoundRobinRouter, WeightedRoundRobinRouter, LeastRequestsRouter,
+                        PeakEwmaRouter, ConsistentHashRouter],
+                ids=lambda router_class: router_class.__name__)
+def router_class(request):
+    """
+    Runs the test once for every routing algorithm
+    """
+    return request.param
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+import httpx
+from fastapi import HTTPException
+from unittest.mock import AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.router.concurrency_limiter import ConcurrencyLimiter, AimdLimit, VegasLimit
+from src.router.round_robin_router import RoundRobinRouter
+
+
+def create_limiter(**config) -> ConcurrencyLimiter:
+    return ConcurrencyLimiter({"algorithm": "aimd", "initial_limit": 2, "max_queue_size": 2,
+                               "max_queue_time": 0.05, **config})
+
+
+@pytest.mark.asyncio
+async def test_requests_within_limit_admitted_right_away():
+    limiter = create_limiter()
+
+    await limiter.acquire(1)
+    await limiter.acquire(1)
+
+    assert limiter.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_queued_request_shed_after_max_queue_time():
+    limiter = create_limiter()
+    await limiter.acquire(1)
+    await limiter.acquire(1)
+
+    with pytest.raises(HTTPException) as e:
+        await limiter.acquire(1)
+
+    assert e.value.status_code == 503
+    assert limiter.num_queued == 0
+    assert limiter.num_shed == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_right_away():
+    limiter = create_limiter(max_queue_size=0, max_queue_time=10)
+    await limiter.acquire(1)
+    await limiter.acquire(1)
+
+    with pytest.raises(HTTPException):
+        await asyncio.wait_for(limiter.acquire(1), timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_release_admits_higher_priority_first():
+    limiter = create_limiter(initial_limit=1, max_limit=1, max_queue_time=1)
+    await limiter.acquire(1)
+    admitted = []
+
+    async def acquire(priority: int):
+        await limiter.acquire(priority)
+        admitted.append(priority)
+
+    batch = asyncio.create_task(acquire(2))
+    critical = asyncio.create_task(acquire(0))
+    await asyncio.sleep(0)
+    limiter.release(0.01, dropped=False)
+    await asyncio.sleep(0.01)
+
+    assert admitted == [0]
+    batch.cancel()
+    await asyncio.gather(batch, critical, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_displaces_lower_priority_from_full_queue():
+    limiter = create_limiter(initial_limit=1, max_queue_size=1, max_queue_time=1)
+    await limiter.acquire(1)
+    batch = asyncio.create_task(limiter.acquire(2))
+    await asyncio.sleep(0)
+
+    critical = asyncio.create_task(limiter.acquire(0))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException):
+        await batch
+    limiter.release(0.01, dropped=False)
+    await critical
+    assert limiter.in_flight == 1
+
+
+def test_priority_read_from_header():
+    limiter = create_limiter()
+
+    assert limiter.get_priority([("X-Priority", "Critical")]) == 0
+    assert limiter.get_priority([("x-priority", "unknown")]) == 1
+    assert limiter.get_priority(None) == 1
+
+
+def test_aimd_grows_additively_and_backs_off_multiplicatively():
+    aimd = AimdLimit({})
+
+    assert aimd.update(10, 0.01, in_flight=10, dropped=False) == 11
+    assert aimd.update(10, 0.01, in_flight=2, dropped=False) == 10
+    assert aimd.update(10, 0.01, in_flight=10, dropped=True) == 9
+
+
+def test_vegas_shrinks_limit_when_response_times_grow():
+    vegas = VegasLimit({})
+    limit = 100.0
+    for _ in range(10):
+        limit = vegas.update(limit, 0.01, in_flight=int(limit), dropped=False)
+    grown_limit = limit
+
+    for _ in range(10):
+        limit = vegas.update(limit, 0.05, in_flight=int(limit), dropped=False)
+
+    assert grown_limit > 100
+    assert limit < grown_limit
+
+
+@pytest.mark.asyncio
+async def test_router_sheds_requests_beyond_limit():
+    instance = ServiceInstance("http://localhost:9990")
+    instance.health_status = HealthStatus.HEALTHY
+    router = RoundRobinRouter([instance], AsyncMock())
+    router.enable_admission_control(create_limiter(initial_limit=1, max_queue_size=0))
+
+    async def slow_post(url, payload):
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    router.http_client.post.side_effect = slow_post
+    results = await asyncio.gather(router.route("/echo", {}), router.route("/echo", {}),
+                                   return_exceptions=True)
+
+    assert results[0] == {"ok": True}
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 503
+    assert router.concurrency_limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code, healthy, dropped", [
+    (None, True, True), (503, True, True), (404, True, False), (None, False, False)])
+async def test_router_counts_only_overload_failures_as_dropped(status_code, healthy, dropped):
+    instance = ServiceInstance("http://localhost:9990")
+    instance.health_status = HealthStatus.HEALTHY if healthy else HealthStatus.UNHEALTHY
+    router = RoundRobinRouter([instance], AsyncMock())
+    limiter = create_limiter(algorithm="aimd", initial_limit=10)
+    router.enable_admission_control(limiter)
+    request = httpx.Request("POST", "http://localhost:9990/echo")
+    if status_code is None:
+        router.http_client.post.side_effect = httpx.ConnectTimeout("timed out", request=request)
+    else:
+        router.http_client.post.side_effect = httpx.HTTPStatusError(
+            "error", request=request, response=httpx.Response(status_code, request=request))
+
+    with pytest.raises(HTTPException):
+        await router.route("/echo", {})
+
+    assert (limiter.limit < 10) == dropped
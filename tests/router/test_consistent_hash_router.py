@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from src.models.health_status import HealthStatus
+from src.models.circuit_state import CircuitState
+from src.health.routable_instances import RoutableInstances
+from src.health.circuit_breaker import CircuitBreakers
+from src.router.consistent_hash_router import ConsistentHashRouter
+
+
+@pytest.mark.asyncio
+async def test_same_key_routed_to_same_instance(create_instances):
+    router = ConsistentHashRouter(instances=create_instances(4), http_client=Mock())
+
+    selected = {await router.get_next_service_instance("coolknight") for _ in range(20)}
+
+    assert len(selected) == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_spread_across_instances(create_instances):
+    router = ConsistentHashRouter(instances=create_instances(4), http_client=Mock())
+
+    selected = [await router.get_next_service_instance(f"game-{i}") for i in range(1000)]
+
+    for url in set(selected):
+        assert 150 < selected.count(url) < 350
+
+
+@pytest.mark.asyncio
+async def test_only_keys_of_unhealthy_instance_move(create_instances):
+    instances = create_instances(10)
+    routable_instances = RoutableInstances(instances)
+    router = ConsistentHashRouter(instances=instances, http_client=Mock(),
+                                  routable_instances=routable_instances)
+    keys = [f"game-{i}" for i in range(1000)]
+    before = {key: await router.get_next_service_instance(key) for key in keys}
+
+    instances[3].health_status = HealthStatus.UNHEALTHY
+    routable_instances.publish()
+    after = {key: await router.get_next_service_instance(key) for key in keys}
+
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(before[key] == "http://localhost:9993" for key in moved)
+    assert len(moved) < 200
+
+    instances[3].health_status = HealthStatus.HEALTHY
+    routable_instances.publish()
+    restored = {key: await router.get_next_service_instance(key) for key in keys}
+
+    assert restored == before
+
+
+@pytest.mark.asyncio
+async def test_overloaded_instance_passed_over(create_instances):
+    instances = create_instances(2)
+    router = ConsistentHashRouter(instances=instances, http_client=Mock(),
+                                  config={"load_factor": 1.25})
+    owner_url = await router.get_next_service_instance("coolknight")
+    owner = next(instance for instance in instances if instance.get_url() == owner_url)
+
+    # The hot key already has all requests in flight on its instance
+    owner.in_flight_requests = 10
+    router.in_flight_requests = 10
+
+    assert await router.get_next_service_instance("coolknight") != owner_url
+
+
+@pytest.mark.asyncio
+async def test_busy_half_open_instance_passed_over(create_instances):
+    instances = create_instances(3)
+    routable_instances = RoutableInstances(instances)
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value={})
+    router = ConsistentHashRouter(instances=instances, http_client=mock_http_client,
+                                  routable_instances=routable_instances)
+    circuit_breakers = CircuitBreakers(instances, routable_instances, {"half_open_max_requests": 1})
+    router.enable_circuit_breakers(circuit_breakers)
+    owner_url = await router.get_next_service_instance("coolknight")
+    owner = next(instance for instance in instances if instance.get_url() == owner_url)
+
+    # The instance of the key is half-open with its only trial request in flight
+    breaker = circuit_breakers.get_breaker(owner)
+    breaker.state = CircuitState.HALF_OPEN
+    breaker.trial_requests = 1
+
+    for _ in range(5):
+        await router.route("/echo", {"gameid": "coolknight"})
+
+    called_urls = {call.args[0] for call in mock_http_client.post.call_args_list}
+    assert len(called_urls) == 1
+    assert called_urls != {owner_url + "/echo"}
+
+
+def test_key_read_from_payload_field(create_instances):
+    router = ConsistentHashRouter(instances=create_instances(2), http_client=Mock(),
+                                  config={"key_field": "gameid"})
+
+    assert router.get_request_key(payload={"gameid": "coolknight"}) == "coolknight"
+    assert router.get_request_key(body=b'{"gameid": "coolknight"}') == "coolknight"
+    assert router.get_request_key(payload={"payment": "500"}) is None
+
+
+def test_key_header_takes_precedence(create_instances):
+    router = ConsistentHashRouter(instances=create_instances(2), http_client=Mock(),
+                                  config={"key_field": "gameid", "key_header": "X-Game-Id"})
+
+    key = router.get_request_key(headers=[("x-game-id", "from-header")], body=b'{"gameid": "from-body"}')
+
+    assert key == "from-header"
+
+
+@pytest.mark.asyncio
+async def test_route_uses_payload_key(create_instances):
+    instances = create_instances(4)
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value={})
+    router = ConsistentHashRouter(instances=instances, http_client=mock_http_client)
+    expected_url = await router.get_next_service_instance("coolknight")
+
+    for _ in range(5):
+        await router.route("/echo", {"gameid": "coolknight"})
+
+    called_urls = {call.args[0] for call in mock_http_client.post.call_args_list}
+    assert called_urls == {expected_url + "/echo"}
@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from src.router.hedging import HedgingPolicy, LatencyTracker
+from src.router.request_budget import RequestBudget
+from src.router.retry_policy import RetryPolicy
+from src.utils.http.upstream_response import UpstreamResponse
+
+
+# Keyed, so the consistent hash router sends every request to the same instance unless it is excluded
+PAYLOAD = {"gameid": "coolknight"}
+
+
+def create_hedging_policy(**config) -> HedgingPolicy:
+    policy = HedgingPolicy({"routes": ["/echo"], "min_samples": 10, "min_delay": 0, **config})
+    for _ in range(10):
+        policy.record_latency("/echo", 0.01)
+    return policy
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(percentile=95, window=100, min_samples=10)
+
+    for i in range(100):
+        tracker.record(i / 100)
+    tracker.recompute()
+
+    assert tracker.get_percentile() == pytest.approx(0.95)
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(percentile=95, window=100, min_samples=10)
+
+    for _ in range(9):
+        tracker.record(0.1)
+
+    assert tracker.get_percentile() is None
+
+
+def test_budget_caps_extra_requests_to_ratio():
+    budget = RequestBudget(ratio=0.1, max_tokens=1)
+    budget.try_spend()
+
+    spent = 0
+    for _ in range(100):
+        budget.deposit()
+        if budget.try_spend():
+            spent += 1
+
+    assert 9 <= spent <= 10
+
+
+@pytest.mark.asyncio
+async def test_slow_request_hedged_to_other_instance(router_class, create_instances):
+    instances = create_instances(2)
+    called_urls = []
+
+    async def post(url, payload):
+        called_urls.append(url)
+        if url == called_urls[0]:
+            await asyncio.sleep(1)
+            return {"from": "slow"}
+        return {"from": "fast"}
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy())
+
+    response = await router.route("/echo", PAYLOAD)
+
+    assert response == {"from": "fast"}
+    assert sorted(called_urls) == ["http://localhost:9990/echo", "http://localhost:9991/echo"]
+    await asyncio.sleep(0)
+    assert all(instance.get_in_flight_requests() == 0 for instance in instances)
+
+
+@pytest.mark.asyncio
+async def test_error_status_of_hedge_loses_to_slow_success(router_class, create_instances):
+    instances = create_instances(2)
+    called_urls = []
+
+    async def forward(method, url, body, headers):
+        called_urls.append(url)
+        if url == called_urls[0]:
+            await asyncio.sleep(0.05)
+            return UpstreamResponse(200, [], b"slow")
+        return UpstreamResponse(503, [], b"busy")
+
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=forward)
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy())
+
+    response = await router.route_bytes("/echo", b"{}", [], "PUT")
+
+    assert (response.status_code, response.content) == (200, b"slow")
+    assert len(called_urls) == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_skips_primary_and_hedged_instance(router_class, create_instances):
+    instances = create_instances(3)
+    called_urls = []
+
+    async def forward(method, url, body, headers):
+        called_urls.append(url)
+        if len(called_urls) == 1:
+            await asyncio.sleep(0.05)
+        return UpstreamResponse(503 if len(called_urls) <= 2 else 200, [], b"")
+
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=forward)
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy())
+    router.enable_retries(RetryPolicy({"max_retries": 1, "backoff_base": 0}))
+
+    response = await router.route_bytes("/echo", b"{}", [], "PUT")
+
+    assert response.status_code == 200
+    assert len(called_urls) == 3
+    assert len(set(called_urls)) == 3
+
+
+@pytest.mark.asyncio
+async def test_fast_request_not_hedged(router_class, create_instances):
+    instances = create_instances(2)
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value={"from": "fast"})
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy(min_delay=0.5))
+
+    await router.route("/echo", PAYLOAD)
+
+    mock_http_client.post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_hedging_stops_when_budget_exhausted(router_class, create_instances):
+    instances = create_instances(2)
+
+    async def post(url, payload):
+        await asyncio.sleep(0.05)
+        return {}
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy(budget_ratio=0, budget_max_tokens=1))
+
+    await router.route("/echo", PAYLOAD)
+    await router.route("/echo", PAYLOAD)
+
+    # One hedge allowed by the budget, none afterwards
+    assert mock_http_client.post.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_other_routes_not_hedged(router_class, create_instances):
+    instances = create_instances(2)
+
+    async def post(url, payload):
+        await asyncio.sleep(0.05)
+        return {}
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+    router = router_class(instances=instances, http_client=mock_http_client)
+    router.enable_hedging(create_hedging_policy())
+
+    await router.route("/payments", PAYLOAD)
+
+    mock_http_client.post.assert_called_once()
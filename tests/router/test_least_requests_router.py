@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from unittest.mock import Mock, AsyncMock
+from fastapi import HTTPException
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.router.least_requests_router import LeastRequestsRouter
+
+
+def create_instance(url: str, health_status: HealthStatus, in_flight_requests: int = 0) -> ServiceInstance:
+    instance = ServiceInstance(url)
+    instance.health_status = health_status
+    instance.in_flight_requests = in_flight_requests
+    return instance
+
+
+@pytest.mark.asyncio
+async def test_less_loaded_instance_selected():
+    instance_1 = create_instance("http://localhost:9990", HealthStatus.HEALTHY, in_flight_requests=5)
+    instance_2 = create_instance("http://localhost:9991", HealthStatus.HEALTHY, in_flight_requests=1)
+
+    router = LeastRequestsRouter(instances=[instance_1, instance_2], http_client=Mock())
+
+    for _ in range(10):
+        assert await router.get_next_service_instance() == "http://localhost:9991"
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_instance_skipped():
+    instance_1 = create_instance("http://localhost:9990", HealthStatus.UNHEALTHY)
+    instance_2 = create_instance("http://localhost:9991", HealthStatus.HEALTHY, in_flight_requests=10)
+    instance_3 = create_instance("http://localhost:9992", HealthStatus.DEGRADED)
+
+    router = LeastRequestsRouter(instances=[instance_1, instance_2, instance_3], http_client=Mock())
+
+    for _ in range(10):
+        assert await router.get_next_service_instance() == "http://localhost:9991"
+
+
+@pytest.mark.asyncio
+async def test_no_healthy_instances_returns_none():
+    instance_1 = create_instance("http://localhost:9990", HealthStatus.UNHEALTHY)
+
+    router = LeastRequestsRouter(instances=[instance_1], http_client=Mock())
+
+    assert await router.get_next_service_instance() is None
+
+
+@pytest.mark.asyncio
+async def test_most_loaded_instance_never_selected():
+    instances = [create_instance(f"http://localhost:{9990 + i}", HealthStatus.HEALTHY, in_flight_requests=i)
+                 for i in range(4)]
+
+    router = LeastRequestsRouter(instances=instances, http_client=Mock())
+
+    selected = {await router.get_next_service_instance() for _ in range(200)}
+    assert "http://localhost:9993" not in selected
+
+
+@pytest.mark.asyncio
+async def test_route_tracks_in_flight_requests():
+    instance = create_instance("http://localhost:9990", HealthStatus.HEALTHY)
+    in_flight_during_request = []
+
+    async def post(url, payload):
+        in_flight_during_request.append(instance.get_in_flight_requests())
+        await asyncio.sleep(0)
+        return {"status": "success"}
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+
+    router = LeastRequestsRouter(instances=[instance], http_client=mock_http_client)
+
+    await asyncio.gather(router.route("/echo", {}), router.route("/echo", {}))
+
+    assert in_flight_during_request == [1, 2]
+    assert instance.get_in_flight_requests() == 0
+
+
+@pytest.mark.asyncio
+async def test_route_error_releases_in_flight_request():
+    instance = create_instance("http://localhost:9990", HealthStatus.HEALTHY)
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=Exception("Connection failed"))
+
+    router = LeastRequestsRouter(instances=[instance], http_client=mock_http_client)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await router.route("/echo", {"test": "data"})
+
+    assert exc_info.value.status_code == 500
+    assert instance.get_in_flight_requests() == 0
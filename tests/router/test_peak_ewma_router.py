@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.router.peak_ewma_router import PeakEwmaRouter, LatencyEwma
+
+
+def create_instance(url: str) -> ServiceInstance:
+    instance = ServiceInstance(url)
+    instance.health_status = HealthStatus.HEALTHY
+    return instance
+
+
+def test_slower_response_replaces_average():
+    latency = LatencyEwma(0.1, timestamp=0)
+
+    latency.observe(0.5, now=1, decay_time=10)
+
+    assert latency.value == 0.5
+
+
+def test_faster_response_decays_average():
+    latency = LatencyEwma(0.5, timestamp=0)
+
+    latency.observe(0.1, now=10, decay_time=10)
+
+    assert 0.1 < latency.value < 0.5
+
+
+def test_average_decays_while_idle():
+    latency = LatencyEwma(1.0, timestamp=0)
+
+    assert latency.get(now=0, decay_time=10) == 1.0
+    assert latency.get(now=10, decay_time=10) < 0.5
+
+
+@pytest.mark.asyncio
+async def test_faster_instance_selected():
+    fast_instance = create_instance("http://localhost:9990")
+    slow_instance = create_instance("http://localhost:9991")
+
+    router = PeakEwmaRouter(instances=[fast_instance, slow_instance], http_client=Mock(),
+                            time_provider=Mock(return_value=100))
+    router.record_response(fast_instance, 0.05, failed=False)
+    router.record_response(slow_instance, 0.5, failed=False)
+
+    for _ in range(10):
+        assert await router.get_next_service_instance() == "http://localhost:9990"
+
+
+@pytest.mark.asyncio
+async def test_in_flight_requests_raise_expected_latency():
+    fast_instance = create_instance("http://localhost:9990")
+    slow_instance = create_instance("http://localhost:9991")
+
+    router = PeakEwmaRouter(instances=[fast_instance, slow_instance], http_client=Mock(),
+                            time_provider=Mock(return_value=100))
+    router.record_response(fast_instance, 0.05, failed=False)
+    router.record_response(slow_instance, 0.2, failed=False)
+    fast_instance.in_flight_requests = 9
+
+    assert await router.get_next_service_instance() == "http://localhost:9991"
+
+
+@pytest.mark.asyncio
+async def test_instance_without_data_uses_default_latency():
+    new_instance = create_instance("http://localhost:9990")
+    slow_instance = create_instance("http://localhost:9991")
+
+    router = PeakEwmaRouter(instances=[new_instance, slow_instance], http_client=Mock(),
+                            config={"default_latency": 0.1}, time_provider=Mock(return_value=100))
+    router.record_response(slow_instance, 0.3, failed=False)
+
+    assert router.get_load(new_instance) == pytest.approx(0.1)
+    assert await router.get_next_service_instance() == "http://localhost:9990"
+
+
+@pytest.mark.asyncio
+async def test_failed_request_recorded_with_penalty():
+    failing_instance = create_instance("http://localhost:9990")
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=Exception("Connection refused"))
+
+    router = PeakEwmaRouter(instances=[failing_instance], http_client=mock_http_client,
+                            config={"failure_penalty": 5}, time_provider=Mock(return_value=100))
+
+    with pytest.raises(Exception):
+        await router.route("/echo", {})
+
+    assert router.get_load(failing_instance) == pytest.approx(5)
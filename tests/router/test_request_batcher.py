@@ -0,0 +1,150 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from unittest.mock import Mock, AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.router.request_batcher import RequestBatcher
+from src.router.round_robin_router import RoundRobinRouter
+from src.tracing.tracer import Tracer, current_span
+
+
+def create_router(http_client, num_instances: int = 1, **config) -> RoundRobinRouter:
+    instances = [ServiceInstance(f"http://localhost:{9990 + i}") for i in range(num_instances)]
+    for instance in instances:
+        instance.health_status = HealthStatus.HEALTHY
+    router = RoundRobinRouter(instances=instances, http_client=http_client)
+    router.enable_batching(RequestBatcher({"routes": ["/echo"], "max_delay": 0.01, **config}, http_client))
+    return router
+
+
+def echo_batch(url, payloads):
+    return [{"url": url, **payload} for payload in payloads]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_sent_as_one_batch_per_instance():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=echo_batch)
+    router = create_router(mock_http_client, num_instances=2)
+
+    responses = await asyncio.gather(*(router.route("/echo", {"n": n}, query="v=1") for n in range(6)))
+
+    assert [response["n"] for response in responses] == list(range(6))
+    assert sorted({response["url"] for response in responses}) == [
+        "http://localhost:9990/echo/batch?v=1", "http://localhost:9991/echo/batch?v=1"]
+    assert mock_http_client.post.await_count == 2
+    assert router.request_batcher.batches.value == 2
+    assert router.request_batcher.batched_requests.value == 6
+    assert all(instance.get_in_flight_requests() == 0 for instance in router.svc_instances)
+
+
+@pytest.mark.asyncio
+async def test_full_batch_sent_without_waiting():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=echo_batch)
+    router = create_router(mock_http_client, max_delay=10, max_items=3)
+
+    responses = await asyncio.wait_for(
+        asyncio.gather(*(router.route("/echo", {"n": n}) for n in range(3))), timeout=1)
+
+    assert [response["n"] for response in responses] == [0, 1, 2]
+    assert mock_http_client.post.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_sent_outside_the_context_of_its_requests_and_recorded_on_their_spans():
+    spans_seen_by_batch = []
+
+    async def post(url, payloads):
+        spans_seen_by_batch.append(current_span.get())
+        return echo_batch(url, payloads)
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+    router = create_router(mock_http_client)
+    tracer = Tracer({"sample_rate": 1})
+    spans = [tracer.start_span("POST /echo") for _ in range(2)]
+
+    async def traced_route(span, n):
+        current_span.set(span)
+        return await router.route("/echo", {"n": n})
+
+    await asyncio.gather(*(traced_route(span, n) for n, span in enumerate(spans)))
+
+    assert spans_seen_by_batch == [None]
+    assert spans[0].batch == spans[1].batch
+    assert spans[0].batch["size"] == 2
+    assert all("upstream" in span.phases for span in spans)
+
+
+@pytest.mark.asyncio
+async def test_other_routes_not_batched():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value={"status": "success"})
+    router = create_router(mock_http_client)
+
+    assert await router.route("/other", {"n": 1}) == {"status": "success"}
+    mock_http_client.post.assert_awaited_once_with("http://localhost:9990/other", {"n": 1})
+
+
+@pytest.mark.asyncio
+async def test_failed_item_fails_only_its_request():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value=[{"n": 0},
+                                                    {"error": "insufficient funds", "status": 402}])
+    router = create_router(mock_http_client)
+    router.record_response = Mock()
+
+    responses = await asyncio.gather(router.route("/echo", {"n": 0}), router.route("/echo", {"n": 1}),
+                                     return_exceptions=True)
+
+    assert responses[0] == {"n": 0}
+    assert isinstance(responses[1], HTTPException) and responses[1].status_code == 402
+    # A 4xx of the item is the client's fault, not the instance's
+    assert [call.args[2] for call in router.record_response.call_args_list] == [False, False]
+
+
+@pytest.mark.asyncio
+async def test_item_error_maps_to_status_error():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value=[{"error": "overloaded"}])
+    batcher = RequestBatcher({"routes": ["/echo"], "max_delay": 0}, mock_http_client)
+
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        await batcher.submit("http://localhost:9990/echo/batch", {"n": 0})
+
+    assert error.value.response.status_code == 500
+    assert error.value.response.json() == {"error": "overloaded"}
+
+
+@pytest.mark.asyncio
+async def test_failed_or_mismatched_batch_fails_all_requests():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=[httpx.ConnectError("refused"), [{"n": 0}]])
+    batcher = RequestBatcher({"routes": ["/echo"], "max_delay": 0}, mock_http_client)
+    url = "http://localhost:9990/echo/batch"
+
+    for expected_error in (httpx.ConnectError, ValueError):
+        results = await asyncio.gather(batcher.submit(url, {"n": 0}), batcher.submit(url, {"n": 1}),
+                                       return_exceptions=True)
+        assert all(isinstance(result, expected_error) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_left_out_of_batch():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=echo_batch)
+    batcher = RequestBatcher({"routes": ["/echo"], "max_delay": 0.01}, mock_http_client)
+    url = "http://localhost:9990/echo/batch"
+
+    cancelled = asyncio.ensure_future(batcher.submit(url, {"n": 0}))
+    kept = asyncio.ensure_future(batcher.submit(url, {"n": 1}))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await kept == {"url": url, "n": 1}
+    mock_http_client.post.assert_awaited_once_with(url, [{"n": 1}])
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from unittest.mock import Mock, AsyncMock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.router.response_cache import ResponseCache
+from src.router.round_robin_router import RoundRobinRouter
+from src.utils.http.upstream_response import UpstreamResponse
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def create_router(http_client, **config) -> RoundRobinRouter:
+    instance = ServiceInstance("http://localhost:9990")
+    instance.health_status = HealthStatus.HEALTHY
+    router = RoundRobinRouter(instances=[instance], http_client=http_client)
+    router.enable_response_cache(ResponseCache({"routes": ["/echo"], **config}))
+    return router
+
+
+@pytest.mark.asyncio
+async def test_identical_payloads_served_from_cache():
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(return_value={"status": "success"})
+    router = create_router(mock_http_client)
+
+    assert await router.route("/echo", {"gameid": "a", "payment": 1}) == {"status": "success"}
+    assert await router.route("/echo", {"payment": 1, "gameid": "a"}) == {"status": "success"}
+    await router.route("/echo", {"gameid": "b"})
+    await router.route("/other", {"gameid": "a"})
+
+    assert mock_http_client.post.await_count == 3
+    cache = router.response_cache
+    assert (cache.hits.value, cache.misses.value) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_coalesced():
+    release = asyncio.Event()
+
+    async def forward(method, url, body, headers):
+        await release.wait()
+        return UpstreamResponse(200, [], b"ok")
+
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=forward)
+    router = create_router(mock_http_client)
+
+    requests = [asyncio.ensure_future(router.route_bytes("/echo", b"{}", [])) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert [response.content for response in responses] == [b"ok"] * 10
+    assert mock_http_client.forward.await_count == 1
+    assert (router.response_cache.misses.value, router.response_cache.coalesced.value) == (1, 9)
+
+
+@pytest.mark.asyncio
+async def test_key_headers_and_failed_responses_not_shared():
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=[UpstreamResponse(200, [], b"alice"),
+                                                      UpstreamResponse(200, [], b"bob"),
+                                                      UpstreamResponse(503, [], b""),
+                                                      UpstreamResponse(200, [], b"ok"),
+                                                      UpstreamResponse(204, [], b"")])
+    router = create_router(mock_http_client)
+
+    alice = await router.route_bytes("/echo", b"{}", [("Authorization", "alice")])
+    bob = await router.route_bytes("/echo", b"{}", [("Authorization", "bob")])
+    assert (alice.content, bob.content) == (b"alice", b"bob")
+
+    assert (await router.route_bytes("/echo", b"[]", [])).status_code == 503
+    assert (await router.route_bytes("/echo", b"[]", [])).status_code == 200
+    assert (await router.route_bytes("/echo", b"{}", [], method="DELETE")).status_code == 204
+    assert mock_http_client.forward.await_count == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("headers", [[("Set-Cookie", "session=alice")],
+                                     [("Cache-Control", "no-store")],
+                                     [("cache-control", "private, max-age=60")],
+                                     [("Cache-Control", "no-cache")]])
+async def test_private_responses_not_shared(headers):
+    release = asyncio.Event()
+
+    async def forward(method, url, body, headers_):
+        await release.wait()
+        return UpstreamResponse(200, headers, b"ok")
+
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=forward)
+    router = create_router(mock_http_client)
+
+    requests = [asyncio.ensure_future(router.route_bytes("/echo", b"{}", [])) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*requests)
+    await router.route_bytes("/echo", b"{}", [])
+
+    # Neither the coalesced requests nor the later one get the response of the first
+    assert mock_http_client.forward.await_count == 4
+    assert router.response_cache.get_num_entries() == 0
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_least_recently_used_evicted():
+    clock = FakeClock()
+    cache = ResponseCache({"routes": ["/echo"], "ttl": 5, "max_entries": 2}, time_provider=clock)
+    load = AsyncMock(side_effect=lambda: "response")
+    keys = [cache.get_key("POST", "/echo", "", body) for body in (b"1", b"2", b"3")]
+
+    for key in keys[:2]:
+        await cache.get_or_load(key, load, len)
+    await cache.get_or_load(keys[0], load, len) # keys[1] becomes the least recently used
+    await cache.get_or_load(keys[2], load, len)
+    assert (load.await_count, cache.evictions.value, cache.get_num_entries()) == (3, 1, 2)
+    await cache.get_or_load(keys[0], load, len)
+    assert load.await_count == 3
+
+    clock.now = 5
+    await cache.get_or_load(keys[0], load, len)
+    assert load.await_count == 4
+
+
+def test_query_parameter_order_does_not_change_key():
+    cache = ResponseCache({"routes": ["/echo"]})
+    assert cache.get_key("GET", "/echo", "a=1&b=2", b"") == cache.get_key("GET", "/echo", "b=2&a=1", b"")
+    assert cache.get_key("GET", "/echo", "a=1", b"") != cache.get_key("POST", "/echo", "a=1", b"")
@@ -0,0 +1,137 @@
+import httpx
+import pytest
+from unittest.mock import Mock, AsyncMock
+from fastapi import HTTPException
+
+from src.router.retry_policy import RetryPolicy
+from src.utils.http.upstream_response import UpstreamResponse
+
+
+def create_retry_policy(**config) -> RetryPolicy:
+    return RetryPolicy({"max_retries": 2, "backoff_base": 0, **config})
+
+
+# Keyed, so the consistent hash router sends every attempt to the same instance unless it is excluded
+PAYLOAD = {"gameid": "coolknight"}
+BODY = b'{"gameid": "coolknight"}'
+
+
+@pytest.mark.asyncio
+async def test_connect_error_fails_over_to_other_instance(router_class, create_instances):
+    called_urls = []
+
+    async def post(url, payload):
+        called_urls.append(url)
+        if url == called_urls[0]:
+            raise httpx.ConnectError("Connection refused")
+        return {"status": "success"}
+
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=post)
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy())
+
+    response = await router.route("/echo", PAYLOAD)
+
+    assert response == {"status": "success"}
+    assert len(called_urls) == 2
+    assert called_urls[0] != called_urls[1]
+
+
+@pytest.mark.asyncio
+async def test_retryable_status_retried_on_untried_instances(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=[UpstreamResponse(503, [], b""),
+                                                      UpstreamResponse(502, [], b""),
+                                                      UpstreamResponse(200, [], b"ok")])
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy())
+
+    response = await router.route_bytes("/echo", BODY, [], "PUT")
+
+    assert response.status_code == 200
+    called_urls = [call.args[1] for call in mock_http_client.forward.call_args_list]
+    assert len(called_urls) == 3
+    assert len(set(called_urls)) == 3
+
+
+@pytest.mark.asyncio
+async def test_retries_stop_once_every_instance_tried(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(return_value=UpstreamResponse(503, [], b"busy"))
+    router = router_class(instances=create_instances(2), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy(max_retries=3))
+
+    response = await router.route_bytes("/echo", BODY, [], "PUT")
+
+    assert response.status_code == 503
+    called_urls = [call.args[1] for call in mock_http_client.forward.call_args_list]
+    assert sorted(called_urls) == ["http://localhost:9990/echo", "http://localhost:9991/echo"]
+
+
+@pytest.mark.asyncio
+async def test_last_response_returned_when_out_of_retries(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(return_value=UpstreamResponse(503, [], b"busy"))
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy(max_retries=1))
+
+    response = await router.route_bytes("/echo", BODY, [], "PUT")
+
+    assert response.status_code == 503
+    assert mock_http_client.forward.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_post_not_retried_on_status(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(return_value=UpstreamResponse(502, [], b""))
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy())
+
+    response = await router.route_bytes("/echo", BODY, [], "POST")
+
+    assert response.status_code == 502
+    mock_http_client.forward.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_post_to_idempotent_route_retried_on_status(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.forward = AsyncMock(side_effect=[UpstreamResponse(502, [], b""),
+                                                      UpstreamResponse(200, [], b"ok")])
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy(idempotent_routes=["/echo"]))
+
+    response = await router.route_bytes("/echo", BODY, [], "POST")
+
+    assert response.status_code == 200
+    assert mock_http_client.forward.call_count == 2
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_not_retried(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=httpx.ReadTimeout("Timed out"))
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy())
+
+    with pytest.raises(HTTPException) as exc_info:
+        await router.route("/echo", PAYLOAD)
+
+    assert exc_info.value.status_code == 500
+    mock_http_client.post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_retries_capped_by_budget(router_class, create_instances):
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=httpx.ConnectError("Connection refused"))
+    router = router_class(instances=create_instances(3), http_client=mock_http_client)
+    router.enable_retries(create_retry_policy(budget_ratio=0, budget_max_tokens=1))
+
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            await router.route("/echo", PAYLOAD)
+
+    # 3 requests and a single retry allowed by the budget
+    assert mock_http_client.post.call_count == 4
@@ -1,6 +1,7 @@
 import time
 import asyncio
 
+import httpx
 import pytest
 from unittest.mock import Mock, AsyncMock
 from fastapi import HTTPException
@@ -8,6 +9,8 @@ from fastapi import HTTPException
 from src.models.service_instance import ServiceInstance
 from src.models.health_status import HealthStatus
 from src.router.round_robin_router import RoundRobinRouter
+from src.health.routable_instances import RoutableInstances
+from src.utils.http.upstream_response import UpstreamResponse
 
 
 @pytest.mark.asyncio
@@ -192,6 +195,22 @@ async def test_route_propagates_http_exceptions():
     assert exc_info.value == original_exception
 
 
+@pytest.mark.asyncio
+async def test_route_keeps_error_status_of_instance():
+    instance = ServiceInstance("http://localhost:9990")
+    instance.health_status = HealthStatus.HEALTHY
+    request = httpx.Request("POST", "http://localhost:9990/echo")
+    mock_http_client = Mock()
+    mock_http_client.post = AsyncMock(side_effect=httpx.HTTPStatusError(
+        "Too many requests", request=request, response=httpx.Response(429, request=request)))
+
+    round_robin_router = RoundRobinRouter(instances=[instance], http_client=mock_http_client)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await round_robin_router.route("/echo", {"test": "data"})
+
+    assert exc_info.value.status_code == 429
+
 @pytest.mark.asyncio
 async def test_concurrent_access_thread_safety():
     mock_instance_1 = Mock(spec=ServiceInstance)
@@ -213,4 +232,119 @@ async def test_concurrent_access_thread_safety():
     
     # Verify we get alternating instances (round-robin behavior)
     expected = ["http://localhost:9990", "http://localhost:9991"] * 5
-    assert results == expected
\ No newline at end of file
+    assert results == expected
+
+@pytest.mark.asyncio
+async def test_route_bytes_forwards_raw_request():
+    mock_instance = Mock(spec=ServiceInstance)
+    mock_instance.get_url.return_value = "http://localhost:9990"
+    mock_instance.get_health_status.return_value = HealthStatus.HEALTHY
+
+    instances = [mock_instance]
+    mock_http_client = Mock()
+    expected_response = UpstreamResponse(404, [("content-type", "application/json")], b'{"error": "x"}')
+    mock_http_client.forward = AsyncMock(return_value=expected_response)
+
+    round_robin_router = RoundRobinRouter(instances=instances, http_client=mock_http_client)
+
+    headers = [("content-type", "application/json")]
+    response = await round_robin_router.route_bytes("/echo", b'{"test": "data"}', headers)
+
+    assert response is expected_response
+    mock_http_client.forward.assert_called_once_with("POST", "http://localhost:9990/echo",
+                                                     b'{"test": "data"}', headers)
+
+
+@pytest.mark.asyncio
+async def test_route_bytes_no_healthy_instances_raises_exception():
+    mock_instance = Mock(spec=ServiceInstance)
+    mock_instance.get_url.return_value = "http://localhost:9990"
+    mock_instance.get_health_status.return_value = HealthStatus.UNHEALTHY
+
+    instances = [mock_instance]
+    mock_http_client = Mock()
+
+    round_robin_router = RoundRobinRouter(instances=instances, http_client=mock_http_client)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await round_robin_router.route_bytes("/echo", b"{}", [])
+
+    assert exc_info.value.status_code == 500
+    assert "No healthy downstream instance available" in str(exc_info.value.detail)
+
+
+@pytest.mark.asyncio
+async def test_route_stream_forwards_body_stream():
+    mock_instance = Mock(spec=ServiceInstance)
+    mock_instance.get_url.return_value = "http://localhost:9990"
+    mock_instance.get_health_status.return_value = HealthStatus.HEALTHY
+
+    instances = [mock_instance]
+    mock_http_client = Mock()
+    expected_stream = Mock()
+    mock_http_client.stream = AsyncMock(return_value=expected_stream)
+
+    round_robin_router = RoundRobinRouter(instances=instances, http_client=mock_http_client)
+
+    body = Mock()
+    response = await round_robin_router.route_stream("/echo", body, [])
+
+    assert response is expected_stream
+    mock_http_client.stream.assert_called_once_with("POST", "http://localhost:9990/echo", body, [])
+
+
+@pytest.mark.asyncio
+async def test_router_picks_up_published_snapshot():
+    instance_1 = ServiceInstance("http://localhost:9990")
+    instance_2 = ServiceInstance("http://localhost:9991")
+    instance_1.health_status = HealthStatus.HEALTHY
+    instances = [instance_1, instance_2]
+    routable_instances = RoutableInstances(instances)
+
+    round_robin_router = RoundRobinRouter(instances=instances, http_client=Mock(),
+                                          routable_instances=routable_instances)
+    assert await round_robin_router.get_next_service_instance() == "http://localhost:9990"
+    assert await round_robin_router.get_next_service_instance() == "http://localhost:9990"
+
+    instance_2.health_status = HealthStatus.HEALTHY
+    routable_instances.publish()
+
+    results = {await round_robin_router.get_next_service_instance() for _ in range(2)}
+    assert results == {"http://localhost:9990", "http://localhost:9991"}
+
+
+async def measure_selection_time(num_instances: int) -> tuple[float, list[Mock]]:
+    """
+    Best time per selection over a few runs, with every other instance down
+    """
+    instances = []
+    for i in range(num_instances):
+        mock_instance = Mock(spec=ServiceInstance)
+        mock_instance.get_url.return_value = f"http://localhost:{10000 + i}"
+        mock_instance.get_health_status.return_value = (HealthStatus.HEALTHY if i % 2 == 0
+                                                        else HealthStatus.UNHEALTHY)
+        instances.append(mock_instance)
+
+    round_robin_router = RoundRobinRouter(instances=instances, http_client=Mock())
+    for instance in instances:
+        instance.get_health_status.reset_mock()
+
+    num_selections = 2000
+    per_selection = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(num_selections):
+            await round_robin_router.get_next_service_instance()
+        per_selection = min(per_selection, (time.perf_counter() - start) / num_selections)
+    return per_selection, instances
+
+
+@pytest.mark.asyncio
+async def test_selection_benchmark_with_1k_instances():
+    baseline_per_selection, _ = await measure_selection_time(10)
+    per_selection, instances = await measure_selection_time(1000)
+
+    # Selection reads the published snapshot instead of scanning the instances,
+    # so it takes about as long with 1k instances as with 10
+    assert all(instance.get_health_status.call_count == 0 for instance in instances)
+    assert per_selection < 10 * baseline_per_selection
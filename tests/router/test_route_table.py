@@ -0,0 +1,36 @@
+from unittest.mock import Mock
+
+from src.router.route_table import RouteTable
+
+
+def test_longest_matching_prefix_wins():
+    api_router, games_router = Mock(), Mock()
+    route_table = RouteTable()
+    route_table.add("/api", api_router)
+    route_table.add("/api/games", games_router)
+
+    assert route_table.match("/api/games/42") is games_router
+    assert route_table.match("/api/games") is games_router
+    assert route_table.match("/api/players") is api_router
+    assert route_table.match("/api") is api_router
+
+
+def test_prefix_matches_whole_segments():
+    api_router = Mock()
+    route_table = RouteTable()
+    route_table.add("/api/", api_router)
+
+    assert route_table.match("/api/") is api_router
+    assert route_table.match("/apis") is None
+    assert route_table.match("/") is None
+
+
+def test_root_prefix_is_default_route():
+    default_router, api_router = Mock(), Mock()
+    route_table = RouteTable()
+    route_table.add("/", default_router)
+    route_table.add("/api", api_router)
+
+    assert route_table.match("/") is default_router
+    assert route_table.match("/echo") is default_router
+    assert route_table.match("/api/v1/games") is api_router
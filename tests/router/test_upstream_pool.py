@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+from unittest.mock import Mock
+
+from src.models.circuit_state import CircuitState
+from src.models.health_status import HealthStatus
+from src.router.consistent_hash_router import ConsistentHashRouter
+from src.router.round_robin_router import RoundRobinRouter
+from src.router.upstream_pool import UpstreamPools
+
+
+def create_config(app_instances: list, **config) -> dict:
+    return {"app_instances": app_instances, "routing_algorithm": "round_robin",
+            "health_check_interval": 10, "degraded_check_interval": 30,
+            "config_reload": {"drain_timeout": 1}, **config}
+
+
+def mark_healthy(upstream_pools: UpstreamPools):
+    for instance in upstream_pools.get_instances():
+        instance.set_health_status(HealthStatus.HEALTHY)
+
+
+@pytest.mark.asyncio
+async def test_reload_keeps_state_of_kept_instances():
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001", "http://localhost:9002"]), Mock())
+    mark_healthy(upstream_pools)
+    kept_instance = upstream_pools.get_instances()[1]
+    kept_instance.start_request()
+
+    upstream_pools.update(create_config([{"url": "http://localhost:9002", "weight": 3},
+                                         "http://localhost:9003"], routing_algorithm="consistent_hash"))
+
+    pool = upstream_pools.pools["default"]
+    assert pool.svc_instances[0] is kept_instance
+    assert kept_instance.get_health_status() == HealthStatus.HEALTHY
+    assert kept_instance.get_weight() == 3
+    assert kept_instance.get_in_flight_requests() == 1
+    assert pool.svc_instances[1].get_health_status() == HealthStatus.UNHEALTHY
+    assert pool.routable_instances.current().instances == (kept_instance,)
+    assert isinstance(pool.router, ConsistentHashRouter)
+    assert upstream_pools.route_table.match("/echo") is pool.router
+    await upstream_pools.stop()
+
+
+@pytest.mark.asyncio
+async def test_reload_takes_over_components_whose_config_did_not_change():
+    config = create_config(["http://localhost:9001", "http://localhost:9002"],
+                           routing_algorithm="peak_ewma", circuit_breaker={"enabled": True},
+                           slow_start={"window": 10}, admission_control={"enabled": True})
+    upstream_pools = UpstreamPools(config, Mock())
+    router = upstream_pools.pools["default"].router
+    removed_instance, kept_instance = upstream_pools.get_instances()
+    router.circuit_breakers.open(kept_instance, router.circuit_breakers.get_breaker(kept_instance))
+    router.circuit_breakers.get_breaker(removed_instance)
+    router.record_response(kept_instance, 0.5, False)
+
+    upstream_pools.update({**config, "app_instances": ["http://localhost:9002", "http://localhost:9003"],
+                           "health_check_interval": 5,
+                           "admission_control": {"enabled": True, "initial_limit": 10}})
+
+    new_router = upstream_pools.pools["default"].router
+    added_instance = upstream_pools.get_instances()[1]
+    assert new_router.circuit_breakers is router.circuit_breakers
+    assert new_router.circuit_breakers.get_state(kept_instance) == CircuitState.OPEN
+    assert removed_instance not in new_router.circuit_breakers.breakers
+    assert new_router.latencies[kept_instance].value == 0.5
+    assert new_router.slow_start is router.slow_start
+    added_instance.set_health_status(HealthStatus.HEALTHY)
+    assert new_router.slow_start.get_weight_factor(added_instance) < 1.0
+    assert new_router.concurrency_limiter is not router.concurrency_limiter
+    await upstream_pools.stop()
+
+
+@pytest.mark.asyncio
+async def test_invalid_config_leaves_pools_as_they_are():
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001"]), Mock())
+    router = upstream_pools.pools["default"].router
+
+    with pytest.raises(ValueError):
+        upstream_pools.update(create_config(["http://localhost:9002"], routing_algorithm="unknown"))
+    with pytest.raises(ValueError):
+        upstream_pools.update(create_config(["http://localhost:9002"],
+                                            routes=[{"prefix": "/", "pool": "unknown"}]))
+
+    assert isinstance(router, RoundRobinRouter)
+    assert upstream_pools.route_table.match("/echo") is router
+    assert [instance.get_url() for instance in upstream_pools.get_instances()] == ["http://localhost:9001"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("weight", [0, -1, 1.5, "2"])
+async def test_invalid_weight_rejected(weight):
+    with pytest.raises(ValueError):
+        UpstreamPools(create_config([{"url": "http://localhost:9001", "weight": weight}]), Mock())
+
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001"]), Mock())
+    with pytest.raises(ValueError):
+        upstream_pools.update(create_config([{"url": "http://localhost:9001", "weight": weight}],
+                                            routing_algorithm="weighted_round_robin"))
+
+    assert upstream_pools.get_instances()[0].get_weight() == 1
+    assert isinstance(upstream_pools.pools["default"].router, RoundRobinRouter)
+
+
+@pytest.mark.asyncio
+async def test_pools_added_and_removed_and_routes_swapped():
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001"]), Mock())
+    metrics = Mock()
+    upstream_pools.enable_metrics(metrics)
+    removed_instance = upstream_pools.get_instances()[0]
+
+    upstream_pools.update(create_config([], pools={
+        "api": {"app_instances": ["http://localhost:9002"]},
+        "web": {"app_instances": ["http://localhost:9003"], "routing_algorithm": "least_requests"}},
+        routes=[{"prefix": "/api", "pool": "api"}, {"prefix": "/", "pool": "web"}]))
+
+    assert list(upstream_pools.pools) == ["api", "web"]
+    assert upstream_pools.route_table.match("/api/games") is upstream_pools.pools["api"].router
+    assert upstream_pools.route_table.match("/echo") is upstream_pools.pools["web"].router
+    await asyncio.sleep(0)
+    metrics.remove_instances.assert_called_once_with([removed_instance])
+    await upstream_pools.stop()
+
+
+@pytest.mark.asyncio
+async def test_removed_instances_drained_before_metrics_dropped():
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001", "http://localhost:9002"]), Mock())
+    metrics = Mock()
+    upstream_pools.enable_metrics(metrics)
+    removed_instance = upstream_pools.get_instances()[0]
+    removed_instance.start_request()
+
+    upstream_pools.update(create_config(["http://localhost:9002"]))
+    await asyncio.sleep(0.15)
+    metrics.remove_instances.assert_not_called()
+
+    removed_instance.finish_request()
+    await asyncio.sleep(0.15)
+    metrics.remove_instances.assert_called_once_with([removed_instance])
+    await upstream_pools.stop()
+
+
+def test_shared_table_keeps_instances_fixed():
+    upstream_pools = UpstreamPools(create_config(["http://localhost:9001"]), Mock())
+    upstream_pools.enable_shared_table(Mock())
+
+    with pytest.raises(ValueError):
+        upstream_pools.update(create_config(["http://localhost:9001", "http://localhost:9002"]))
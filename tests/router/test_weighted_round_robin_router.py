@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import Mock
+
+from src.models.service_instance import ServiceInstance
+from src.models.health_status import HealthStatus
+from src.health.routable_instances import RoutableInstances
+from src.router.weighted_round_robin_router import WeightedRoundRobinRouter, build_schedule
+
+
+def create_instance(url: str, weight: int, health_status: HealthStatus = HealthStatus.HEALTHY) -> ServiceInstance:
+    instance = ServiceInstance(url, weight)
+    instance.health_status = health_status
+    return instance
+
+
+def test_schedule_interleaves_instances():
+    instance_a = create_instance("a", 5)
+    instance_b = create_instance("b", 1)
+    instance_c = create_instance("c", 1)
+
+    schedule = build_schedule((instance_a, instance_b, instance_c))
+
+    assert [instance.get_url() for instance in schedule] == ["a", "a", "a", "b", "c", "a", "a"]
+
+
+def test_schedule_reduced_by_common_divisor():
+    schedule = build_schedule((create_instance("a", 20), create_instance("b", 10)))
+
+    assert [instance.get_url() for instance in schedule] == ["a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_traffic_proportional_to_weight():
+    instances = [create_instance("http://localhost:9990", 3),
+                 create_instance("http://localhost:9991", 1),
+                 create_instance("http://localhost:9992", 2, HealthStatus.UNHEALTHY)]
+
+    router = WeightedRoundRobinRouter(instances=instances, http_client=Mock())
+
+    selected = [await router.get_next_service_instance() for _ in range(400)]
+    assert selected.count("http://localhost:9990") == 300
+    assert selected.count("http://localhost:9991") == 100
+
+
+@pytest.mark.asyncio
+async def test_schedule_rebuilt_only_on_new_snapshot():
+    instances = [create_instance("http://localhost:9990", 1),
+                 create_instance("http://localhost:9991", 1, HealthStatus.UNHEALTHY)]
+    routable_instances = RoutableInstances(instances)
+
+    router = WeightedRoundRobinRouter(instances=instances, http_client=Mock(),
+                                      routable_instances=routable_instances)
+    await router.get_next_service_instance()
+    schedule = router.schedule
+    await router.get_next_service_instance()
+    assert router.schedule is schedule
+
+    instances[1].health_status = HealthStatus.HEALTHY
+    routable_instances.publish()
+
+    selected = {await router.get_next_service_instance() for _ in range(2)}
+    assert router.schedule is not schedule
+    assert selected == {"http://localhost:9990", "http://localhost:9991"}
+
+
+@pytest.mark.asyncio
+async def test_no_healthy_instances_returns_none():
+    instances = [create_instance("http://localhost:9990", 1, HealthStatus.DEGRADED)]
+
+    router = WeightedRoundRobinRouter(instances=instances, http_client=Mock())
+
+    assert await router.get_next_service_instance() is None
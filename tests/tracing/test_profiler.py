@@ -0,0 +1,51 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+
+from src.tracing.profiler import Profiler, format_collapsed_stacks, summarize_stacks
+
+
+def busy_wait(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_profile_captures_loop_lag_and_busy_function():
+    profiler = Profiler({"sample_interval": 0.001, "lag_interval": 0.01})
+
+    async def block_loop():
+        await asyncio.sleep(0.05)
+        busy_wait(0.1)
+
+    (loop_lag, stacks), _ = await asyncio.gather(profiler.profile(0.3), block_loop())
+
+    assert loop_lag["max"] >= 0.05
+    assert loop_lag["samples"] > 0
+    summary = summarize_stacks(stacks)
+    assert summary["samples"] == sum(stacks.values())
+    assert any(function["function"].endswith(":busy_wait") for function in summary["top_self"])
+    assert not profiler.is_running
+
+
+@pytest.mark.asyncio
+async def test_one_profile_at_a_time():
+    profiler = Profiler({})
+    profile = asyncio.ensure_future(profiler.profile(0.05))
+    await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        await profiler.profile(0.05)
+    await profile
+
+
+def test_stacks_collapsed_for_flame_graphs():
+    stacks = Counter({("main", "handle", "parse"): 3, ("main", "handle"): 1})
+
+    assert format_collapsed_stacks(stacks) == "main;handle;parse 3\nmain;handle 1\n"
+    summary = summarize_stacks(stacks)
+    assert summary["top_self"][0] == {"function": "parse", "samples": 3, "percent": 75.0}
+    assert summary["top_total"][0]["samples"] == 4
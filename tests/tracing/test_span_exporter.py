@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from src.tracing.span_exporter import SpanExporter
+
+
+def test_file_exporter_writes_spans_as_json_lines(tmp_path):
+    spans_file = tmp_path / "spans.jsonl"
+    exporter = SpanExporter({"file": str(spans_file), "flush_interval": 0.01})
+
+    for i in range(3):
+        exporter.export({"span_id": i})
+    exporter.close()
+
+    assert [json.loads(line) for line in spans_file.read_text().splitlines()] == [
+        {"span_id": 0}, {"span_id": 1}, {"span_id": 2}]
+    assert exporter.dropped_spans == 0
+
+
+def test_spans_dropped_when_queue_full_or_export_fails(tmp_path):
+    exporter = SpanExporter({"file": str(tmp_path / "missing" / "spans.jsonl"), "queue_size": 1,
+                             "flush_interval": 0.01})
+    exporter.stopped.set()
+    exporter.thread.join()
+
+    exporter.export({"span_id": 0})
+    exporter.export({"span_id": 1})
+    assert exporter.dropped_spans == 1
+    exporter.run()
+    assert exporter.dropped_spans == 2
+
+
+def test_unknown_or_incomplete_exporter_rejected():
+    with pytest.raises(ValueError):
+        SpanExporter({"exporter": "zipkin"})
+    with pytest.raises(ValueError):
+        SpanExporter({"exporter": "collector"})
@@ -0,0 +1,97 @@
+import httpx
+from unittest.mock import Mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.router_api import create_api_router
+from src.metrics.router_metrics import RouterMetrics
+from src.models.health_status import HealthStatus
+from src.models.service_instance import ServiceInstance
+from src.router.round_robin_router import RoundRobinRouter
+from src.router.route_table import RouteTable
+from src.tracing.tracer import Tracer, current_span, parse_traceparent, record_phase
+from src.tracing.tracing_middleware import TracingMiddleware
+from src.utils.http.http_client import HttpClient
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+def test_traceparent_parsed_and_invalid_ones_ignored():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01") == (TRACE_ID, PARENT_SPAN_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID.upper()}-{PARENT_SPAN_ID}-00") == (TRACE_ID, PARENT_SPAN_ID, False)
+    assert parse_traceparent(None) is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(f"ff-{TRACE_ID}-{PARENT_SPAN_ID}-01") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_SPAN_ID}-01") is None
+
+
+def test_new_traces_sampled_at_sample_rate_and_others_follow_parent():
+    tracer = Tracer({"sample_rate": 0})
+
+    span = tracer.start_span("POST /echo")
+    assert not span.sampled and span.parent_span_id is None
+    assert parse_traceparent(span.get_traceparent()) == (span.trace_id, span.span_id, False)
+
+    child_span = tracer.start_span("POST /echo", f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01")
+    assert child_span.sampled
+    assert (child_span.trace_id, child_span.parent_span_id) == (TRACE_ID, PARENT_SPAN_ID)
+    assert child_span.span_id != PARENT_SPAN_ID
+
+
+def test_only_sampled_spans_exported_but_all_measured():
+    exporter = Mock()
+    metrics = Mock()
+    tracer = Tracer({"sample_rate": 0}, exporter)
+    tracer.enable_metrics(metrics)
+
+    tracer.finish_span(tracer.start_span("GET /health"))
+    span = tracer.start_span("POST /echo", f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01")
+    token = current_span.set(span)
+    record_phase("parse")
+    current_span.reset(token)
+    tracer.finish_span(span)
+
+    assert metrics.observe_phases.call_count == 2
+    exporter.export.assert_called_once()
+    exported_span = exporter.export.call_args.args[0]
+    assert exported_span["trace_id"] == TRACE_ID
+    assert 0 <= exported_span["phases"]["parse"] <= exported_span["duration"]
+
+
+def test_traced_request_propagates_traceparent_and_records_phases():
+    received_headers = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received_headers.append(request.headers)
+        return httpx.Response(200, json={"status": "success"})
+
+    instance = ServiceInstance("http://localhost:9990")
+    instance.health_status = HealthStatus.HEALTHY
+    http_client = HttpClient()
+    http_client.clients["http://localhost:9990"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    route_table = RouteTable()
+    route_table.add("/", RoundRobinRouter([instance], http_client))
+    metrics = RouterMetrics([instance], {})
+    metrics.enable_tracing()
+    exporter = Mock()
+    tracer = Tracer({"sample_rate": 0}, exporter)
+    tracer.enable_metrics(metrics)
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+    app.include_router(create_api_router(route_table, {"passthrough": False}))
+    client = TestClient(app)
+
+    response = client.post("/echo", json={"gameid": 1},
+                           headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"})
+
+    assert response.json() == {"status": "success"}
+    span = exporter.export.call_args.args[0]
+    assert (span["name"], span["status_code"], span["parent_span_id"]) == ("POST /echo", 200, PARENT_SPAN_ID)
+    assert set(span["phases"]) == {"parse", "select", "upstream", "encode"}
+    assert span["instances"] == ["http://localhost:9990"]
+    assert received_headers[0]["traceparent"] == f"00-{TRACE_ID}-{span['span_id']}-01"
+    assert metrics.phase_durations["upstream"].get_count() == 1
+    assert metrics.phase_durations["total"].get_count() == 1
+    assert 'router_request_phase_seconds_count{phase="select"} 1' in metrics.render()
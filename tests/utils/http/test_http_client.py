@@ -0,0 +1,217 @@
+import asyncio
+import functools
+
+import httpx
+import pytest
+
+from benchmarks.stub_upstream import StubUpstream
+from src.utils.http import http_client as http_client_module
+from src.utils.http.http_client import HttpClient
+
+
+@pytest.mark.asyncio
+async def test_client_reused_for_same_origin():
+    http_client = HttpClient()
+
+    client_1 = http_client.get_client("http://localhost:9990/echo")
+    client_2 = http_client.get_client("http://localhost:9990/health")
+
+    assert client_1 is client_2
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_separate_client_per_origin():
+    http_client = HttpClient()
+
+    client_1 = http_client.get_client("http://localhost:9990/echo")
+    client_2 = http_client.get_client("http://localhost:9991/echo")
+
+    assert client_1 is not client_2
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_settings_read_from_config():
+    config = {
+        "max_connections": 7,
+        "max_keepalive_connections": 3,
+        "keepalive_expiry": 12,
+        "connect_timeout": 1,
+        "read_timeout": 4
+    }
+    http_client = HttpClient(config)
+
+    assert http_client.limits.max_connections == 7
+    assert http_client.limits.max_keepalive_connections == 3
+    assert http_client.limits.keepalive_expiry == 12
+    assert http_client.timeout.connect == 1
+    assert http_client.timeout.read == 4
+
+
+@pytest.mark.asyncio
+async def test_close_releases_all_pools():
+    http_client = HttpClient()
+    client = http_client.get_client("http://localhost:9990/echo")
+
+    await http_client.close()
+
+    assert client.is_closed
+    assert http_client.clients == {}
+
+
+@pytest.mark.asyncio
+async def test_forward_passes_bytes_and_status_through():
+    received = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received["body"] = request.content
+        received["headers"] = request.headers
+        return httpx.Response(503, headers={"x-upstream": "9990", "connection": "close"},
+                              stream=httpx.ByteStream(b'{"busy": true}'))
+
+    http_client = HttpClient()
+    http_client.clients["http://localhost:9990"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    response = await http_client.forward("POST", "http://localhost:9990/echo", b'{"a": 1}',
+                                         [("content-type", "application/json")])
+
+    assert received["body"] == b'{"a": 1}'
+    assert received["headers"]["content-type"] == "application/json"
+    assert response.status_code == 503
+    assert response.content == b'{"busy": true}'
+    assert ("x-upstream", "9990") in response.headers
+    assert all(name != "connection" for name, _ in response.headers)
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_forward_adds_no_default_headers(monkeypatch):
+    received = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received["headers"] = request.headers
+        return httpx.Response(200, stream=httpx.ByteStream(b"ok"))
+
+    monkeypatch.setattr(http_client_module.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    http_client = HttpClient()
+
+    await http_client.forward("GET", "http://localhost:9990/echo", b"", [("x-client", "1")])
+
+    assert received["headers"]["x-client"] == "1"
+    assert "accept-encoding" not in received["headers"]
+    assert "user-agent" not in received["headers"]
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_relays_body_in_chunks():
+    received = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        received["body"] = b"".join([chunk async for chunk in request.stream])
+        return httpx.Response(200, stream=httpx.ByteStream(b"x" * 10))
+
+    async def request_body():
+        yield b"part-1,"
+        yield b"part-2"
+
+    http_client = HttpClient()
+    http_client.clients["http://localhost:9990"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    upstream_stream = await http_client.stream("POST", "http://localhost:9990/echo", request_body(), [])
+    chunks = [chunk async for chunk in upstream_stream.iter_body(4)]
+
+    assert received["body"] == b"part-1,part-2"
+    assert upstream_stream.status_code == 200
+    assert chunks == [b"xxxx", b"xxxx", b"xx"]
+    assert upstream_stream.response.is_closed
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_http2_requests_multiplexed_to_instance():
+    pytest.importorskip("h2")
+    stub = StubUpstream(latency=0.01, http2=True)
+    server = await stub.start("127.0.0.1", 0)
+    origin = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    http_client = HttpClient({"http2": {"enabled": True, "max_connections": 1}})
+
+    responses = await asyncio.gather(*(http_client.forward("POST", f"{origin}/echo", b'{"a": 1}', [])
+                                       for _ in range(20)))
+
+    assert [response.status_code for response in responses] == [200] * 20
+    assert responses[0].content == b'{"a": 1}'
+    assert http_client.http2_origins == {origin}
+    await http_client.close()
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_http2_falls_back_to_http1_for_instance_without_it():
+    pytest.importorskip("h2")
+    stub = StubUpstream(latency=0)
+    server = await stub.start("127.0.0.1", 0)
+    origin = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    http_client = HttpClient({"http2": {"enabled": True}})
+
+    first_response = await http_client.post(f"{origin}/echo", {"a": 1})
+    second_response = await http_client.post(f"{origin}/echo", {"a": 2})
+
+    assert first_response == {"a": 1}
+    assert second_response == {"a": 2}
+    assert http_client.http1_origins == {origin}
+    assert http_client.http2_origins == set()
+    await http_client.close()
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_http2_tried_again_after_closed_connection():
+    pytest.importorskip("h2")
+    stub = StubUpstream(latency=0)
+    server = await stub.start("127.0.0.1", 0)
+    origin = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    http_client = HttpClient({"http2": {"enabled": True, "reprobe_interval": 10}})
+    await http_client.post(f"{origin}/echo", {"a": 1})
+    assert origin in http_client.http2_reprobe_times
+
+    http_client.http2_reprobe_times[origin] = 0
+    response = await http_client.post(f"{origin}/echo", {"a": 2})
+
+    assert response == {"a": 2}
+    assert http_client.http1_origins == {origin}
+    assert http_client.http2_reprobe_intervals[origin] == 40
+    await http_client.close()
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_http2_given_up_for_good_after_garbled_response(monkeypatch):
+    monkeypatch.setattr(http_client_module, "HTTP2_AVAILABLE", True)
+    num_requests = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal num_requests
+        num_requests += 1
+        if num_requests == 1:
+            raise httpx.RemoteProtocolError("garbled response", request=request)
+        return httpx.Response(200, json={"a": 1})
+
+    monkeypatch.setattr(http_client_module.httpx, "AsyncClient",
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+    http_client = HttpClient({"http2": {"enabled": True}})
+
+    assert await http_client.post("http://localhost:9990/echo", {"a": 1}) == {"a": 1}
+    assert http_client.http1_origins == {"http://localhost:9990"}
+    assert http_client.http2_reprobe_times == {}
+    await http_client.close()
+
+
+def test_http2_disabled_without_h2(monkeypatch):
+    monkeypatch.setattr(http_client_module, "HTTP2_AVAILABLE", False)
+
+    http_client = HttpClient({"http2": {"enabled": True}})
+
+    assert not http_client.http2
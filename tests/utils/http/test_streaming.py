@@ -0,0 +1,37 @@
+import pytest
+
+from src.utils.http.streaming import limit_chunk_size
+
+
+async def as_stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_large_chunks_are_split():
+    chunks = [chunk async for chunk in limit_chunk_size(as_stream([b"a" * 10]), 4)]
+
+    assert chunks == [b"aaaa", b"aaaa", b"aa"]
+
+
+@pytest.mark.asyncio
+async def test_small_chunks_are_not_merged():
+    chunks = [chunk async for chunk in limit_chunk_size(as_stream([b"ab", b"", b"cd"]), 4)]
+
+    assert chunks == [b"ab", b"cd"]
+
+
+@pytest.mark.asyncio
+async def test_stream_is_pulled_lazily():
+    pulled = []
+
+    async def source():
+        for chunk in [b"1", b"2", b"3"]:
+            pulled.append(chunk)
+            yield chunk
+
+    stream = limit_chunk_size(source(), 4)
+    assert await stream.__anext__() == b"1"
+
+    assert pulled == [b"1"]
@@ -0,0 +1,40 @@
+import logging
+import queue
+
+from src.utils import logger_config
+from src.utils.logger_config import DroppingQueueHandler
+
+
+def test_records_dropped_when_queue_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("test_records_dropped_when_queue_full")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    for i in range(5):
+        logger.warning("message %d", i)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped_records == 3
+
+
+def test_module_level_longest_prefix_wins(monkeypatch):
+    monkeypatch.setattr(logger_config, "default_level", logging.INFO)
+    monkeypatch.setattr(logger_config, "module_levels", {"src": logging.WARNING,
+                                                         "src.router": logging.DEBUG})
+
+    assert logger_config.get_level("src.router.base_router") == logging.DEBUG
+    assert logger_config.get_level("src.health.health_checker") == logging.WARNING
+    assert logger_config.get_level("src.routerx") == logging.WARNING
+    assert logger_config.get_level("router-service") == logging.INFO
+
+
+def test_disabled_record_not_formatted():
+    class Unformattable:
+        def __str__(self):
+            raise AssertionError("formatted a disabled record")
+
+    logger = logger_config.setup_logger("test_disabled_record_not_formatted")
+    logger.setLevel(logging.INFO)
+
+    logger.debug("value %s", Unformattable())